@@ -1,90 +1,375 @@
+import hashlib
+import io
+import logging
 import os
+import threading
 try:
     import pymupdf  # PyMuPDF modern import
 except Exception:
     # Fallback for environments where PyMuPDF is installed as the `fitz` package
     # e.g. older installs expose `fitz` as the top-level module.
     import fitz as pymupdf
-from flask import Flask, render_template, send_file, request, jsonify, flash, redirect, url_for, abort
+from flask import Flask, render_template, make_response, send_file, send_from_directory, request, jsonify, flash, redirect, url_for, abort
 from flask_login import LoginManager, current_user, login_required
 from flask_migrate import Migrate
 from config import config
-from models import db, User, PDFFile, Share
+from database import init_database, read_session
+from models import db, User, PDFFile, Share, Job, add_and_commit
 from auth import auth_bp
 from forms import PDFUploadForm, SearchForm, ShareForm
-import secrets
+from thumbnails import ThumbnailStore, file_sha256
+from sprites import SpriteStore
+from optimize import optimize_pdf
+from blobs import BlobStore
+from cache import LRUCache, DiskCache
+from search import FIELDS, init_search
+from pagination import keyset_page
+from jobs import enqueue
+from users import init_user_cache
+from metrics import init_metrics, pdf_timer
+from assets import init_assets
+from sandbox import SandboxError, run_sandboxed
+from export import archive_names, stream_zip
+from shares import (get_share_resolver, has_share_grant, init_share_access,
+                    issue_share_grant, resolve_share_or_404)
 from PIL import Image
-import io
+import secrets
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.utils import secure_filename
+from sqlalchemy import not_
+from sqlalchemy.orm import joinedload, load_only
+
+# Result of PDFProcessor.analyze(); parts that were not requested are None
+PDFAnalysis = namedtuple('PDFAnalysis', [
+    'page_count',   # int
+    'metadata',     # dict with title/author/subject
+    'thumbnails',   # {preset: encoded image bytes} of the first page
+    'page_texts',   # tuple of str, one per extracted page
+    'page_sizes',   # tuple of (width, height) in points, one per page
+    'sprites',      # ([sheet image bytes], index dict) from SpriteStore.render
+])
+
+RENDER_FORMATS = {'png': 'image/png', 'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+
+logger = logging.getLogger(__name__)
+
+
+def analyze_pdf(pdf_path, thumbnails, thumbnail=False, metadata=True, text=False,
+                dimensions=False, max_text_pages=None, sprites=None):
+    """Open a PDF once and compute only the requested parts.
+
+    ``thumbnails`` is the ThumbnailStore whose presets are rendered;
+    ``sprites``, if given, is the SpriteStore that renders page sheets. Raises
+    if the file cannot be opened; failures of an individual part are
+    logged and leave that part as None.
+    """
+    with pdf_timer('open'):
+        doc = pymupdf.open(pdf_path)
+    try:
+        page_count = len(doc)
+        meta = None
+        thumb = None
+        texts = None
+        sizes = None
+        sheets = None
+
+        if metadata:
+            info = doc.metadata or {}
+            meta = {
+                'title': info.get('title', ''),
+                'author': info.get('author', ''),
+                'subject': info.get('subject', '')
+            }
+
+        if thumbnail and page_count:
+            try:
+                with pdf_timer('thumbnail'):
+                    thumb = thumbnails.render(doc[0])
+            except Exception:
+                logger.exception('Thumbnail generation failed for %s', pdf_path)
+
+        if text:
+            try:
+                limit = page_count if max_text_pages is None else min(page_count, max_text_pages)
+                with pdf_timer('text'):
+                    texts = tuple(doc[i].get_text() for i in range(limit))
+            except Exception:
+                logger.exception('Text extraction failed for %s', pdf_path)
+
+        if dimensions:
+            sizes = tuple((page.rect.width, page.rect.height) for page in doc)
+
+        if sprites is not None and page_count:
+            try:
+                with pdf_timer('sprites'):
+                    sheets = sprites.render(doc)
+            except Exception:
+                logger.exception('Sprite sheet generation failed for %s', pdf_path)
+
+        return PDFAnalysis(page_count, meta, thumb, texts, sizes, sheets)
+    finally:
+        doc.close()
+
+
+def rasterize(doc, page_no, scale, fmt, tile=None, tile_size=512, quality=80, max_pixels=None):
+    """Encode page ``page_no`` (0-based) of an open document, or one tile of it.
+
+    Whole-page renders are scaled down further if needed to stay within
+    ``max_pixels``, so a poster-sized page cannot allocate a huge pixmap.
+    Tiles are bounded by ``tile_size`` already.
+    """
+    if not 0 <= page_no < len(doc):
+        raise ValueError(f'page {page_no + 1} out of range')
+    page = doc[page_no]
+    rect = page.rect
+    clip = None
+    if tile is not None:
+        size = tile_size / scale
+        col, row = tile
+        clip = pymupdf.Rect(rect.x0 + col * size, rect.y0 + row * size,
+                            rect.x0 + (col + 1) * size, rect.y0 + (row + 1) * size) & rect
+        if col < 0 or row < 0 or clip.is_empty:
+            raise ValueError(f'tile {col},{row} out of range')
+    elif rect.is_empty or rect.is_infinite:
+        raise ValueError(f'page {page_no + 1} has no area')
+    elif max_pixels and rect.width * rect.height * scale * scale > max_pixels:
+        scale = (max_pixels / (rect.width * rect.height)) ** 0.5
+    pix = page.get_pixmap(matrix=pymupdf.Matrix(scale, scale), clip=clip, alpha=False)
+    if fmt == 'png':
+        return pix.tobytes('png')
+    img = Image.frombytes('RGB', (pix.width, pix.height), pix.samples)
+    pix = None  # release the raw pixmap before encoding
+    buf = io.BytesIO()
+    img.save(buf, fmt.upper(), quality=quality)
+    return buf.getvalue()
+
+
+def render_file(pdf_path, page_no, scale, fmt, tile=None, **options):
+    """rasterize() a page of the file at pdf_path; the entry point for sandboxed renders."""
+    doc = pymupdf.open(pdf_path)
+    try:
+        return rasterize(doc, page_no, scale, fmt, tile, **options)
+    finally:
+        doc.close()
+
+
+class DocumentPool:
+    """Small LRU pool of open documents so repeated page renders skip re-parsing.
+
+    PyMuPDF documents are not thread-safe, so a document is checked out of the
+    pool for as long as a caller uses it. A thread asking for a document that
+    is already checked out opens a second handle rather than waiting. The pool
+    lock only guards the bookkeeping, never a render or an open. Entries are
+    keyed by path, size and mtime, which makes a replaced file reopen instead
+    of serving stale pages.
+    """
+
+    def __init__(self, size=8):
+        self.size = size
+        self.lock = threading.Lock()
+        self._docs = OrderedDict()  # idle documents only
+
+    @contextmanager
+    def open(self, pdf_path):
+        stat = os.stat(pdf_path)
+        key = (os.path.abspath(pdf_path), stat.st_size, stat.st_mtime_ns)
+        with self.lock:
+            doc = self._docs.pop(key, None)
+        if doc is None:
+            with pdf_timer('open'):
+                doc = pymupdf.open(pdf_path)
+        try:
+            yield doc
+        finally:
+            self._release(key, doc)
+
+    def _release(self, key, doc):
+        evicted = []
+        with self.lock:
+            if key in self._docs:
+                # another handle to the same file came back first
+                evicted.append(doc)
+            else:
+                self._docs[key] = doc
+                while len(self._docs) > self.size:
+                    evicted.append(self._docs.popitem(last=False)[1])
+        for old in evicted:
+            old.close()
+
+    def close(self):
+        with self.lock:
+            docs = list(self._docs.values())
+            self._docs.clear()
+        for doc in docs:
+            doc.close()
+
 
 # PDF Processor (existing code remains the same)
 class PDFProcessor:
     def __init__(self, app):
         self.app = app
+        self.thumbnails = ThumbnailStore.from_config(app.config)
+        self.sprites = SpriteStore.from_config(app.config)
+        self.optimized = BlobStore(app.config['PDF_OPTIMIZED_FOLDER'])
+        self.documents = DocumentPool(app.config['RENDER_POOL_SIZE'])
+        self.render_cache = LRUCache(max_items=app.config['RENDER_CACHE_ITEMS'],
+                                     max_bytes=app.config['RENDER_CACHE_BYTES'])
+        self.render_disk_cache = DiskCache(app.config['RENDER_CACHE_FOLDER'],
+                                           app.config['RENDER_DISK_CACHE_BYTES'])
         self.ensure_directories()
     
     def ensure_directories(self):
         os.makedirs(self.app.config['UPLOAD_FOLDER'], exist_ok=True)
         os.makedirs(self.app.config['THUMBNAIL_FOLDER'], exist_ok=True)
+        os.makedirs(self.app.config['SPRITE_FOLDER'], exist_ok=True)
+        os.makedirs(self.app.config['RENDER_CACHE_FOLDER'], exist_ok=True)
+    
+    def analyze(self, pdf_path, sprites=False, **options):
+        """Open a PDF once and compute only the requested parts; see analyze_pdf().
+
+        With ``sprites`` the page sprite sheets are rendered too.
+        """
+        return analyze_pdf(pdf_path, self.thumbnails, sprites=self.sprites if sprites else None,
+                           **options)
+
+    def analyze_isolated(self, pdf_path, sprites=False, **options):
+        """analyze() in a sandboxed child process with SANDBOX_MEMORY_MB / SANDBOX_TIMEOUT.
+
+        Used for documents from untrusted sources. Raises SandboxError when a
+        limit is hit. With SANDBOX_PROCESSING off this is plain analyze().
+        """
+        config = self.app.config
+        if not config['SANDBOX_PROCESSING']:
+            return self.analyze(pdf_path, sprites=sprites, **options)
+        with pdf_timer('analyze_sandboxed'):
+            return run_sandboxed(analyze_pdf, os.path.abspath(pdf_path), self.thumbnails,
+                                 sprites=self.sprites if sprites else None,
+                                 memory_mb=config['SANDBOX_MEMORY_MB'],
+                                 timeout=config['SANDBOX_TIMEOUT'], **options)
     
-    def generate_thumbnail(self, pdf_path, output_path):
-        """Generate thumbnail from first page of PDF"""
+    def optimize(self, pdf_path, content_hash, isolated=False, force=False):
+        """Absolute path of the web-optimized copy of a PDF, made if needed; None if not worth one.
+
+        With ``isolated`` the rewrite runs sandboxed like analyze_isolated().
+        Copies are keyed by the original's hash, so identical files share one;
+        ``force`` rewrites an existing copy.
+        """
+        config = self.app.config
+        store = self.optimized
+        if store.has(content_hash) and not force:
+            return os.path.abspath(store.path(content_hash))
+        tmp = store.temp_path()
+        options = dict(max_image_dpi=config['OPTIMIZE_IMAGE_DPI'],
+                       image_quality=config['OPTIMIZE_IMAGE_QUALITY'],
+                       min_saving=config['OPTIMIZE_MIN_SAVING'])
         try:
-            doc = pymupdf.open(pdf_path)
-            page = doc[0]
-            pix = page.get_pixmap(matrix=pymupdf.Matrix(2, 2))
-            img_data = pix.tobytes("png")
-            
-            # Process image with PIL
-            img = Image.open(io.BytesIO(img_data))
-            img.thumbnail(self.app.config['THUMBNAIL_SIZE'])
-            img.save(output_path, 'PNG')
-            doc.close()
-            return True
-        except Exception as e:
-            print(f"Thumbnail generation failed: {e}")
-            return False
+            with pdf_timer('optimize'):
+                if isolated and config['SANDBOX_PROCESSING']:
+                    size = run_sandboxed(optimize_pdf, os.path.abspath(pdf_path), tmp,
+                                         memory_mb=config['SANDBOX_MEMORY_MB'],
+                                         timeout=config['SANDBOX_TIMEOUT'], **options)
+                else:
+                    size = optimize_pdf(pdf_path, tmp, **options)
+            if size is None:
+                return None
+            return store.put_file(content_hash, tmp)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def generate_thumbnail(self, pdf_path, content_hash=None):
+        """Store thumbnails of the first page; returns the grid thumbnail path or None"""
+        try:
+            content_hash = content_hash or file_sha256(pdf_path)
+            if self.thumbnails.has_all(content_hash):
+                return self.thumbnails.path(content_hash)
+            result = self.analyze(pdf_path, thumbnail=True, metadata=False)
+            if not result.thumbnails:
+                return None
+            return self.thumbnails.save(content_hash, result.thumbnails)
+        except Exception:
+            logger.exception('Thumbnail generation failed for %s', pdf_path)
+            return None
     
     def extract_text(self, pdf_path, max_pages=10):
         """Extract text from PDF for search"""
         try:
-            doc = pymupdf.open(pdf_path)
-            text = ""
-            for i, page in enumerate(doc):
-                if i >= max_pages:  # Limit pages for performance
-                    break
-                text += page.get_text()
-            doc.close()
-            return text.strip()
-        except Exception as e:
-            print(f"Text extraction failed: {e}")
+            result = self.analyze(pdf_path, metadata=False, text=True, max_text_pages=max_pages)
+            return ''.join(result.page_texts or ()).strip()
+        except Exception:
+            logger.exception('Text extraction failed for %s', pdf_path)
             return ""
     
     def get_pdf_metadata(self, pdf_path):
         """Extract PDF metadata"""
         try:
-            doc = pymupdf.open(pdf_path)
-            metadata = doc.metadata
-            page_count = len(doc)
-            doc.close()
-            
-            return {
-                'title': metadata.get('title', ''),
-                'author': metadata.get('author', ''),
-                'subject': metadata.get('subject', ''),
-                'page_count': page_count
-            }
-        except Exception as e:
-            print(f"Metadata extraction failed: {e}")
+            result = self.analyze(pdf_path)
+            return dict(result.metadata, page_count=result.page_count)
+        except Exception:
+            logger.exception('Metadata extraction failed for %s', pdf_path)
             return {'page_count': 0}
+    
+    def page_texts(self, pdf_path, start, stop):
+        """Text of pages start..stop-1 (0-based) via the open-document pool."""
+        with self.documents.open(pdf_path) as doc:
+            stop = min(stop, len(doc))
+            return [doc[i].get_text() for i in range(start, stop)]
+    
+    def render_key(self, pdf_path, page_no, scale, fmt, tile=None, content_hash=None):
+        """Cache key for one rendered page or tile; changes when the file does.
+
+        With a content hash the key is independent of the path, so identical
+        files stored under several rows share their cached renders.
+        """
+        if content_hash:
+            ident = f'sha256:{content_hash}'
+        else:
+            stat = os.stat(pdf_path)
+            ident = f'{os.path.abspath(pdf_path)}:{stat.st_size}:{stat.st_mtime_ns}'
+        return hashlib.sha1(f'{ident}:{page_no}:{scale}:{fmt}:{tile}'.encode()).hexdigest()
+    
+    def render_page(self, pdf_path, page_no, scale=1.0, fmt='png', tile=None, content_hash=None):
+        """Rasterize a page (0-based), or one TILE_SIZE tile of it, to image bytes.
+
+        ``tile`` is a (column, row) pair in tile units at the requested scale.
+        Whole pages are capped at RENDER_MAX_PIXELS. Results go through the
+        in-memory and on-disk LRU caches. Raises ValueError for pages or
+        tiles outside the document, and SandboxError (with SANDBOX_RENDERS)
+        when a render exceeds its limits.
+        """
+        key = self.render_key(pdf_path, page_no, scale, fmt, tile, content_hash)
+        data = self.render_cache.get(key)
+        if data is not None:
+            return data
+        data = self.render_disk_cache.get(key)
+        if data is None:
+            with pdf_timer('render'):
+                data = self._render(pdf_path, page_no, scale, fmt, tile)
+            self.render_disk_cache.set(key, data)
+        self.render_cache.set(key, data, len(data))
+        return data
+    
+    def _render(self, pdf_path, page_no, scale, fmt, tile):
+        config = self.app.config
+        options = dict(tile_size=config['TILE_SIZE'], quality=config['RENDER_QUALITY'],
+                       max_pixels=config['RENDER_MAX_PIXELS'])
+        if config['SANDBOX_RENDERS']:
+            return run_sandboxed(render_file, os.path.abspath(pdf_path), page_no, scale, fmt, tile,
+                                 memory_mb=config['SANDBOX_MEMORY_MB'],
+                                 timeout=config['RENDER_TIMEOUT'], **options)
+        with self.documents.open(pdf_path) as doc:
+            return rasterize(doc, page_no, scale, fmt, tile, **options)
 
-def create_app(config_name='default'):
+def create_app(config_name=None):
     app = Flask(__name__)
-    app.config.from_object(config[config_name])
+    app.config.from_object(config[config_name or os.environ.get('APP_CONFIG', 'default')])
     
     # Initialize extensions
     db.init_app(app)
+    init_database(app, db)
     migrate = Migrate(app, db)
     
     # Login manager
@@ -93,12 +378,65 @@ def create_app(config_name='default'):
     login_manager.login_view = 'auth.login'
     login_manager.login_message = 'Please log in to access this page.'
     
-    @login_manager.user_loader
-    def load_user(user_id):
-        return User.query.get(int(user_id))
+    init_user_cache(app, login_manager)
     
     # PDF processor
     pdf_processor = PDFProcessor(app)
+    search_backend = init_search(app)
+    blob_store = BlobStore.from_config(app.config)
+    init_share_access(app)
+    init_metrics(app, pdf_processor)
+    init_assets(app)
+    
+    def send_pdf(pdf, as_attachment=False, download_name=None, shared=False, optimized=False,
+                 ranges=True):
+        """Send a stored PDF with byte-range support, strong validators and cache headers.
+
+        The ETag is derived from the record id and the file's size and mtime,
+        so it changes whenever the stored file is replaced. Shared links are
+        revalidated on every use (cheap 304s) so expiry and revocation apply.
+        With ``optimized`` the web-optimized copy is sent if there is one,
+        unless the request asks for ?original=1. With ``ranges=False`` Range
+        headers are ignored and the whole file is sent.
+        """
+        path = pdf.file_path
+        if optimized and pdf.optimized_path and not request.args.get('original', type=int):
+            path = pdf.optimized_path
+        try:
+            stat = os.stat(path)
+        except OSError:
+            if path == pdf.file_path:
+                abort(404)
+            path = pdf.file_path  # copy pruned or not yet synced: fall back to the original
+            try:
+                stat = os.stat(path)
+            except OSError:
+                abort(404)
+        etag = hashlib.sha1(f'{pdf.id}:{path}:{stat.st_size}:{stat.st_mtime_ns}'.encode()).hexdigest()
+        response = send_file(path,
+                             mimetype='application/pdf',
+                             as_attachment=as_attachment,
+                             download_name=download_name,
+                             conditional=ranges,
+                             etag=etag,
+                             last_modified=stat.st_mtime)
+        if ranges:
+            response.accept_ranges = 'bytes'
+        else:
+            # still answer If-None-Match/If-Modified-Since with 304
+            response = response.make_conditional(request.environ, accept_ranges=False)
+            response.accept_ranges = 'none'
+        if shared:
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+        else:
+            response.cache_control.no_cache = None
+            if pdf.is_public:
+                response.cache_control.public = True
+            else:
+                response.cache_control.private = True
+            response.cache_control.max_age = app.config['PDF_CACHE_MAX_AGE']
+        return response
     
     # Register blueprints
     app.register_blueprint(auth_bp)
@@ -109,29 +447,170 @@ def create_app(config_name='default'):
         page = request.args.get('page', 1, type=int)
         search_form = SearchForm()
         
-        # Get public PDFs or user's private PDFs
+        # Get public PDFs or user's private PDFs (read-only session: never waits on writers).
+        # Uploads waiting for their ingest job (no page_count yet) are only listed
+        # to their owner, marked as processing
+        pdfs_query = read_session().query(PDFFile)
+        processed = PDFFile.page_count.isnot(None)
         if current_user.is_authenticated:
-            pdfs_query = PDFFile.query.filter(
-                (PDFFile.is_public == True) | (PDFFile.user_id == current_user.id)
+            pdfs_query = pdfs_query.filter(
+                ((PDFFile.is_public == True) & processed) | (PDFFile.user_id == current_user.id)
             )
         else:
-            pdfs_query = PDFFile.query.filter_by(is_public=True)
+            pdfs_query = pdfs_query.filter(PDFFile.is_public == True, processed)
         
-        # Pagination
-        pdfs = pdfs_query.order_by(PDFFile.upload_date.desc()).paginate(
+        # Pagination (lean projection: cards never need text or paths)
+        pdfs = pdfs_query.options(PDFFile.listing_options())\
+                         .order_by(PDFFile.upload_date.desc()).paginate(
             page=page, per_page=app.config['PDFS_PER_PAGE'], error_out=False
         )
         
         return render_template('index.html', pdfs=pdfs, search_form=search_form)
 
+    def run_search():
+        query = request.args.get('q', '').strip()
+        field = request.args.get('in', 'all')
+        if field not in FIELDS:
+            field = 'all'
+        page = max(request.args.get('page', 1, type=int), 1)
+        per_page = min(request.args.get('per_page', app.config['PDFS_PER_PAGE'], type=int),
+                       app.config['SEARCH_MAX_PER_PAGE'])
+        results = search_backend.search(query, field, current_user, page, max(per_page, 1))
+        return query, field, results
+
+    @app.route('/search')
+    def search():
+        query, field, results = run_search()
+        search_form = SearchForm(formdata=None, query=query, search_in=field)
+        return render_template('search.html', query=query, field=field,
+                               results=results, search_form=search_form)
+
+    @app.route('/api/search')
+    def api_search():
+        query, field, results = run_search()
+        counts = PDFFile.share_counts([hit.pdf.id for hit in results.items])
+        return jsonify({
+            'query': query,
+            'in': field,
+            'page': results.page,
+            'per_page': results.per_page,
+            'has_next': results.has_next,
+            'results': [dict(hit.pdf.to_dict(counts.get(hit.pdf.id, 0)),
+                             rank=hit.rank, page=hit.page, snippet=str(hit.snippet))
+                        for hit in results.items]
+        })
+
+    @app.route('/api/pdfs')
+    def api_pdfs():
+        """Catalogue listing with keyset pagination: ?cursor=&limit=&owner=&public=&author=&from=&to="""
+        limit = min(max(request.args.get('limit', app.config['PDFS_PER_PAGE'], type=int), 1),
+                    app.config['API_MAX_PAGE_SIZE'])
+        query = read_session().query(PDFFile).options(PDFFile.listing_options())
+        if current_user.is_authenticated:
+            query = query.filter((PDFFile.is_public == True) | (PDFFile.user_id == current_user.id))
+        else:
+            query = query.filter_by(is_public=True)
+
+        owner = request.args.get('owner', type=int)
+        if owner is not None:
+            query = query.filter(PDFFile.user_id == owner)
+        public = request.args.get('public')
+        if public is not None:
+            query = query.filter(PDFFile.is_public == (public.lower() in ('1', 'true', 'yes')))
+        author = request.args.get('author')
+        if author:
+            query = query.filter(PDFFile.author == author)
+        try:
+            date_from = request.args.get('from')
+            if date_from:
+                query = query.filter(PDFFile.upload_date >= datetime.fromisoformat(date_from))
+            date_to = request.args.get('to')
+            if date_to:
+                query = query.filter(PDFFile.upload_date < datetime.fromisoformat(date_to))
+            pdfs, next_cursor = keyset_page(query, PDFFile, limit, request.args.get('cursor'))
+        except ValueError as e:
+            return jsonify({'error': f'Invalid parameter: {e}'}), 400
+
+        return jsonify({
+            'items': [pdf.to_summary_dict() for pdf in pdfs],
+            'limit': limit,
+            'next_cursor': next_cursor
+        })
+
+    def wants_json():
+        return request.accept_mimetypes.best == 'application/json'
+
+    @app.route('/upload', methods=['GET', 'POST'])
+    @login_required
+    def upload():
+        """Store an uploaded PDF and queue its processing; returns without waiting for it."""
+        form = PDFUploadForm()
+        if form.validate_on_submit():
+            file = form.file.data
+            header = file.stream.read(5)
+            file.stream.seek(0)
+            if not allowed_file(file.filename) or header != b'%PDF-':
+                if wants_json():
+                    return jsonify({'error': 'Please choose a PDF file'}), 400
+                flash('Please choose a PDF file', 'error')
+            else:
+                # hashed while streamed to disk; identical uploads share one stored copy
+                content_hash, path, size, _ = blob_store.put_stream(file.stream)
+                stored_name = f'{secrets.token_hex(8)}_{secure_filename(file.filename) or "document.pdf"}'
+                pdf = PDFFile(
+                    filename=stored_name,
+                    original_filename=file.filename,
+                    file_path=path,
+                    file_size=size,
+                    content_hash=content_hash,
+                    title=form.title.data or '',
+                    author=form.author.data or '',
+                    subject=form.subject.data or '',
+                    user_id=current_user.id,
+                    is_public=form.is_public.data
+                )
+                db.session.add(pdf)
+                db.session.flush()
+                job = enqueue('ingest', pdf.id, current_user.id)
+                db.session.commit()
+                if wants_json():
+                    return jsonify({
+                        'pdf_id': pdf.id,
+                        'job': job.to_dict(),
+                        'status_url': url_for('job_status', job_id=job.id)
+                    }), 202
+                flash('Upload received. It is listed as processing until its thumbnail and text are ready.', 'success')
+                return redirect(url_for('index'))
+        if request.method == 'POST' and wants_json():
+            return jsonify({'errors': form.errors}), 400
+        return render_template('upload.html', form=form)
+
+    @app.route('/api/pdfs/<int:pdf_id>/reprocess', methods=['POST'])
+    @login_required
+    def api_reprocess(pdf_id):
+        """Queue thumbnails, metadata and page text to be rebuilt for one document."""
+        pdf = PDFFile.query.get_or_404(pdf_id)
+        if pdf.user_id != current_user.id and not current_user.is_admin:
+            return jsonify({'error': 'Access denied'}), 403
+        job = enqueue('reprocess', pdf.id, current_user.id)
+        db.session.commit()
+        return jsonify({'job': job.to_dict(),
+                        'status_url': url_for('job_status', job_id=job.id)}), 202
+
+    @app.route('/api/jobs/<int:job_id>')
+    @login_required
+    def job_status(job_id):
+        """Status and progress of a background job, for polling after an upload."""
+        job = Job.query.get_or_404(job_id)
+        if job.user_id != current_user.id and not current_user.is_admin:
+            return jsonify({'error': 'Access denied'}), 403
+        return jsonify(job.to_dict())
+
     @app.route('/pdfs/<path:filename>')
     def serve_pdf(filename):
         """Serve a PDF by stored filename."""
         pdf = PDFFile.query.filter_by(filename=filename).first_or_404()
-        # ensure file exists on disk
-        if not os.path.exists(pdf.file_path):
-            abort(404)
-        return send_file(pdf.file_path, as_attachment=False)
+        return send_pdf(pdf, optimized=True)
 
     # Backwards-compatible route used by frontend JS
     @app.route('/pdf/<path:filename>')
@@ -147,30 +626,120 @@ def create_app(config_name='default'):
     def serve_pdf_by_id(pdf_id):
         """Serve a PDF by DB id (used by advanced preview)."""
         pdf = PDFFile.query.get_or_404(pdf_id)
-        if not os.path.exists(pdf.file_path):
-            abort(404)
-        return send_file(pdf.file_path, as_attachment=False)
+        return send_pdf(pdf, optimized=True)
 
     @app.route('/preview/<int:pdf_id>')
     def preview_json(pdf_id):
         """Return JSON metadata for advanced preview."""
         pdf = PDFFile.query.get_or_404(pdf_id)
+        sprites = None
+        if pdf.content_hash and can_view_pdf(pdf) and pdf_processor.sprites.has(pdf.content_hash):
+            sprites = url_for('preview_sprites', pdf_id=pdf.id, v=pdf.content_hash[:12])
         return jsonify({
             'id': pdf.id,
             'original_filename': pdf.original_filename,
-            'page_count': pdf.page_count or 1
+            'page_count': pdf.page_count or 1,
+            'sprites': sprites,
         })
 
+    def sprite_response(response, pdf, max_age):
+        response.cache_control.no_cache = None
+        response.cache_control.public = pdf.is_public or None
+        response.cache_control.private = not pdf.is_public or None
+        response.cache_control.max_age = max_age
+        return response
+
+    @app.route('/preview/<int:pdf_id>/sprites')
+    def preview_sprites(pdf_id):
+        """Sprite sheet index for the viewer's page strip; sheet URLs are filled in."""
+        pdf = PDFFile.query.get_or_404(pdf_id)
+        if not can_view_pdf(pdf) or not pdf.content_hash:
+            abort(404)
+        index = pdf_processor.sprites.load_index(pdf.content_hash)
+        if index is None:
+            abort(404)
+        version = pdf.content_hash[:12]
+        index['sheets'] = [url_for('preview_sprite_sheet', pdf_id=pdf.id, sheet=n, v=version)
+                           for n in range(index['sheets'])]
+        response = jsonify(index)
+        response.set_etag(pdf.content_hash)
+        return sprite_response(response, pdf, app.config['RENDER_CACHE_MAX_AGE']).make_conditional(request)
+
+    @app.route('/preview/<int:pdf_id>/sprites/<int:sheet>')
+    def preview_sprite_sheet(pdf_id, sheet):
+        """One sprite sheet image. URLs carry ?v=<hash prefix>, so clients may keep them."""
+        pdf = PDFFile.query.get_or_404(pdf_id)
+        if not can_view_pdf(pdf) or not pdf.content_hash:
+            abort(404)
+        path = os.path.abspath(pdf_processor.sprites.sheet_path(pdf.content_hash, sheet))
+        if not os.path.exists(path):
+            abort(404)
+        response = send_file(path, etag=f'{pdf.content_hash}-{sheet}', conditional=True)
+        return sprite_response(response, pdf, app.config['THUMBNAIL_CACHE_MAX_AGE'])
+
+    def can_view_pdf(pdf):
+        """Same visibility rule as the home page: public, or owned by the current user."""
+        if pdf.is_public:
+            return True
+        return current_user.is_authenticated and \
+            (pdf.user_id == current_user.id or current_user.is_admin)
+
+    def render_response(pdf_path, page, public, content_hash=None):
+        """Render a 1-based page of pdf_path per the scale/fmt/tile query args."""
+        fmt = request.args.get('fmt', 'png').lower()
+        fmt = 'jpeg' if fmt == 'jpg' else fmt
+        if fmt not in RENDER_FORMATS:
+            abort(400)
+        scale = request.args.get('scale', 1.0, type=float)
+        # clamp and round so clients cannot fill the cache with near-identical renders
+        scale = round(min(max(scale, app.config['RENDER_MIN_SCALE']),
+                          app.config['RENDER_MAX_SCALE']), 2)
+        tile = None
+        if request.args.get('tile'):
+            try:
+                col, row = (int(v) for v in request.args['tile'].split(','))
+            except ValueError:
+                abort(400)
+            tile = (col, row)
+
+        try:
+            etag = pdf_processor.render_key(pdf_path, page - 1, scale, fmt, tile, content_hash)
+            if etag in request.if_none_match:
+                data = b''
+            else:
+                data = pdf_processor.render_page(pdf_path, page - 1, scale, fmt, tile, content_hash)
+        except (OSError, ValueError):
+            abort(404)
+        except SandboxError as e:
+            logger.warning('Render of %s page %d stopped: %s', pdf_path, page, e)
+            abort(422)
+
+        response = app.response_class(data, mimetype=RENDER_FORMATS[fmt])
+        response.set_etag(etag)
+        if public:
+            response.cache_control.public = True
+        else:
+            response.cache_control.private = True
+        response.cache_control.max_age = app.config['RENDER_CACHE_MAX_AGE']
+        return response.make_conditional(request)
+
+    @app.route('/render/<int:pdf_id>/<int:page>')
+    def render_page(pdf_id, page):
+        """Render one page (1-based) or one tile of it: ?scale=&fmt=png|webp|jpeg&tile=col,row"""
+        pdf = PDFFile.query.get_or_404(pdf_id)
+        if not can_view_pdf(pdf):
+            abort(404)
+        return render_response(pdf.file_path, page, pdf.is_public, pdf.content_hash)
+
     @app.route('/thumbnails/<path:filename>')
     def serve_thumbnail(filename):
         """Serve a thumbnail image from the thumbnails folder."""
         thumb_folder = app.config.get('THUMBNAIL_FOLDER')
         if not thumb_folder:
             abort(404)
-        path = os.path.join(thumb_folder, filename)
-        if not os.path.exists(path):
-            abort(404)
-        return send_file(path, mimetype='image/png', as_attachment=False)
+        # content-addressed names never change content, so let clients keep them
+        return send_from_directory(os.path.abspath(thumb_folder), filename,
+                                   max_age=app.config['THUMBNAIL_CACHE_MAX_AGE'])
     
     # ... existing routes (search, upload, serve_pdf, serve_thumbnail, pdf_preview, api/pdfs, admin) ...
     
@@ -219,8 +788,7 @@ def create_app(config_name='default'):
                 description=form.description.data
             )
             
-            db.session.add(share)
-            db.session.commit()
+            add_and_commit(share)
             
             share_url = share.get_share_url(request.host_url)
             flash(f'Share link created successfully!', 'success')
@@ -236,69 +804,151 @@ def create_app(config_name='default'):
     
     @app.route('/shared/<share_token>', methods=['GET', 'POST'])
     def shared_pdf(share_token):
-        share = Share.query.filter_by(share_token=share_token).first_or_404()
+        share = resolve_share_or_404(share_token)
+        resolver = get_share_resolver()
+        now = datetime.utcnow()
         
         # Check if share is active
-        if not share.is_active():
-            if share.is_expired():
+        if not share.is_active(now):
+            if share.is_expired(now):
                 return render_template('share_expired.html'), 410
             else:
                 return render_template('share_limit_reached.html'), 410
         
-        # Check password if set
-        if share.password_hash:
+        # Check password if set; once verified, a signed grant cookie stands in for it
+        if not has_share_grant(share):
             if request.method == 'POST':
                 password = request.form.get('password')
                 if password and check_password_hash(share.password_hash, password):
                     # Password correct, show the file
-                    share.record_access()
-                    return render_template('shared_view.html', share=share)
+                    if not resolver.record_access(share):
+                        return render_template('share_limit_reached.html'), 410
+                    response = make_response(render_template('shared_view.html', share=share))
+                    return issue_share_grant(response, share)
                 else:
                     flash('Invalid password', 'error')
             return render_template('share_password.html', share=share)
         
-        # No password required, show the file
-        if request.method == 'GET':
-            share.record_access()
+        # No password required (or already granted), show the file
+        if request.method == 'GET' and not resolver.record_access(share):
+            return render_template('share_limit_reached.html'), 410
         
         return render_template('shared_view.html', share=share)
     
     @app.route('/shared/<share_token>/download')
     def shared_download(share_token):
-        share = Share.query.filter_by(share_token=share_token).first_or_404()
+        share = resolve_share_or_404(share_token)
         
         # Check if share is active
         if not share.is_active():
             abort(410)
+        if not has_share_grant(share):
+            abort(403)
         
         # Check if download is allowed
         if not share.allow_download:
             flash('Download is not allowed for this shared file', 'error')
             return redirect(url_for('shared_pdf', share_token=share_token))
         
-        share.record_access()
-        return send_file(share.pdf_file.file_path, 
-                        as_attachment=True, 
-                        download_name=share.pdf_file.original_filename)
+        # a limited share always sends, and counts, the whole file: a client could
+        # otherwise fetch it in ranges that skip byte 0 and never use up the limit
+        limited = share.max_access_count > 0
+        response = send_pdf(share.pdf_file,
+                            as_attachment=True,
+                            download_name=share.pdf_file.original_filename,
+                            shared=True,
+                            ranges=not limited)
+        # on an unlimited share the count is only a statistic: every response carrying
+        # byte 0 is a download, resumed ranges and 304 revalidations are free
+        starts_file = response.status_code == 200 or (
+            response.status_code == 206 and response.content_range.start == 0)
+        if starts_file and not get_share_resolver().record_access(share):
+            response.close()
+            abort(410)
+        return response
     
     @app.route('/shared/<share_token>/preview')
     def shared_preview(share_token):
-        share = Share.query.filter_by(share_token=share_token).first_or_404()
+        share = resolve_share_or_404(share_token)
         
         if not share.is_active():
             abort(410)
+        if not has_share_grant(share):
+            abort(403)
         
-        return send_file(share.pdf_file.file_path, as_attachment=False)
+        return send_pdf(share.pdf_file, shared=True, optimized=True)
+    
+    @app.route('/shared/<share_token>/render/<int:page>')
+    def shared_render(share_token, page):
+        """Server-side page render for a shared file (same query args as /render)."""
+        share = resolve_share_or_404(share_token)
+        if not share.is_active():
+            abort(410)
+        if not has_share_grant(share):
+            abort(403)
+        return render_response(share.pdf_file.file_path, page, False, share.pdf_file.content_hash)
     
+    def id_list(name):
+        """Integer ids from repeated and/or comma-separated query args (?ids=1,2&ids=3)."""
+        ids = []
+        for value in request.args.getlist(name):
+            for part in value.split(','):
+                if part.strip():
+                    try:
+                        ids.append(int(part))
+                    except ValueError:
+                        abort(400)
+        return ids
+
+    @app.route('/export.zip')
+    @login_required
+    def export_zip():
+        """Stream a ZIP of the chosen documents (?ids=) and/or the files behind shares (?shares=)."""
+        pdf_ids = set(id_list('ids'))
+        share_ids = id_list('shares')
+        if share_ids:
+            shares = Share.query.filter(Share.id.in_(share_ids)).all()
+            # same ownership rule as share_pdf
+            if any(s.user_id != current_user.id and not current_user.is_admin for s in shares):
+                abort(403)
+            pdf_ids.update(s.pdf_file_id for s in shares)
+        if not pdf_ids:
+            abort(400)
+        if len(pdf_ids) > app.config['EXPORT_MAX_FILES']:
+            abort(413)
+
+        pdfs = PDFFile.query.options(load_only(PDFFile.id, PDFFile.filename, PDFFile.original_filename,
+                                               PDFFile.file_path, PDFFile.user_id))\
+                            .filter(PDFFile.id.in_(pdf_ids)).order_by(PDFFile.id).all()
+        if len(pdfs) != len(pdf_ids):
+            abort(404)
+        if any(pdf.user_id != current_user.id and not current_user.is_admin for pdf in pdfs):
+            abort(403)
+
+        response = app.response_class(stream_zip(archive_names(pdfs)), mimetype='application/zip')
+        response.headers['Content-Disposition'] = \
+            f'attachment; filename="pdfs-{datetime.utcnow():%Y%m%d-%H%M%S}.zip"'
+        response.cache_control.private = True
+        response.cache_control.no_store = True
+        return response
+
     @app.route('/manage-shares')
     @login_required
     def manage_shares():
-        shares = Share.query.filter_by(user_id=current_user.id)\
-                          .order_by(Share.created_at.desc())\
-                          .all()
+        # split and paginate in SQL (ix_share_user_expires); cards only need the file name
+        now = datetime.utcnow()
+        per_page = app.config['SHARES_PER_PAGE']
+        shares = Share.query.filter_by(user_id=current_user.id).options(
+            joinedload(Share.pdf_file).load_only(PDFFile.id, PDFFile.original_filename))
         
-        active_shares = [s for s in shares if s.is_active()]
-        expired_shares = [s for s in shares if not s.is_active()]
+        active_shares = shares.filter(Share.active_clause(now))\
+                              .order_by(Share.created_at.desc()).paginate(
+            page=request.args.get('page', 1, type=int), per_page=per_page, error_out=False
+        )
+        expired_shares = shares.filter(not_(Share.active_clause(now)))\
+                               .order_by(Share.expires_at.desc()).paginate(
+            page=request.args.get('expired_page', 1, type=int), per_page=per_page, error_out=False
+        )
         
         return render_template('manage_shares.html', 
                              active_shares=active_shares,
@@ -316,6 +966,7 @@ def create_app(config_name='default'):
         
         db.session.delete(share)
         db.session.commit()
+        get_share_resolver().invalidate(share.share_token)
         
         flash('Share link deleted successfully', 'success')
         return redirect(url_for('manage_shares'))
@@ -347,8 +998,7 @@ def create_app(config_name='default'):
             description=data.get('description', '')
         )
         
-        db.session.add(share)
-        db.session.commit()
+        add_and_commit(share)
         
         return jsonify(share.to_dict())
     
@@ -0,0 +1,143 @@
+"""Fingerprinted, precompressed static assets.
+
+tools/build_assets.py copies every file listed in ASSETS from static/ to
+ASSET_FOLDER. Each copy is renamed to ``<name>.<sha256 prefix>.<ext>`` and
+written next to gzip and (with the optional ``brotli`` package) brotli
+variants. A manifest maps the logical names to the built ones.
+Templates link assets through asset_url('js/script.js'). /assets/ serves
+the smallest variant the client accepts, with immutable cache headers:
+a changed file gets a new name, so nothing is ever revalidated.
+
+Without a build, asset_url() falls back to the plain /static/ URL, so a
+checkout works as before.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+
+from flask import abort, request, send_from_directory, url_for
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+# logical names under static/ that are built, including the vendored PDF.js
+# library and worker (ES modules since PDF.js 4)
+ASSETS = (
+    'css/style.css',
+    'js/script.js',
+    'js/pdfjs_viewer.js',
+    'vendor/pdfjs/pdf.mjs',
+    'vendor/pdfjs/pdf.worker.mjs',
+)
+MANIFEST_NAME = 'manifest.json'
+# variants in order of preference: (Content-Encoding, suffix)
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def fingerprint(name, data):
+    root, ext = os.path.splitext(name)
+    return f'{root}.{hashlib.sha256(data).hexdigest()[:12]}{ext}'
+
+
+def _write(path, data):
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def build_assets(static_folder, out_folder, names=ASSETS):
+    """Fingerprint and precompress ``names``; returns the manifest written.
+
+    Files missing from static_folder are skipped (and left out of the
+    manifest). Built files from earlier runs are removed once the new
+    manifest is in place.
+    """
+    manifest = {}
+    for name in names:
+        source = os.path.join(static_folder, name)
+        if not os.path.exists(source):
+            continue
+        with open(source, 'rb') as f:
+            data = f.read()
+        built = fingerprint(name, data)
+        target = os.path.join(out_folder, built)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        _write(target, data)
+        _write(target + '.gz', gzip.compress(data, compresslevel=9, mtime=0))
+        if brotli is not None:
+            _write(target + '.br', brotli.compress(data, quality=11))
+        manifest[name] = built
+
+    old = load_manifest(out_folder)
+    _write(os.path.join(out_folder, MANIFEST_NAME), json.dumps(manifest, indent=2).encode())
+    for name, built in old.items():
+        if manifest.get(name) != built:
+            for suffix in ('', '.gz', '.br'):
+                try:
+                    os.remove(os.path.join(out_folder, built + suffix))
+                except OSError:
+                    pass
+    return manifest
+
+
+def load_manifest(out_folder):
+    try:
+        with open(os.path.join(out_folder, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+class AssetManifest:
+    def __init__(self, static_folder, out_folder):
+        self.static_folder = static_folder
+        self.out_folder = out_folder
+        self.files = load_manifest(out_folder)
+        self.built = set(self.files.values())
+
+    def url(self, name, default=None):
+        """URL of a static asset: the fingerprinted build, else /static/, else ``default``."""
+        built = self.files.get(name)
+        if built:
+            return url_for('asset', filename=built)
+        if os.path.exists(os.path.join(self.static_folder, name)):
+            return url_for('static', filename=name)
+        return default
+
+
+def init_assets(app):
+    """Register asset_url() for templates and the /assets/ route."""
+    out_folder = os.path.join(app.root_path, app.config['ASSET_FOLDER'])
+    assets = AssetManifest(app.static_folder, out_folder)
+    app.extensions['assets'] = assets
+    app.add_template_global(assets.url, 'asset_url')
+
+    @app.route('/assets/<path:filename>')
+    def asset(filename):
+        """A built asset, precompressed if the client accepts it; cached for good."""
+        if filename not in assets.built:
+            abort(404)
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        encoding = None
+        for candidate, suffix in ENCODINGS:
+            if request.accept_encodings[candidate] and \
+                    os.path.exists(os.path.join(out_folder, filename + suffix)):
+                encoding = candidate
+                filename += suffix
+                break
+        response = send_from_directory(out_folder, filename, mimetype=mimetype,
+                                       max_age=app.config['ASSET_CACHE_MAX_AGE'])
+        if encoding:
+            response.content_encoding = encoding
+        response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+    return assets
+
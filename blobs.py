@@ -0,0 +1,88 @@
+"""Content-addressed store for uploaded PDFs.
+
+Uploads are written to ``PDF_BLOB_FOLDER/<hh>/<sha256>.pdf``, hashed while
+they stream to disk. A file that is already stored is not written a second
+time, so every PDFFile row with the same content_hash points at one copy.
+
+Web-optimized derivatives (see optimize.py) use the same layout under
+PDF_OPTIMIZED_FOLDER, keyed by the hash of the original they were made from.
+"""
+import hashlib
+import os
+import re
+import threading
+import time
+
+from thumbnails import CHUNK_SIZE
+
+NAME_RE = re.compile(r'^([0-9a-f]{64})\.pdf$')
+
+
+class BlobStore:
+    def __init__(self, root):
+        self.root = root
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config['PDF_BLOB_FOLDER'])
+
+    def path(self, content_hash):
+        return os.path.join(self.root, content_hash[:2], f'{content_hash}.pdf')
+
+    def has(self, content_hash):
+        return os.path.exists(self.path(content_hash))
+
+    def temp_path(self):
+        """A private path inside the store for writing a file before put_file()."""
+        os.makedirs(self.root, exist_ok=True)
+        return os.path.join(self.root, f'.write.{os.getpid()}.{threading.get_ident()}.tmp')
+
+    def put_file(self, content_hash, tmp_path):
+        """Move a finished file (from temp_path()) into place; returns its absolute path."""
+        path = os.path.abspath(self.path(content_hash))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+        return path
+
+    def prune(self, referenced_hashes, grace_seconds=3600):
+        """Delete stored files whose hash is not referenced. Returns the number removed."""
+        keep = set(referenced_hashes)
+        cutoff = time.time() - grace_seconds
+        removed = 0
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            for fname in filenames:
+                match = NAME_RE.match(fname)
+                if not match or match.group(1) in keep:
+                    continue
+                path = os.path.join(dirpath, fname)
+                try:
+                    if os.path.getmtime(path) > cutoff:
+                        continue
+                    os.remove(path)
+                    removed += 1
+                except OSError:
+                    continue
+        return removed
+
+    def put_stream(self, stream):
+        """Store a file-like object; returns (content_hash, absolute path, size, is_new)."""
+        os.makedirs(self.root, exist_ok=True)
+        tmp = os.path.join(self.root, f'.upload.{os.getpid()}.{threading.get_ident()}.tmp')
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with open(tmp, 'wb') as f:
+                for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                    digest.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+            content_hash = digest.hexdigest()
+            path = os.path.abspath(self.path(content_hash))
+            if os.path.exists(path):
+                return content_hash, path, size, False
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp, path)
+            return content_hash, path, size, True
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
@@ -0,0 +1,192 @@
+"""Small, dependency-free caches shared by the rendering and request paths."""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Thread-safe in-memory LRU bounded by entry count and, optionally, total bytes."""
+
+    def __init__(self, max_items=256, max_bytes=None):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value, size = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, size=0):
+        if self.max_bytes and size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old:
+                self._bytes -= old[1]
+            self._data[key] = (value, size)
+            self._bytes += size
+            while self._data and (len(self._data) > self.max_items or
+                                  (self.max_bytes and self._bytes > self.max_bytes)):
+                _, (_, evicted) = self._data.popitem(last=False)
+                self._bytes -= evicted
+
+    def pop(self, key):
+        with self._lock:
+            item = self._data.pop(key, None)
+            if item:
+                self._bytes -= item[1]
+                return item[0]
+            return None
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'items': len(self._data), 'bytes': self._bytes}
+
+
+class TTLCache:
+    """Thread-safe in-memory cache whose entries expire ``ttl`` seconds after being set.
+
+    Bounded by entry count; the least recently used entry is evicted first.
+    """
+
+    def __init__(self, max_items=1024, ttl=30):
+        self.max_items = max_items
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[1] <= time.monotonic():
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            while len(self._data) > self.max_items:
+                self._data.popitem(last=False)
+
+    def replace(self, key, value):
+        """Swap the value of a live entry without extending its lifetime."""
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                self._data[key] = (value, item[1])
+
+    def pop(self, key):
+        with self._lock:
+            item = self._data.pop(key, None)
+            return item[0] if item else None
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'items': len(self._data)}
+
+
+class DiskCache:
+    """Directory of cached blobs with LRU eviction once it grows past ``max_bytes``.
+
+    Reads refresh a file's mtime, so eviction (oldest mtime first) approximates
+    least-recently-used across every process sharing the directory.
+    """
+
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._bytes = None
+        self._lock = threading.Lock()
+
+    def path(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+    def get(self, key):
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return data
+
+    def set(self, key, data):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+        with self._lock:
+            if self._bytes is None:
+                self._bytes = self._scan_size()
+            else:
+                self._bytes += len(data)
+            if self._bytes > self.max_bytes:
+                self._evict()
+
+    def _entries(self):
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            for fname in filenames:
+                path = os.path.join(dirpath, fname)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                yield st.st_mtime, st.st_size, path
+
+    def _scan_size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self):
+        """Drop least recently used files until the cache is back under 90% of its budget."""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                continue
+        self._bytes = total
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'bytes': self._bytes or 0}
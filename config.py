@@ -5,36 +5,145 @@ class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'your-secret-key-here'
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///app.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLITE_PRAGMAS = {}  # PRAGMA name -> value, run on every new SQLite connection
+    DB_RETRY_ATTEMPTS = 5  # tries for writes that hit "database is locked"
+    DB_RETRY_DELAY = 0.02  # seconds before the first retry, doubled on each attempt
+    DB_READ_SESSION = False  # listing pages use a separate read-only engine
+    SQLALCHEMY_READ_DATABASE_URI = os.environ.get('READ_DATABASE_URL')  # default: the main database
     
     # PDF Configuration
     PDF_FOLDER = 'pdfs'
     UPLOAD_FOLDER = 'pdfs/user_uploads'
+    PDF_BLOB_FOLDER = 'pdfs/blobs'  # uploads, stored once per distinct content
     THUMBNAIL_FOLDER = 'pdfs/thumbnails'
+    PDF_OPTIMIZED_FOLDER = 'pdfs/optimized'  # web-optimized copies, one per distinct content
     MAX_CONTENT_LENGTH = 50 * 1024 * 1024  # 50MB max file size
+    PDF_CACHE_MAX_AGE = 7 * 24 * 3600  # browsers revalidate with the ETag after this
     
     # Thumbnail Configuration
     THUMBNAIL_SIZE = (200, 280)
+    # Sizes rendered for every document; 'grid' is the one stored on PDFFile
+    THUMBNAIL_PRESETS = {
+        'grid': (200, 280),
+        'retina': (400, 560),
+        'list': (64, 90),
+    }
+    THUMBNAIL_FORMAT = 'webp'  # 'avif' needs a Pillow AVIF plugin; falls back to webp/png
+    THUMBNAIL_QUALITY = 80
+    THUMBNAIL_CACHE_MAX_AGE = 365 * 24 * 3600  # thumbnails are content-addressed
     MAX_PREVIEW_PAGES = 3
     
+    # Web-optimized copies for the viewer (see optimize.py)
+    OPTIMIZE_PDFS = True
+    OPTIMIZE_MIN_SAVING = 0.05  # keep a copy only if it is at least this much smaller
+    OPTIMIZE_IMAGE_DPI = 150  # resample images placed at a higher resolution; None keeps them
+    OPTIMIZE_IMAGE_QUALITY = 75
+    
+    # Static assets built by tools/build_assets.py (see assets.py)
+    ASSET_FOLDER = 'static/dist'  # relative to the app directory
+    ASSET_CACHE_MAX_AGE = 365 * 24 * 3600  # built names are content-hashed
+    
+    # Page sprite sheets for the viewer's page strip (see sprites.py)
+    SPRITE_FOLDER = 'pdfs/sprites'
+    SPRITE_CELL = (80, 112)  # each page is scaled to fit this box
+    SPRITE_COLUMNS = 10
+    SPRITE_PAGES_PER_SHEET = 200
+    SPRITE_MAX_PAGES = 2000  # later pages get no preview
+    SPRITE_FORMAT = 'webp'
+    SPRITE_QUALITY = 60
+    
+    # Page rendering (/render/<pdf_id>/<page>)
+    RENDER_CACHE_FOLDER = 'pdfs/render_cache'
+    RENDER_POOL_SIZE = 8  # open documents kept per process
+    RENDER_CACHE_ITEMS = 512
+    RENDER_CACHE_BYTES = 64 * 1024 * 1024  # in-memory render cache per process
+    RENDER_DISK_CACHE_BYTES = 2 * 1024 * 1024 * 1024
+    RENDER_MIN_SCALE = 0.25
+    RENDER_MAX_SCALE = 4.0
+    RENDER_QUALITY = 80
+    TILE_SIZE = 512  # pixels per tile edge
+    RENDER_MAX_PIXELS = 16 * 1000 * 1000  # whole-page renders are scaled down to fit
+    RENDER_CACHE_MAX_AGE = 24 * 3600
+    
+    # Untrusted documents are analysed in a child process with these limits
+    # (see sandbox.py); a PDF that exceeds them fails its job
+    SANDBOX_PROCESSING = True
+    SANDBOX_MEMORY_MB = 1024  # address space of the child, including the interpreter
+    SANDBOX_TIMEOUT = 120  # seconds per document
+    SANDBOX_RENDERS = False  # also run /render cache misses in a child (slower)
+    RENDER_TIMEOUT = 20  # seconds per sandboxed render
+    
+    # Background jobs (tools/ingest_worker.py)
+    JOB_MAX_ATTEMPTS = 5
+    JOB_RETRY_BASE = 30  # seconds before the first retry, doubled on each failure
+    JOB_RETRY_MAX = 3600
+    JOB_LOCK_TIMEOUT = 30 * 60  # a running job silent for this long is reclaimed
+    JOB_POLL_INTERVAL = 2
+    
+    # Share links: hits on unlimited shares are counted in memory and written
+    # in batches; limited shares are always counted in the database at once
+    SHARE_ACCESS_BUFFER = True
+    SHARE_ACCESS_FLUSH_INTERVAL = 10  # seconds
+    SHARE_ACCESS_FLUSH_SIZE = 1000  # distinct shares pending before an early flush
+    SHARE_CACHE_TTL = 30  # seconds a resolved share link is reused per process
+    SHARE_CACHE_ITEMS = 4096
+    SHARE_GRANT_MAX_AGE = 3600  # seconds a verified share password stays valid
+    SHARES_PER_PAGE = 20
+    SHARE_RETENTION_DAYS = 30  # expired shares are swept this long after they stop working
+    SHARE_SWEEP_INTERVAL = 3600  # seconds between sweeps by an idle ingest worker; 0 disables
+    SHARE_SWEEP_BATCH = 500
+    
     # Search Configuration
     ENABLE_TEXT_SEARCH = True
+    SEARCH_BACKEND = os.environ.get('SEARCH_BACKEND', '')  # '' = fts5 on SQLite, like elsewhere
+    SEARCH_MAX_PER_PAGE = 100
     # LLM / Model configuration: set to empty string to disable LLM usage
     # Example: export DEFAULT_LLM=""  (disables); export DEFAULT_LLM="claude-haiku" (enables)
     DEFAULT_LLM = os.environ.get('DEFAULT_LLM', '')
     
+    # Bulk export (/export.zip, tools/export_zip.py)
+    EXPORT_MAX_FILES = 500
+    
+    # Instrumentation (/metrics)
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')  # if set, scrapers send "Authorization: Bearer <token>"
+    METRICS_PUBLIC = True  # without a token, serve /metrics to anyone (False: refuse with 403)
+    METRICS_SERVER_TIMING = False  # add a Server-Timing header (app and SQL time) to every response
+    PROFILE_SLOW_REQUESTS = False  # sample request stacks and keep profiles of slow ones
+    PROFILE_THRESHOLD_MS = 1000
+    PROFILE_INTERVAL = 0.005  # seconds between stack samples
+    PROFILE_FOLDER = 'instance/profiles'
+    
     # Pagination
     PDFS_PER_PAGE = 12
+    API_MAX_PAGE_SIZE = 100
     
     ALLOWED_EXTENSIONS = {'pdf'}
     
     # Session configuration
     PERMANENT_SESSION_LIFETIME = timedelta(days=7)
+    USER_CACHE_TTL = 60  # seconds a loaded user is reused per process
+    USER_CACHE_ITEMS = 10000
 
 class DevelopmentConfig(Config):
     DEBUG = True
 
 class ProductionConfig(Config):
     DEBUG = False
+    METRICS_PUBLIC = False  # /metrics needs METRICS_TOKEN
+    # WAL lets readers run alongside the single writer; writers queue for up to
+    # busy_timeout ms instead of failing with "database is locked"
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'wal',
+        'synchronous': 'normal',  # durable at checkpoints; safe with WAL
+        'busy_timeout': 15000,
+        'cache_size': -65536,  # KiB per connection
+        'mmap_size': 256 * 1024 * 1024,
+        'temp_store': 'memory',
+    }
+    # sized for gunicorn --threads 4 plus the share-access flusher
+    SQLALCHEMY_ENGINE_OPTIONS = {'pool_size': 6, 'max_overflow': 4, 'pool_timeout': 15}
+    DB_READ_SESSION = True
+    DB_READ_ENGINE_OPTIONS = {'pool_size': 4, 'max_overflow': 8, 'pool_timeout': 15}
 
 config = {
     'development': DevelopmentConfig,
@@ -0,0 +1,99 @@
+"""Engine tuning, write retries and the read-only listing session.
+
+SQLite allows one writer at a time. In its default rollback-journal mode a
+writer also blocks every reader, so a single share hit can stall the home
+page. With SQLITE_PRAGMAS set (ProductionConfig turns on WAL), every new
+connection is configured on connect. Readers then never wait for writers,
+and writers wait up to busy_timeout for each other instead of failing at
+once.
+
+One case busy_timeout cannot cover is a transaction that has read and then
+tries to write while another connection has written since. SQLite fails
+that at once. retry_on_locked() rolls back and runs the unit of work again
+with a short backoff.
+
+With DB_READ_SESSION on, listing pages query through read_session(). This
+is a separate engine and connection pool (SQLite connections are opened
+with query_only), so listings never queue for the connections that writes
+use. SQLALCHEMY_READ_DATABASE_URI can point it at a replica instead.
+"""
+import functools
+import random
+import time
+
+from flask import current_app
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import scoped_session, sessionmaker
+
+
+def _pragma_listener(pragmas):
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+    return set_pragmas
+
+
+def is_locked_error(error):
+    message = str(getattr(error, 'orig', error)).lower()
+    return 'database is locked' in message or 'database is busy' in message
+
+
+def retry_on_locked(func):
+    """Re-run ``func`` after a rollback when SQLite reports the database as locked.
+
+    ``func`` must be a complete unit of work that ends in a commit, so
+    running it again from the start is safe. Attempts and backoff come from
+    DB_RETRY_ATTEMPTS and DB_RETRY_DELAY.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        attempts = current_app.config['DB_RETRY_ATTEMPTS']
+        delay = current_app.config['DB_RETRY_DELAY']
+        session = current_app.extensions['sqlalchemy'].session
+        for attempt in range(1, attempts + 1):
+            try:
+                return func(*args, **kwargs)
+            except OperationalError as e:
+                session.rollback()
+                if attempt == attempts or not is_locked_error(e):
+                    raise
+                time.sleep(delay * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+    return wrapper
+
+
+def read_session():
+    """Session for read-only listing queries; the normal session when none is configured."""
+    return current_app.extensions.get('read_session') or current_app.extensions['sqlalchemy'].session
+
+
+def init_database(app, db):
+    """Apply SQLITE_PRAGMAS to the app's engines and set up the read session if enabled."""
+    pragmas = app.config.get('SQLITE_PRAGMAS') or {}
+    with app.app_context():
+        engine = db.engine
+        if engine.dialect.name == 'sqlite' and pragmas:
+            for bound in db.engines.values():
+                event.listen(bound, 'connect', _pragma_listener(pragmas))
+
+        if not app.config.get('DB_READ_SESSION'):
+            return None
+        url = app.config.get('SQLALCHEMY_READ_DATABASE_URI') or engine.url
+        read_engine = create_engine(url, **app.config.get('DB_READ_ENGINE_OPTIONS', {}))
+        if read_engine.dialect.name == 'sqlite':
+            if read_engine.url.database in (None, '', ':memory:'):
+                read_engine.dispose()
+                return None  # a second connection would see a different, empty database
+            event.listen(read_engine, 'connect', _pragma_listener(dict(pragmas, query_only='ON')))
+
+    session = scoped_session(sessionmaker(bind=read_engine, query_cls=db.Query),
+                             scopefunc=db.session.registry.scopefunc)
+    app.extensions['read_session'] = session
+
+    @app.teardown_appcontext
+    def remove_read_session(exc):
+        session.remove()
+
+    return session
@@ -0,0 +1,21 @@
+#!/bin/bash
+# Runs the web server and the ingest worker (tools/ingest_worker.py) side by side,
+# so uploads are processed in a single container. Set INGEST_WORKERS=0 when the
+# workers run as a separate service, e.g. a second container with the command
+# "python tools/ingest_worker.py --processes 2" and the same volumes.
+# If either process exits, the other is stopped and the container exits with it.
+
+INGEST_WORKERS=${INGEST_WORKERS:-1}
+
+if [ "$INGEST_WORKERS" -gt 0 ]; then
+    python tools/ingest_worker.py --processes "$INGEST_WORKERS" &
+fi
+
+gunicorn --bind 0.0.0.0:5000 'app:create_app()' --workers 2 --threads 4 &
+
+trap 'kill -TERM $(jobs -p) 2>/dev/null' TERM INT
+wait -n
+status=$?
+kill -TERM $(jobs -p) 2>/dev/null
+wait
+exit $status
@@ -0,0 +1,74 @@
+"""Streaming ZIP export of stored PDFs.
+
+stream_zip() yields the archive while it is being written. Each file is
+copied through in fixed-size chunks, so memory use does not grow with the
+number or size of the documents, and the first bytes go out before the
+last file is read. PDFs are already compressed internally, so they are
+stored rather than deflated.
+"""
+import io
+import os
+import zipfile
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class _StreamSink(io.RawIOBase):
+    """Write-only, unseekable buffer the ZipFile writes into and stream_zip drains."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def archive_names(pdfs):
+    """(arcname, path) pairs for PDFFile rows, with clashing names made unique."""
+    seen = set()
+    entries = []
+    for pdf in pdfs:
+        base, ext = os.path.splitext(os.path.basename(pdf.original_filename or pdf.filename))
+        name = f'{base}{ext}'
+        n = 2
+        while name.lower() in seen:
+            name = f'{base} ({n}){ext}'
+            n += 1
+        seen.add(name.lower())
+        entries.append((name, pdf.file_path))
+    return entries
+
+
+def stream_zip(entries, chunk_size=CHUNK_SIZE):
+    """Yield a ZIP of (arcname, path) entries. Unreadable files are listed in MISSING.txt."""
+    sink = _StreamSink()
+    missing = []
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_STORED, allowZip64=True) as zf:
+        for arcname, path in entries:
+            try:
+                src = open(path, 'rb')
+            except OSError:
+                missing.append(arcname)
+                continue
+            with src:
+                info = zipfile.ZipInfo.from_file(path, arcname)
+                if not arcname.lower().endswith('.pdf'):
+                    info.compress_type = zipfile.ZIP_DEFLATED
+                with zf.open(info, 'w', force_zip64=info.file_size > zipfile.ZIP64_LIMIT) as dst:
+                    for chunk in iter(lambda: src.read(chunk_size), b''):
+                        dst.write(chunk)
+                        yield sink.drain()
+            yield sink.drain()
+        if missing:
+            zf.writestr('MISSING.txt', 'Files that could not be read:\n' + '\n'.join(missing) + '\n',
+                        compress_type=zipfile.ZIP_DEFLATED)
+    yield sink.drain()
@@ -0,0 +1,193 @@
+"""Durable background jobs stored in the ``job`` table.
+
+Requests enqueue() work and return at once. tools/ingest_worker.py processes
+claim jobs one at a time, report stage and progress as they go, and retry
+failures with exponential backoff. The queue lives in the app's own
+database, so no broker or extra service is needed.
+"""
+import logging
+import os
+import random
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import and_, or_, update
+
+from models import db, Job, PDFFile
+from pagetext import copy_page_texts, store_page_texts
+from sandbox import SandboxError
+from search import get_search_backend
+from thumbnails import file_sha256
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue(kind, pdf_file_id=None, user_id=None):
+    """Add a job to the caller's transaction; it becomes visible on commit."""
+    if kind not in HANDLERS:
+        raise ValueError(f'unknown job kind: {kind}')
+    job = Job(kind=kind, pdf_file_id=pdf_file_id, user_id=user_id,
+              max_attempts=current_app.config['JOB_MAX_ATTEMPTS'])
+    db.session.add(job)
+    return job
+
+
+def runnable(now):
+    """Queued jobs whose backoff has passed, plus running jobs whose worker went away."""
+    stale = now - timedelta(seconds=current_app.config['JOB_LOCK_TIMEOUT'])
+    return or_(and_(Job.status == Job.QUEUED, Job.run_after <= now),
+               and_(Job.status == Job.RUNNING, Job.locked_at < stale))
+
+
+def claim(worker_id, tries=5):
+    """Atomically take the oldest runnable job for ``worker_id``, or return None.
+
+    The claim is a conditional UPDATE re-checking the runnable condition, so
+    when two workers race for the same row exactly one of them wins.
+    """
+    for _ in range(tries):
+        now = datetime.utcnow()
+        job_id = db.session.query(Job.id).filter(runnable(now))\
+                           .order_by(Job.run_after, Job.id).limit(1).scalar()
+        if job_id is None:
+            db.session.commit()
+            return None
+        claimed = db.session.execute(
+            update(Job).where(Job.id == job_id, runnable(now))
+                       .values(status=Job.RUNNING, locked_by=worker_id, locked_at=now,
+                               attempts=Job.attempts + 1, stage=None, progress=0)
+        ).rowcount
+        db.session.commit()
+        if claimed:
+            return db.session.get(Job, job_id, populate_existing=True)
+    return None
+
+
+def report(job, stage, progress):
+    """Record the stage a job has reached; commits so pollers see it immediately."""
+    job.stage = stage
+    job.progress = progress
+    job.locked_at = datetime.utcnow()
+    db.session.commit()
+
+
+def finish(job):
+    job.status = Job.DONE
+    job.stage = None
+    job.progress = 100
+    job.last_error = None
+    job.locked_by = None
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
+
+
+def retry_delay(attempts):
+    """Exponential backoff with a little jitter, capped at JOB_RETRY_MAX seconds."""
+    base = current_app.config['JOB_RETRY_BASE']
+    delay = min(base * 2 ** (attempts - 1), current_app.config['JOB_RETRY_MAX'])
+    return delay * random.uniform(1.0, 1.2)
+
+
+def fail(job, error, retry=True):
+    """Requeue a failed job after its backoff, or give up once max_attempts is used."""
+    now = datetime.utcnow()
+    job.last_error = error
+    job.locked_by = None
+    if not retry or job.attempts >= job.max_attempts:
+        job.status = Job.FAILED
+        job.finished_at = now
+    else:
+        job.status = Job.QUEUED
+        job.run_after = now + timedelta(seconds=retry_delay(job.attempts))
+    db.session.commit()
+
+
+def run_job(job, processor):
+    """Run one claimed job to completion or failure. Returns the final status."""
+    job_id = job.id
+    try:
+        HANDLERS[job.kind](job, processor)
+    except Exception as e:
+        db.session.rollback()
+        job = db.session.get(Job, job_id)
+        # a document that broke the sandbox limits will break them again
+        fail(job, f'{type(e).__name__}: {e}', retry=not isinstance(e, SandboxError))
+        return job.status
+    finish(job)
+    return job.status
+
+
+def ingest(job, processor, force=False):
+    """Analyse a stored PDF: metadata, thumbnails, sprites, optimized copy, text and search index.
+
+    Every stage overwrites what a previous attempt left behind, so a job can
+    be retried from the start at any point.
+    """
+    pdf = db.session.get(PDFFile, job.pdf_file_id)
+    if pdf is None:
+        return  # deleted while queued
+
+    report(job, 'analyze', 10)
+    if force or not pdf.content_hash:
+        pdf.content_hash = file_sha256(pdf.file_path)
+    content_hash = pdf.content_hash
+    source = None if force else PDFFile.processed_copy(content_hash, exclude_id=pdf.id)
+    if source is not None:
+        # identical file already analysed: reuse its thumbnail and page text
+        report(job, 'text', 70)
+        pdf.reuse_analysis(source)
+        pdf.file_size = os.path.getsize(pdf.file_path)
+        pdf.extracted_text = None
+        copy_page_texts(source.id, pdf.id)
+        get_search_backend().index(pdf)
+        db.session.commit()
+        return
+
+    store = processor.thumbnails
+    have_thumbnails = not force and store.has_all(content_hash)
+    have_sprites = not force and processor.sprites.has(content_hash)
+    analysis = processor.analyze_isolated(pdf.file_path, thumbnail=not have_thumbnails, text=True,
+                                          sprites=not have_sprites)
+
+    report(job, 'thumbnails', 40)
+    if analysis.thumbnails:
+        pdf.thumbnail_path = os.path.abspath(store.save(content_hash, analysis.thumbnails))
+    elif have_thumbnails:
+        pdf.thumbnail_path = os.path.abspath(store.path(content_hash))
+    if analysis.sprites:
+        processor.sprites.save(content_hash, *analysis.sprites)
+
+    if current_app.config['OPTIMIZE_PDFS']:
+        report(job, 'optimize', 55)
+        try:
+            pdf.optimized_path = processor.optimize(pdf.file_path, content_hash, isolated=True,
+                                                    force=force)
+        except Exception:
+            # the original is always servable; a copy is only an improvement
+            logger.exception('Optimizing %s failed', pdf.file_path)
+            pdf.optimized_path = None
+
+    # values typed into the upload form win over the document's own metadata
+    meta = analysis.metadata
+    pdf.page_count = analysis.page_count
+    pdf.file_size = os.path.getsize(pdf.file_path)
+    pdf.title = pdf.title or meta.get('title') or ''
+    pdf.author = pdf.author or meta.get('author') or ''
+    pdf.subject = pdf.subject or meta.get('subject') or ''
+    pdf.extracted_text = None
+
+    report(job, 'text', 70)
+    store_page_texts(pdf.id, analysis.page_texts or (), replace=True)
+    get_search_backend().index(pdf)
+    db.session.commit()
+
+
+def reprocess(job, processor):
+    """Like ingest, but re-renders thumbnails, sprites and the optimized copy even if they exist."""
+    ingest(job, processor, force=True)
+
+
+HANDLERS = {
+    'ingest': ingest,
+    'reprocess': reprocess,
+}
@@ -0,0 +1,307 @@
+"""Request, SQL, PDF and cache instrumentation, exposed at /metrics.
+
+Counters and histograms live in this module and are per process, like the
+caches they describe; under several worker processes each worker reports
+its own numbers. /metrics renders them in the Prometheus text format. No
+client library is needed, and none is used.
+
+Every request records its duration, plus the number and total time of the
+SQL statements it ran (counted with SQLAlchemy cursor events). Opening,
+analysing and rendering PDFs is timed through pdf_timer(). Cache hit and
+miss counts are read from the caches themselves at scrape time.
+
+With PROFILE_SLOW_REQUESTS on, a background thread samples the stack of
+every in-flight request every PROFILE_INTERVAL seconds. Requests slower
+than PROFILE_THRESHOLD_MS have their samples written to PROFILE_FOLDER in
+the collapsed format that flamegraph.pl and speedscope read.
+"""
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter as StackCounter
+from contextlib import contextmanager
+from datetime import datetime
+
+from flask import Response, abort, current_app, g, has_request_context, request
+from sqlalchemy import event
+
+from models import db
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + '}'
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} counter'
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            yield f'{self.name}{_labels(self.labelnames, labels)} {value}'
+
+
+class Histogram:
+    def __init__(self, name, help, labelnames=(), buckets=DURATION_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._values = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            row = self._values.get(labels)
+            if row is None:
+                row = self._values[labels] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    row[i] += 1
+            row[-2] += value
+            row[-1] += 1
+
+    def render(self):
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} histogram'
+        names = self.labelnames + ('le',)
+        with self._lock:
+            items = sorted((labels, list(row)) for labels, row in self._values.items())
+        for labels, row in items:
+            for bound, count in zip(self.buckets, row):
+                yield f'{self.name}_bucket{_labels(names, labels + (bound,))} {count}'
+            yield f'{self.name}_bucket{_labels(names, labels + ("+Inf",))} {row[-1]}'
+            yield f'{self.name}_sum{_labels(self.labelnames, labels)} {row[-2]:.6f}'
+            yield f'{self.name}_count{_labels(self.labelnames, labels)} {row[-1]}'
+
+
+REQUEST_SECONDS = Histogram('http_request_duration_seconds', 'Time spent handling a request.',
+                            ('endpoint', 'method', 'status'))
+REQUEST_QUERIES = Histogram('http_request_db_queries', 'SQL statements executed per request.',
+                            ('endpoint',), QUERY_BUCKETS)
+REQUEST_DB_SECONDS = Histogram('http_request_db_seconds', 'Time spent in SQL per request.',
+                               ('endpoint',))
+DB_QUERIES = Counter('db_queries_total', 'SQL statements executed, in or out of requests.')
+DB_SECONDS = Counter('db_query_seconds_total', 'Time spent executing SQL statements.')
+PDF_SECONDS = Histogram('pdf_operation_seconds', 'Time spent opening, analysing and rendering PDFs.',
+                        ('operation',))
+PDF_ERRORS = Counter('pdf_errors_total', 'PDF operations that failed.', ('operation',))
+SLOW_PROFILES = Counter('slow_request_profiles_total', 'Slow-request profiles written.', ('endpoint',))
+
+METRICS = (REQUEST_SECONDS, REQUEST_QUERIES, REQUEST_DB_SECONDS, DB_QUERIES, DB_SECONDS,
+           PDF_SECONDS, PDF_ERRORS, SLOW_PROFILES)
+
+
+@contextmanager
+def pdf_timer(operation):
+    """Time a PDF operation; failures are counted and re-raised."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        PDF_ERRORS.inc(operation)
+        raise
+    finally:
+        PDF_SECONDS.observe(time.perf_counter() - start, operation)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    took = time.perf_counter() - conn.info['query_start'].pop()
+    DB_QUERIES.inc()
+    DB_SECONDS.inc(amount=took)
+    if has_request_context() and 'sql_queries' in g:
+        g.sql_queries += 1
+        g.sql_seconds += took
+
+
+class StackSampler:
+    """One background thread sampling the stacks of registered threads.
+
+    Samples are kept as collapsed stacks ("outer;...;inner" -> count)
+    and are only collected while at least one thread is registered.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self._threads = {}  # thread id -> StackCounter
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self, thread_id):
+        with self._lock:
+            self._threads[thread_id] = StackCounter()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def stop(self, thread_id):
+        with self._lock:
+            return self._threads.pop(thread_id, StackCounter())
+
+    def _run(self):
+        while True:
+            with self._lock:
+                watched = list(self._threads.items())
+                if not watched:
+                    self._wake.clear()
+            if not watched:
+                self._wake.wait()
+                continue
+            frames = sys._current_frames()
+            for thread_id, stacks in watched:
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    stacks[collapse(frame)] += 1
+            time.sleep(self.interval)
+
+
+def collapse(frame):
+    """Outermost-first "function (file:line)" frames joined by ';'."""
+    parts = []
+    while frame is not None:
+        code = frame.f_code
+        parts.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+        frame = frame.f_back
+    return ';'.join(reversed(parts))
+
+
+def write_profile(folder, endpoint, elapsed, stacks):
+    """Write collapsed stacks for one slow request; returns the file path."""
+    os.makedirs(folder, exist_ok=True)
+    stamp = datetime.utcnow().strftime('%Y%m%dT%H%M%S.%f')
+    path = os.path.join(folder, f'{stamp}-{endpoint}-{int(elapsed * 1000)}ms.folded')
+    with open(path, 'w') as f:
+        for stack, count in stacks.most_common():
+            f.write(f'{stack} {count}\n')
+    return path
+
+
+def cache_lines(caches):
+    """Gauge lines for {name: stats dict} as returned by the caches' stats() methods."""
+    series = {
+        'cache_hits': ('counter', 'Cache lookups that found an entry.', 'hits'),
+        'cache_misses': ('counter', 'Cache lookups that found nothing.', 'misses'),
+        'cache_items': ('gauge', 'Entries currently cached.', 'items'),
+        'cache_bytes': ('gauge', 'Bytes currently cached.', 'bytes'),
+    }
+    for name, (kind, help, key) in series.items():
+        metric = f'{name}_total' if kind == 'counter' else name
+        yield f'# HELP {metric} {help}'
+        yield f'# TYPE {metric} {kind}'
+        for cache, stats in caches.items():
+            if key in stats:
+                yield f'{metric}{_labels(("cache",), (cache,))} {stats[key]}'
+    yield '# HELP cache_hit_ratio Share of lookups served from the cache since start.'
+    yield '# TYPE cache_hit_ratio gauge'
+    for cache, stats in caches.items():
+        lookups = stats['hits'] + stats['misses']
+        ratio = stats['hits'] / lookups if lookups else 0
+        yield f'cache_hit_ratio{_labels(("cache",), (cache,))} {ratio:.4f}'
+
+
+def init_metrics(app, processor):
+    """Hook request timing, SQL counting and the profiler into app; add the /metrics route."""
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(db.engine, 'after_cursor_execute', _after_cursor_execute)
+
+    sampler = None
+    if app.config.get('PROFILE_SLOW_REQUESTS'):
+        sampler = StackSampler(app.config['PROFILE_INTERVAL'])
+    threshold = app.config['PROFILE_THRESHOLD_MS'] / 1000
+
+    def caches():
+        found = {
+            'render_memory': processor.render_cache.stats(),
+            'render_disk': processor.render_disk_cache.stats(),
+        }
+        for name in ('share_resolver', 'user_cache'):
+            if name in app.extensions:
+                found[name] = app.extensions[name].stats()
+        return found
+
+    @app.before_request
+    def start_request_metrics():
+        g.request_start = time.perf_counter()
+        g.sql_queries = 0
+        g.sql_seconds = 0.0
+        if sampler is not None:
+            sampler.start(threading.get_ident())
+
+    @app.after_request
+    def record_request_metrics(response):
+        if 'request_start' not in g:
+            return response
+        elapsed = time.perf_counter() - g.request_start
+        endpoint = request.endpoint or 'unmatched'
+        REQUEST_SECONDS.observe(elapsed, endpoint, request.method, response.status_code)
+        REQUEST_QUERIES.observe(g.sql_queries, endpoint)
+        REQUEST_DB_SECONDS.observe(g.sql_seconds, endpoint)
+        if app.config.get('METRICS_SERVER_TIMING'):
+            response.headers.add('Server-Timing', f'app;dur={elapsed * 1000:.1f}')
+            response.headers.add('Server-Timing',
+                                 f'db;dur={g.sql_seconds * 1000:.1f};desc="{g.sql_queries} queries"')
+        if sampler is not None:
+            stacks = sampler.stop(threading.get_ident())
+            if elapsed >= threshold and stacks:
+                try:
+                    path = write_profile(app.config['PROFILE_FOLDER'], endpoint, elapsed, stacks)
+                    SLOW_PROFILES.inc(endpoint)
+                    logger.warning('Slow request %s %s took %.0f ms, profile in %s',
+                                request.method, request.path, elapsed * 1000, path)
+                except OSError:
+                    logger.exception('Could not write slow-request profile')
+        return response
+
+    @app.teardown_request
+    def stop_sampling(exc):
+        # after_request is skipped when a view raises; never leave a thread registered
+        if sampler is not None:
+            sampler.stop(threading.get_ident())
+
+    @app.route('/metrics')
+    def metrics():
+        token = current_app.config.get('METRICS_TOKEN')
+        if token:
+            if request.headers.get('Authorization') != f'Bearer {token}':
+                abort(401)
+        elif not current_app.config.get('METRICS_PUBLIC'):
+            abort(403)
+        lines = []
+        for metric in METRICS:
+            lines.extend(metric.render())
+        lines.extend(cache_lines(caches()))
+        return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+    return sampler
@@ -0,0 +1,38 @@
+"""Add FTS5 full-text search index
+
+Revision ID: 3f9a1c2b7d10
+Revises: db81d604e4bc
+Create Date: 2026-10-18 18:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9a1c2b7d10'
+down_revision = 'db81d604e4bc'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # FTS5 only exists on SQLite; other databases use the LIKE search backend
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS pdf_search "
+        "USING fts5(filename, title, content, tokenize='unicode61 remove_diacritics 2')"
+    )
+    op.execute(
+        "INSERT INTO pdf_search (rowid, filename, title, content) "
+        "SELECT id, original_filename, "
+        "trim(coalesce(title, '') || ' ' || coalesce(author, '') || ' ' || coalesce(subject, '')), "
+        "coalesce(extracted_text, '') FROM pdf_file"
+    )
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute("DROP TABLE IF EXISTS pdf_search")
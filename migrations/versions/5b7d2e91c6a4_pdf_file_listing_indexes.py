@@ -0,0 +1,34 @@
+"""Index pdf_file columns used by listings and lookups
+
+Revision ID: 5b7d2e91c6a4
+Revises: 8c41e7a9b2f3
+Create Date: 2026-10-18 19:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b7d2e91c6a4'
+down_revision = '8c41e7a9b2f3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('pdf_file', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_pdf_file_filename'), ['filename'], unique=False)
+        batch_op.create_index(batch_op.f('ix_pdf_file_upload_date'), ['upload_date'], unique=False)
+        batch_op.create_index(batch_op.f('ix_pdf_file_user_id'), ['user_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_pdf_file_is_public'), ['is_public'], unique=False)
+        batch_op.create_index('ix_pdf_file_public_upload_date', ['is_public', 'upload_date'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('pdf_file', schema=None) as batch_op:
+        batch_op.drop_index('ix_pdf_file_public_upload_date')
+        batch_op.drop_index(batch_op.f('ix_pdf_file_is_public'))
+        batch_op.drop_index(batch_op.f('ix_pdf_file_user_id'))
+        batch_op.drop_index(batch_op.f('ix_pdf_file_upload_date'))
+        batch_op.drop_index(batch_op.f('ix_pdf_file_filename'))
@@ -0,0 +1,85 @@
+"""Store extracted text one row per page
+
+Revision ID: 8c41e7a9b2f3
+Revises: 3f9a1c2b7d10
+Create Date: 2026-10-18 18:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c41e7a9b2f3'
+down_revision = '3f9a1c2b7d10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('pdf_page_text',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('pdf_file_id', sa.Integer(), nullable=False),
+    sa.Column('page_no', sa.Integer(), nullable=False),
+    sa.Column('text', sa.Text(), nullable=False),
+    sa.ForeignKeyConstraint(['pdf_file_id'], ['pdf_file.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('pdf_file_id', 'page_no', name='uq_pdf_page_text_page')
+    )
+
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    # document-level index keeps names/titles only; page text gets its own
+    # external-content index fed by triggers (run tools/build_page_text.py
+    # afterwards to extract pages for existing files)
+    op.execute("DROP TABLE IF EXISTS pdf_search")
+    op.execute(
+        "CREATE VIRTUAL TABLE pdf_search "
+        "USING fts5(filename, title, tokenize='unicode61 remove_diacritics 2')"
+    )
+    op.execute(
+        "INSERT INTO pdf_search (rowid, filename, title) "
+        "SELECT id, original_filename, "
+        "trim(coalesce(title, '') || ' ' || coalesce(author, '') || ' ' || coalesce(subject, '')) "
+        "FROM pdf_file"
+    )
+    op.execute(
+        "CREATE VIRTUAL TABLE pdf_page_search "
+        "USING fts5(text, content='pdf_page_text', content_rowid='id', "
+        "tokenize='unicode61 remove_diacritics 2')"
+    )
+    op.execute(
+        "CREATE TRIGGER pdf_page_text_ai AFTER INSERT ON pdf_page_text BEGIN "
+        "INSERT INTO pdf_page_search (rowid, text) VALUES (new.id, new.text); END"
+    )
+    op.execute(
+        "CREATE TRIGGER pdf_page_text_ad AFTER DELETE ON pdf_page_text BEGIN "
+        "INSERT INTO pdf_page_search (pdf_page_search, rowid, text) "
+        "VALUES ('delete', old.id, old.text); END"
+    )
+    op.execute(
+        "CREATE TRIGGER pdf_page_text_au AFTER UPDATE ON pdf_page_text BEGIN "
+        "INSERT INTO pdf_page_search (pdf_page_search, rowid, text) "
+        "VALUES ('delete', old.id, old.text); "
+        "INSERT INTO pdf_page_search (rowid, text) VALUES (new.id, new.text); END"
+    )
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute("DROP TRIGGER IF EXISTS pdf_page_text_au")
+        op.execute("DROP TRIGGER IF EXISTS pdf_page_text_ad")
+        op.execute("DROP TRIGGER IF EXISTS pdf_page_text_ai")
+        op.execute("DROP TABLE IF EXISTS pdf_page_search")
+        op.execute("DROP TABLE IF EXISTS pdf_search")
+        op.execute(
+            "CREATE VIRTUAL TABLE pdf_search "
+            "USING fts5(filename, title, content, tokenize='unicode61 remove_diacritics 2')"
+        )
+        op.execute(
+            "INSERT INTO pdf_search (rowid, filename, title, content) "
+            "SELECT id, original_filename, "
+            "trim(coalesce(title, '') || ' ' || coalesce(author, '') || ' ' || coalesce(subject, '')), "
+            "coalesce(extracted_text, '') FROM pdf_file"
+        )
+    op.drop_table('pdf_page_text')
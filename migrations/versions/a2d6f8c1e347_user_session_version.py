@@ -0,0 +1,27 @@
+"""Add user session_version for cached sessions and revocation
+
+Revision ID: a2d6f8c1e347
+Revises: f1c9a7b3e254
+Create Date: 2026-10-18 22:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a2d6f8c1e347'
+down_revision = 'f1c9a7b3e254'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('session_version', sa.Integer(), nullable=False,
+                                      server_default='1'))
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('session_version')
@@ -0,0 +1,26 @@
+"""Add PDFFile.optimized_path for web-optimized copies
+
+Revision ID: b7e3c5d9f014
+Revises: a2d6f8c1e347
+Create Date: 2026-10-18 23:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e3c5d9f014'
+down_revision = 'a2d6f8c1e347'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('pdf_file', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('optimized_path', sa.String(length=500), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('pdf_file', schema=None) as batch_op:
+        batch_op.drop_column('optimized_path')
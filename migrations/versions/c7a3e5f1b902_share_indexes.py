@@ -0,0 +1,52 @@
+"""Share table indexes for per-user listings and the expiry sweeper
+
+Revision ID: c7a3e5f1b902
+Revises: 9e2f4c6a1d37
+Create Date: 2026-10-18 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7a3e5f1b902'
+down_revision = '9e2f4c6a1d37'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # the initial migration predates sharing; databases built by it have no share table
+    if not sa.inspect(op.get_bind()).has_table('share'):
+        op.create_table('share',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('share_token', sa.String(length=32), nullable=False),
+        sa.Column('pdf_file_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.Column('max_access_count', sa.Integer(), nullable=True),
+        sa.Column('current_access_count', sa.Integer(), nullable=True),
+        sa.Column('last_accessed', sa.DateTime(), nullable=True),
+        sa.Column('allow_download', sa.Boolean(), nullable=True),
+        sa.Column('password_hash', sa.String(length=255), nullable=True),
+        sa.Column('description', sa.String(length=500), nullable=True),
+        sa.ForeignKeyConstraint(['pdf_file_id'], ['pdf_file.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        with op.batch_alter_table('share', schema=None) as batch_op:
+            batch_op.create_index(batch_op.f('ix_share_share_token'), ['share_token'], unique=True)
+
+    with op.batch_alter_table('share', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_share_pdf_file_id'), ['pdf_file_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_share_created_at'), ['created_at'], unique=False)
+        batch_op.create_index('ix_share_user_expires', ['user_id', 'expires_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('share', schema=None) as batch_op:
+        batch_op.drop_index('ix_share_user_expires')
+        batch_op.drop_index(batch_op.f('ix_share_created_at'))
+        batch_op.drop_index(batch_op.f('ix_share_pdf_file_id'))
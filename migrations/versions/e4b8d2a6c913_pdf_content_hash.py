@@ -0,0 +1,29 @@
+"""Add pdf_file.content_hash
+
+Revision ID: e4b8d2a6c913
+Revises: c7a3e5f1b902
+Create Date: 2026-10-18 20:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4b8d2a6c913'
+down_revision = 'c7a3e5f1b902'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # existing rows are hashed by tools/hash_pdfs.py
+    with op.batch_alter_table('pdf_file', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('content_hash', sa.String(length=64), nullable=True))
+        batch_op.create_index(batch_op.f('ix_pdf_file_content_hash'), ['content_hash'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('pdf_file', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_pdf_file_content_hash'))
+        batch_op.drop_column('content_hash')
@@ -0,0 +1,30 @@
+"""Track source mtime and missing files for importer sync
+
+Revision ID: f1c9a7b3e254
+Revises: e4b8d2a6c913
+Create Date: 2026-10-18 21:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1c9a7b3e254'
+down_revision = 'e4b8d2a6c913'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('pdf_file', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('source_mtime', sa.BigInteger(), nullable=True))
+        batch_op.add_column(sa.Column('missing_since', sa.DateTime(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_pdf_file_missing_since'), ['missing_since'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('pdf_file', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_pdf_file_missing_since'))
+        batch_op.drop_column('missing_since')
+        batch_op.drop_column('source_mtime')
@@ -1,11 +1,23 @@
+from flask import current_app
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
+from sqlalchemy import and_, func, or_, update
+from sqlalchemy.orm import load_only
 from datetime import datetime, timedelta
 import os
 import secrets
+from database import retry_on_locked
+from thumbnails import DEFAULT_PRESET, url_name, variant_path
 
 db = SQLAlchemy()
 
+
+@retry_on_locked
+def add_and_commit(*objects):
+    """Add new rows and commit, retrying if SQLite is momentarily locked."""
+    db.session.add_all(objects)
+    db.session.commit()
+
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
@@ -13,23 +25,52 @@ class User(UserMixin, db.Model):
     password_hash = db.Column(db.String(255), nullable=False)
     is_admin = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Part of the session id; bumped when credentials or privileges change,
+    # which ends every existing session of this user (see users.py)
+    session_version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
     
     # Relationship with PDF files
     pdf_files = db.relationship('PDFFile', backref='owner', lazy=True)
     shares = db.relationship('Share', backref='owner', lazy=True)
+    
+    def get_id(self):
+        return f'{self.id}:{self.session_version or 1}'
+
+
+@db.event.listens_for(User, 'before_update')
+def _bump_session_version(mapper, connection, user):
+    state = db.inspect(user)
+    if state.attrs.password_hash.history.has_changes() or state.attrs.is_admin.history.has_changes():
+        user.session_version = (user.session_version or 1) + 1
 
 class PDFFile(db.Model):
+    __table_args__ = (
+        # home page: public documents, newest first
+        db.Index('ix_pdf_file_public_upload_date', 'is_public', 'upload_date'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
-    filename = db.Column(db.String(255), nullable=False)
+    filename = db.Column(db.String(255), nullable=False, index=True)
     original_filename = db.Column(db.String(255), nullable=False)
     file_path = db.Column(db.String(500), nullable=False)
     thumbnail_path = db.Column(db.String(500))
+    # web-optimized copy served to the viewer (see optimize.py); None = serve file_path
+    optimized_path = db.Column(db.String(500))
     file_size = db.Column(db.Integer, nullable=False)
+    # SHA-256 of the file bytes; rows with the same hash share thumbnails, text and renders
+    content_hash = db.Column(db.String(64), index=True)
     page_count = db.Column(db.Integer)
-    upload_date = db.Column(db.DateTime, default=datetime.utcnow)
+    upload_date = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    # Folder imports (tools/import_pdfs.py --sync): the file's mtime when it was
+    # last analysed, and when the importer last found it gone (None = present)
+    source_mtime = db.Column(db.BigInteger)  # st_mtime_ns
+    missing_since = db.Column(db.DateTime, index=True)
     
-    # Searchable content (extracted text)
-    extracted_text = db.Column(db.Text)
+    # Searchable content (extracted text). Superseded by the per-page rows in
+    # PDFPageText; kept for rows imported before pages were stored separately.
+    # Deferred so listing a PDFFile never reads it.
+    extracted_text = db.deferred(db.Column(db.Text))
     
     # Metadata
     title = db.Column(db.String(255))
@@ -37,20 +78,86 @@ class PDFFile(db.Model):
     subject = db.Column(db.String(255))
     
     # User who uploaded the file
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     
     # Privacy settings
-    is_public = db.Column(db.Boolean, default=True)
+    is_public = db.Column(db.Boolean, default=True, index=True)
     
     # Relationships
     shares = db.relationship('Share', backref='pdf_file', lazy=True, cascade='all, delete-orphan')
+    pages = db.relationship('PDFPageText', backref='pdf_file', lazy='dynamic',
+                            cascade='all, delete-orphan')
     
-    def get_thumbnail_url(self):
-        if self.thumbnail_path and os.path.exists(self.thumbnail_path):
-            return f'/thumbnails/{os.path.basename(self.thumbnail_path)}'
+    def get_thumbnail_url(self, preset=DEFAULT_PRESET):
+        path = self.thumbnail_path
+        if path and preset != DEFAULT_PRESET:
+            path = variant_path(path, current_app.config['THUMBNAIL_PRESETS'][preset])
+        if path and os.path.exists(path):
+            return f'/thumbnails/{url_name(path)}'
         return None
     
-    def to_dict(self):
+    @classmethod
+    def listing_options(cls):
+        """Loader options for grids and APIs: only the columns a card needs."""
+        return load_only(cls.id, cls.filename, cls.original_filename, cls.thumbnail_path,
+                         cls.file_size, cls.page_count, cls.upload_date, cls.title,
+                         cls.author, cls.user_id, cls.is_public)
+    
+    @classmethod
+    def processed_copy(cls, content_hash, exclude_id=None):
+        """An already analysed row with the same content, whose artifacts can be reused."""
+        if not content_hash:
+            return None
+        query = cls.query.filter(cls.content_hash == content_hash, cls.page_count.isnot(None))
+        if exclude_id is not None:
+            query = query.filter(cls.id != exclude_id)
+        return query.order_by(cls.id).first()
+    
+    def reuse_analysis(self, source):
+        """Take page count, thumbnail, optimized copy and missing metadata from an identical document.
+
+        Titles may have been typed in by the other document's owner, so they
+        are only copied from public documents or the same owner's.
+        """
+        self.page_count = source.page_count
+        self.thumbnail_path = source.thumbnail_path
+        self.optimized_path = source.optimized_path
+        if not (source.is_public or source.user_id == self.user_id):
+            return
+        self.title = self.title or source.title
+        self.author = self.author or source.author
+        self.subject = self.subject or source.subject
+    
+    @staticmethod
+    def share_counts(pdf_ids):
+        """{pdf_id: number of shares} for many files in one grouped query."""
+        if not pdf_ids:
+            return {}
+        rows = db.session.query(Share.pdf_file_id, func.count(Share.id))\
+                         .filter(Share.pdf_file_id.in_(pdf_ids))\
+                         .group_by(Share.pdf_file_id)
+        return dict(rows)
+    
+    def to_summary_dict(self):
+        """Slim variant of to_dict() for catalogue listings (no share count query)."""
+        return {
+            'id': self.id,
+            'filename': self.filename,
+            'original_filename': self.original_filename,
+            'title': self.title,
+            'author': self.author,
+            'page_count': self.page_count,
+            'file_size': self.file_size,
+            'upload_date': self.upload_date.isoformat(),
+            'thumbnail_url': self.get_thumbnail_url(),
+            'is_public': self.is_public
+        }
+    
+    def to_dict(self, share_count=None):
+        # callers serialising many files pass counts from share_counts();
+        # otherwise count in SQL rather than loading every Share
+        if share_count is None:
+            share_count = PDFFile.share_counts([self.id]).get(self.id, 0)
         return {
             'id': self.id,
             'filename': self.filename,
@@ -63,17 +170,35 @@ class PDFFile(db.Model):
             'author': self.author,
             'thumbnail_url': self.get_thumbnail_url(),
             'is_public': self.is_public,
-            'share_count': len(self.shares)
+            'share_count': share_count
         }
 
+class PDFPageText(db.Model):
+    """Extracted text of one page, one row per (pdf_file_id, page_no)."""
+    __tablename__ = 'pdf_page_text'
+    __table_args__ = (
+        db.UniqueConstraint('pdf_file_id', 'page_no', name='uq_pdf_page_text_page'),
+    )
+    
+    # surrogate key so the FTS index can use it as a stable rowid
+    id = db.Column(db.Integer, primary_key=True)
+    pdf_file_id = db.Column(db.Integer, db.ForeignKey('pdf_file.id', ondelete='CASCADE'), nullable=False)
+    page_no = db.Column(db.Integer, nullable=False)  # 1-based, like /render/<id>/<page>
+    text = db.Column(db.Text, nullable=False, default='')
+
 class Share(db.Model):
+    __table_args__ = (
+        # manage_shares: one user's shares split into active/expired
+        db.Index('ix_share_user_expires', 'user_id', 'expires_at'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     share_token = db.Column(db.String(32), unique=True, nullable=False, index=True)
-    pdf_file_id = db.Column(db.Integer, db.ForeignKey('pdf_file.id'), nullable=False)
+    pdf_file_id = db.Column(db.Integer, db.ForeignKey('pdf_file.id'), nullable=False, index=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     
     # Share settings
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     expires_at = db.Column(db.DateTime, nullable=False)
     max_access_count = db.Column(db.Integer, default=0)  # 0 = unlimited
     current_access_count = db.Column(db.Integer, default=0)
@@ -97,10 +222,43 @@ class Share(db.Model):
     def is_active(self):
         return not self.is_expired() and not self.is_access_limit_reached()
     
+    @classmethod
+    def active_clause(cls, now=None):
+        """SQL version of is_active(), for filtering in the database."""
+        now = now or datetime.utcnow()
+        return and_(cls.expires_at >= now,
+                    or_(cls.max_access_count == 0, cls.max_access_count.is_(None),
+                        cls.current_access_count < cls.max_access_count))
+    
     def record_access(self):
-        self.current_access_count += 1
-        self.last_accessed = datetime.utcnow()
+        """Count one access; returns False if the share had already reached its limit.
+
+        The increment is a single conditional UPDATE, so concurrent requests
+        cannot lose counts or go past max_access_count. Unlimited shares go
+        through the app's write-behind buffer when one is configured.
+        """
+        return Share.count_access(self.id, self.max_access_count)
+    
+    @staticmethod
+    @retry_on_locked
+    def count_access(share_id, max_access_count):
+        """record_access() by id, for callers holding a cached snapshot rather than a row."""
+        now = datetime.utcnow()
+        buffer = current_app.extensions.get('share_access')
+        if buffer is not None and not max_access_count:
+            buffer.add(share_id, now)
+            return True
+        result = db.session.execute(
+            update(Share)
+            .where(Share.id == share_id,
+                   or_(Share.max_access_count == 0, Share.max_access_count.is_(None),
+                       func.coalesce(Share.current_access_count, 0) < Share.max_access_count))
+            .values(current_access_count=func.coalesce(Share.current_access_count, 0) + 1,
+                    last_accessed=now)
+            .execution_options(synchronize_session=False)
+        )
         db.session.commit()
+        return result.rowcount == 1
     
     def get_share_url(self, base_url):
         return f"{base_url}/shared/{self.share_token}"
@@ -109,7 +267,11 @@ class Share(db.Model):
         return {
             'id': self.id,
             'share_token': self.share_token,
-            'pdf_file': self.pdf_file.to_dict(),
+            'pdf_file': {
+                'id': self.pdf_file_id,
+                'filename': self.pdf_file.filename,
+                'original_filename': self.pdf_file.original_filename
+            },
             'created_at': self.created_at.isoformat(),
             'expires_at': self.expires_at.isoformat(),
             'max_access_count': self.max_access_count,
@@ -119,4 +281,52 @@ class Share(db.Model):
             'is_active': self.is_active(),
             'description': self.description,
             'share_url': self.get_share_url(request.host_url if 'request' in globals() else '')
-        }
\ No newline at end of file
+        }
+
+
+class Job(db.Model):
+    """Background work item (ingestion, reprocessing) run by tools/ingest_worker.py."""
+    __table_args__ = (
+        # workers claim the oldest runnable job
+        db.Index('ix_job_status_run_after', 'status', 'run_after'),
+    )
+    
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(32), nullable=False)
+    pdf_file_id = db.Column(db.Integer, db.ForeignKey('pdf_file.id', ondelete='CASCADE'), index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    
+    status = db.Column(db.String(16), nullable=False, default=QUEUED)
+    stage = db.Column(db.String(32))
+    progress = db.Column(db.Integer, nullable=False, default=0)  # percent
+    
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_after = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_by = db.Column(db.String(64))
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'pdf_file_id': self.pdf_file_id,
+            'status': self.status,
+            'stage': self.stage,
+            'progress': self.progress,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'run_after': self.run_after.isoformat() if self.status == Job.QUEUED else None,
+            'error': self.last_error,
+            'created_at': self.created_at.isoformat(),
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
@@ -0,0 +1,96 @@
+"""Web-optimized copies of stored PDFs for in-browser viewing.
+
+Scanners and office tools often write PDFs with unused and duplicate
+objects, uncompressed streams and an xref table at the end of the file.
+optimize_pdf() rewrites a document with MuPDF's garbage collection (level
+4 also merges duplicate objects), deflates every stream and linearizes it,
+so PDF.js can show the first page from the first range request instead of
+fetching the tail first. Optionally, images placed at more than
+``max_image_dpi`` are resampled to that resolution.
+
+The preview routes serve the copy. Downloads and server-side renders keep
+using the original bytes.
+"""
+import io
+import os
+
+try:
+    import pymupdf
+except Exception:
+    import fitz as pymupdf
+from PIL import Image
+
+SAVE_OPTIONS = dict(garbage=4, clean=True, deflate=True, deflate_images=True,
+                    deflate_fonts=True, linear=True)
+
+
+def image_placements(doc):
+    """{xref: (width px, height px, largest placed width, height in points)} for every image."""
+    found = {}
+    for page in doc:
+        for info in page.get_images(full=True):
+            xref, smask, width, height, bpc = info[:5]
+            if smask or bpc == 1:
+                continue  # soft masks and bilevel scans do not resample well as JPEG
+            for rect in page.get_image_rects(xref):
+                if rect.is_empty or rect.is_infinite:
+                    continue
+                placed_w, placed_h = found.get(xref, (0, 0, 0, 0))[2:]
+                found[xref] = (width, height, max(placed_w, rect.width), max(placed_h, rect.height))
+    return found
+
+
+def downsample_images(doc, max_dpi, quality=75):
+    """Re-encode images shown at more than max_dpi as JPEG at max_dpi. Returns how many changed.
+
+    An image is only replaced if the new stream is smaller; one that is
+    placed several times keeps the resolution of its largest placement.
+    """
+    changed = 0
+    for xref, (width, height, placed_w, placed_h) in image_placements(doc).items():
+        scale = min(max_dpi * placed_w / 72 / width, max_dpi * placed_h / 72 / height)
+        if scale >= 0.9:
+            continue  # not worth a generation of JPEG loss
+        pix = pymupdf.Pixmap(doc, xref)
+        if pix.alpha:
+            pix = pymupdf.Pixmap(pix, 0)  # drop alpha
+        if pix.colorspace is None or pix.colorspace.n not in (1, 3):
+            pix = pymupdf.Pixmap(pymupdf.csRGB, pix)
+        mode = 'L' if pix.n == 1 else 'RGB'
+        img = Image.frombytes(mode, (pix.width, pix.height), pix.samples)
+        pix = None
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        buf = io.BytesIO()
+        img.resize(size, Image.LANCZOS).save(buf, 'JPEG', quality=quality, optimize=True)
+        if buf.tell() >= len(doc.xref_stream_raw(xref) or b''):
+            continue
+        doc[0].replace_image(xref, stream=buf.getvalue())
+        changed += 1
+    return changed
+
+
+def optimize_pdf(src_path, dst_path, max_image_dpi=None, image_quality=75, min_saving=0.0):
+    """Write a linearized, garbage-collected and deflated copy of src_path to dst_path.
+
+    Returns the copy's size, or None (and writes nothing) when it would not
+    help: not ``min_saving`` smaller than an original that is linearized
+    already, or larger than one that is not. Raises ValueError for
+    encrypted documents, which cannot be rewritten without their password.
+    """
+    original_size = os.path.getsize(src_path)
+    doc = pymupdf.open(src_path)
+    try:
+        if doc.needs_pass or doc.is_encrypted:
+            raise ValueError('document is encrypted')
+        linear = doc.is_fast_webaccess
+        if max_image_dpi:
+            downsample_images(doc, max_image_dpi, image_quality)
+        doc.save(dst_path, **SAVE_OPTIONS)
+    finally:
+        doc.close()
+    size = os.path.getsize(dst_path)
+    limit = original_size * (1 - min_saving) if linear else original_size
+    if size > limit:
+        os.remove(dst_path)
+        return None
+    return size
@@ -0,0 +1,62 @@
+"""Per-page text extraction, stored one PDFPageText row per page.
+
+Text is built in chunks: build_page_texts() resumes after the last stored
+page and commits every chunk, so a long document becomes searchable page by
+page and an interrupted build picks up where it stopped.
+"""
+from sqlalchemy import func, insert, literal
+
+from models import db, PDFFile, PDFPageText
+
+
+def stored_page_count(pdf_file_id):
+    """Highest page number already stored for a document (0 if none)."""
+    return db.session.query(func.max(PDFPageText.page_no))\
+                     .filter(PDFPageText.pdf_file_id == pdf_file_id).scalar() or 0
+
+
+def store_page_texts(pdf_file_id, texts, start=1, replace=False):
+    """Insert rows for pages start, start+1, ... in the caller's transaction."""
+    if replace:
+        PDFPageText.query.filter_by(pdf_file_id=pdf_file_id).delete(synchronize_session=False)
+    if texts:
+        db.session.execute(insert(PDFPageText), [
+            {'pdf_file_id': pdf_file_id, 'page_no': start + i, 'text': text.strip()}
+            for i, text in enumerate(texts)
+        ])
+
+
+def copy_page_texts(source_id, pdf_file_id):
+    """Duplicate another document's page rows in one INSERT ... SELECT (caller's transaction)."""
+    PDFPageText.query.filter_by(pdf_file_id=pdf_file_id).delete(synchronize_session=False)
+    rows = db.session.query(literal(pdf_file_id), PDFPageText.page_no, PDFPageText.text)\
+                     .filter(PDFPageText.pdf_file_id == source_id)
+    db.session.execute(insert(PDFPageText).from_select(['pdf_file_id', 'page_no', 'text'], rows))
+
+
+def build_page_texts(processor, pdf, chunk_pages=50):
+    """Extract the pages of ``pdf`` that are not stored yet. Returns pages added."""
+    done = stored_page_count(pdf.id)
+    total = pdf.page_count or 0
+    added = 0
+    while done < total:
+        stop = min(done + chunk_pages, total)
+        texts = processor.page_texts(pdf.file_path, done, stop)
+        if not texts:
+            break
+        store_page_texts(pdf.id, texts, start=done + 1)
+        db.session.commit()
+        added += len(texts)
+        done += len(texts)
+    return added
+
+
+def pending_documents(limit=None):
+    """Documents with fewer stored pages than page_count, oldest first."""
+    stored = db.session.query(PDFPageText.pdf_file_id,
+                              func.max(PDFPageText.page_no).label('pages'))\
+                       .group_by(PDFPageText.pdf_file_id).subquery()
+    query = PDFFile.query.outerjoin(stored, stored.c.pdf_file_id == PDFFile.id)\
+                         .filter(PDFFile.page_count > func.coalesce(stored.c.pages, 0))\
+                         .order_by(PDFFile.id)
+    return query.limit(limit).all() if limit else query.all()
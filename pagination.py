@@ -0,0 +1,45 @@
+"""Keyset (cursor) pagination for listings ordered by (upload_date, id), newest first.
+
+Cursors are opaque URL-safe tokens holding the sort key of the last row
+returned, so every page costs one indexed range scan no matter how deep it
+is, and no COUNT(*) is ever run.
+"""
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(upload_date, pk):
+    raw = json.dumps([upload_date.isoformat(), pk], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode()
+
+
+def decode_cursor(token):
+    """Return (upload_date, id) from a cursor; raises InvalidCursor on garbage."""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        upload_date, pk = json.loads(raw)
+        return datetime.fromisoformat(upload_date), int(pk)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(str(e))
+
+
+def keyset_page(query, model, limit, cursor=None):
+    """Fetch one page of ``query`` newest first. Returns (rows, next_cursor or None)."""
+    if cursor:
+        upload_date, pk = decode_cursor(cursor)
+        query = query.filter(or_(
+            model.upload_date < upload_date,
+            and_(model.upload_date == upload_date, model.id < pk)
+        ))
+    rows = query.order_by(model.upload_date.desc(), model.id.desc()).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1].upload_date, rows[-1].id)
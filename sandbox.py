@@ -0,0 +1,121 @@
+"""Run untrusted PDF work in a child process with memory and time limits.
+
+A malformed or pathological PDF can make MuPDF allocate gigabytes or loop
+forever. run_sandboxed() calls a function in a short-lived child process.
+The child's address space is capped with RLIMIT_AS and its CPU time with
+RLIMIT_CPU, and the parent kills it once the wall-clock timeout passes. A
+bad document then fails its own job instead of taking the worker down with
+it.
+
+Children are forked from a forkserver, so they do not inherit the
+caller's threads and locks. The module of the function being run is
+preloaded into the server, so each call pays for a fork and not for a
+fresh interpreter importing PyMuPDF. Callers that are themselves daemonic
+processes (multiprocessing.Pool workers) cannot start children and should
+call the function directly.
+"""
+import multiprocessing
+import os
+import signal
+import sys
+
+try:
+    import resource
+except ImportError:  # Windows: time limit only
+    resource = None
+
+_context = None
+
+
+class SandboxError(RuntimeError):
+    """The sandboxed call was stopped by a limit or died; ``reason`` says which.
+
+    reason is 'memory', 'timeout', 'cpu' or 'crashed'.
+    """
+
+    def __init__(self, reason, message):
+        super().__init__(message)
+        self.reason = reason
+
+
+def _start_forkserver(ctx, module):
+    """Start the forkserver with ``module`` imported, so children start warm."""
+    from multiprocessing import forkserver
+    if module != '__main__':
+        ctx.set_forkserver_preload([module])
+    # the server is a fresh interpreter that does not get our sys.path, so
+    # hand it over through PYTHONPATH while it starts
+    saved = os.environ.get('PYTHONPATH')
+    os.environ['PYTHONPATH'] = os.pathsep.join(p for p in sys.path if p)
+    try:
+        forkserver.ensure_running()
+    finally:
+        if saved is None:
+            del os.environ['PYTHONPATH']
+        else:
+            os.environ['PYTHONPATH'] = saved
+
+
+def _get_context(module):
+    global _context
+    if _context is None:
+        if 'forkserver' in multiprocessing.get_all_start_methods():
+            _context = multiprocessing.get_context('forkserver')
+            _start_forkserver(_context, module)
+        else:
+            _context = multiprocessing.get_context('spawn')
+    return _context
+
+
+def _child(conn, memory_bytes, cpu_seconds, func, args, kwargs):
+    if resource is not None:
+        if memory_bytes:
+            resource.setrlimit(resource.RLIMIT_AS, (memory_bytes, memory_bytes))
+        if cpu_seconds:
+            resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 1))
+    try:
+        result = ('ok', func(*args, **kwargs))
+    except MemoryError:
+        result = ('memory', None)
+    except Exception as e:
+        result = ('error', e)
+    try:
+        conn.send(result)
+    except Exception as e:  # unpicklable result or exception
+        conn.send(('error', RuntimeError(f'{type(e).__name__}: {e}')))
+    conn.close()
+
+
+def run_sandboxed(func, *args, memory_mb=None, timeout=None, **kwargs):
+    """Return func(*args, **kwargs) computed in a limited child process.
+
+    Exceptions raised by ``func`` are re-raised here. Hitting a limit, or the
+    child dying, raises SandboxError.
+    """
+    ctx = _get_context(func.__module__)
+    receiver, sender = ctx.Pipe(duplex=False)
+    memory = memory_mb * 1024 * 1024 if memory_mb else None
+    cpu = int(timeout) + 1 if timeout else None
+    proc = ctx.Process(target=_child, args=(sender, memory, cpu, func, args, kwargs), daemon=True)
+    proc.start()
+    sender.close()
+    try:
+        if not receiver.poll(timeout):
+            raise SandboxError('timeout', f'{func.__name__} did not finish within {timeout}s')
+        try:
+            status, value = receiver.recv()
+        except EOFError:
+            proc.join()
+            if cpu and -proc.exitcode in (getattr(signal, 'SIGXCPU', None), signal.SIGKILL):
+                raise SandboxError('cpu', f'{func.__name__} used more than {cpu}s of CPU')
+            raise SandboxError('crashed', f'{func.__name__} died with exit code {proc.exitcode}')
+    finally:
+        if proc.is_alive():
+            proc.kill()
+        proc.join()
+        receiver.close()
+    if status == 'memory':
+        raise SandboxError('memory', f'{func.__name__} needed more than {memory_mb} MB')
+    if status == 'error':
+        raise value
+    return value
@@ -0,0 +1,280 @@
+"""Server-side full-text search over PDF filenames, titles and per-page text.
+
+The backend is picked from the database dialect: SQLite gets an FTS5 index
+(``pdf_search`` and ``pdf_page_search``, ranked with bm25), other databases fall
+back to LIKE scans. ``SEARCH_BACKEND`` ('fts5' or 'like') forces a choice,
+and other engines can be added by subclassing SearchBackend and listing
+them in BACKENDS.
+"""
+import re
+from abc import ABC, abstractmethod
+from collections import namedtuple
+
+from flask import current_app
+from markupsafe import Markup, escape
+from sqlalchemy import or_, text
+
+from models import db, PDFFile, PDFPageText
+
+# one page of results; has_next is found by fetching one extra row, never COUNT(*)
+SearchPage = namedtuple('SearchPage', ['items', 'page', 'per_page', 'has_next'])
+# page is the best-matching page (1-based) or None when only the name/title matched
+SearchHit = namedtuple('SearchHit', ['pdf', 'rank', 'page', 'snippet'])
+
+FIELDS = ('filename', 'content', 'all')
+SNIPPET_START = '\x02'
+SNIPPET_END = '\x03'
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+# FTS5 tables created outside the models; migrations must leave them alone
+FTS_TABLES = ('pdf_search', 'pdf_page_search')
+FTS_SHADOW_SUFFIXES = ('_data', '_idx', '_config', '_docsize', '_content')
+
+
+def highlight(snippet):
+    """Escape a raw snippet and turn the match markers into <mark> tags."""
+    html = str(escape(snippet))
+    return Markup(html.replace(SNIPPET_START, '<mark>').replace(SNIPPET_END, '</mark>'))
+
+
+def visibility_clause(user):
+    """Same rule as the home page: public PDFs plus the user's own."""
+    if user is not None and user.is_authenticated:
+        return or_(PDFFile.is_public == True, PDFFile.user_id == user.id)
+    return PDFFile.is_public == True
+
+
+def is_fts_table(name):
+    """True for an FTS5 table or one of the shadow tables SQLite keeps for it."""
+    return name in FTS_TABLES or any(name == table + suffix for table in FTS_TABLES
+                                     for suffix in FTS_SHADOW_SUFFIXES)
+
+
+class SearchBackend(ABC):
+    name = None
+
+    def ensure_schema(self):
+        """Create whatever index structures the backend needs (idempotent)."""
+
+    def index(self, pdf):
+        """Add or refresh one document in the index (in the caller's transaction)."""
+
+    def remove(self, pdf_id):
+        """Drop one document from the index."""
+
+    def rebuild(self, batch_size=500):
+        """Re-index every document; returns the number indexed."""
+        self.ensure_schema()
+        count = 0
+        last_id = 0
+        while True:
+            batch = PDFFile.query.filter(PDFFile.id > last_id)\
+                                 .order_by(PDFFile.id).limit(batch_size).all()
+            if not batch:
+                return count
+            for pdf in batch:
+                self.index(pdf)
+            db.session.commit()
+            count += len(batch)
+            last_id = batch[-1].id
+
+    @abstractmethod
+    def search(self, query, field='all', user=None, page=1, per_page=12):
+        """Return one SearchPage of SearchHits visible to ``user``."""
+
+    def _page(self, hits, page, per_page):
+        return SearchPage(hits[:per_page], page, per_page, len(hits) > per_page)
+
+
+# FTS5 schema: document-level names/titles, plus page text indexed straight
+# from pdf_page_text (external content, kept in sync by triggers)
+FTS_SCHEMA = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS pdf_search "
+    "USING fts5(filename, title, tokenize='unicode61 remove_diacritics 2')",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS pdf_page_search "
+    "USING fts5(text, content='pdf_page_text', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS pdf_page_text_ai AFTER INSERT ON pdf_page_text BEGIN "
+    "INSERT INTO pdf_page_search (rowid, text) VALUES (new.id, new.text); END",
+    "CREATE TRIGGER IF NOT EXISTS pdf_page_text_ad AFTER DELETE ON pdf_page_text BEGIN "
+    "INSERT INTO pdf_page_search (pdf_page_search, rowid, text) VALUES ('delete', old.id, old.text); END",
+    "CREATE TRIGGER IF NOT EXISTS pdf_page_text_au AFTER UPDATE ON pdf_page_text BEGIN "
+    "INSERT INTO pdf_page_search (pdf_page_search, rowid, text) VALUES ('delete', old.id, old.text); "
+    "INSERT INTO pdf_page_search (rowid, text) VALUES (new.id, new.text); END",
+]
+
+
+class SQLiteFTSBackend(SearchBackend):
+    """FTS5 indexes: pdf_search keyed by pdf_file.id, pdf_page_search by pdf_page_text.id.
+
+    Page rows are indexed by triggers, so index() only maintains the
+    document-level names and titles.
+    """
+    name = 'fts5'
+    # bm25 weights for (filename, title): name matches rank highest
+    weights = (10.0, 5.0)
+
+    def __init__(self):
+        self._ready = False
+
+    def ensure_schema(self):
+        # own connection and transaction, so a read-only request can create it too;
+        # writers call this before they start their own transaction
+        if self._ready:
+            return
+        with db.engine.begin() as conn:
+            for statement in FTS_SCHEMA:
+                conn.execute(text(statement))
+        self._ready = True
+
+    def _ensure_schema_in_session(self):
+        # a writer that skipped ensure_schema() may already hold the write lock, so a
+        # second connection would wait on it: create the tables in its transaction.
+        # _ready stays unset, since that transaction may still roll back
+        if self._ready:
+            return
+        exists = db.session.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'pdf_page_search'"
+        )).first()
+        if exists:
+            return
+        for statement in FTS_SCHEMA:
+            db.session.execute(text(statement))
+        # page rows stored before the triggers existed, e.g. earlier in this transaction
+        db.session.execute(text("INSERT INTO pdf_page_search (pdf_page_search) VALUES ('rebuild')"))
+
+    def index(self, pdf):
+        self.remove(pdf.id)
+        db.session.execute(
+            text("INSERT INTO pdf_search (rowid, filename, title) VALUES (:id, :filename, :title)"),
+            {'id': pdf.id,
+             'filename': pdf.original_filename or pdf.filename,
+             'title': ' '.join(filter(None, [pdf.title, pdf.author, pdf.subject]))}
+        )
+
+    def remove(self, pdf_id):
+        self._ensure_schema_in_session()
+        db.session.execute(text("DELETE FROM pdf_search WHERE rowid = :id"), {'id': pdf_id})
+
+    def rebuild(self, batch_size=500):
+        self.ensure_schema()
+        # page index is external-content: let FTS5 re-read pdf_page_text itself
+        db.session.execute(text("INSERT INTO pdf_page_search (pdf_page_search) VALUES ('rebuild')"))
+        db.session.commit()
+        return super().rebuild(batch_size)
+
+    def match_expression(self, query):
+        """Build a safe FTS5 MATCH string: every word quoted, the last one a prefix."""
+        tokens = TOKEN_RE.findall(query)
+        if not tokens:
+            return None
+        terms = [f'"{t}"' for t in tokens[:-1]] + [f'"{tokens[-1]}"*']
+        return ' '.join(terms)
+
+    def search(self, query, field='all', user=None, page=1, per_page=12):
+        match = self.match_expression(query)
+        if not match:
+            return SearchPage([], page, per_page, False)
+        self.ensure_schema()
+
+        params = {'match': match, 'start': SNIPPET_START, 'end': SNIPPET_END,
+                  'limit': per_page + 1, 'offset': (page - 1) * per_page}
+        visible = 'pdf_file.is_public = 1'
+        if user is not None and user.is_authenticated:
+            visible = '(pdf_file.is_public = 1 OR pdf_file.user_id = :uid)'
+            params['uid'] = user.id
+
+        sources = []
+        if field in ('filename', 'all'):
+            w_name, w_title = self.weights
+            sources.append(
+                f"SELECT rowid AS pdf_id, NULL AS page_no, "
+                f"bm25(pdf_search, {w_name}, {w_title}) AS rank, NULL AS snip "
+                f"FROM pdf_search WHERE pdf_search MATCH :match")
+        if field in ('content', 'all'):
+            sources.append(
+                "SELECT t.pdf_file_id AS pdf_id, t.page_no AS page_no, "
+                "bm25(pdf_page_search) AS rank, "
+                "snippet(pdf_page_search, 0, :start, :end, '…', 16) AS snip "
+                "FROM pdf_page_search JOIN pdf_page_text t ON t.id = pdf_page_search.rowid "
+                "WHERE pdf_page_search MATCH :match")
+
+        # one row per document; SQLite takes page_no/snip from the row holding MIN(rank).
+        # LIMIT -1 keeps the subquery from being flattened into the aggregate,
+        # where bm25()/snippet() cannot be evaluated
+        rows = db.session.execute(text(
+            f"SELECT h.pdf_id AS id, MIN(h.rank) AS rank, h.page_no AS page_no, h.snip AS snip "
+            f"FROM ({' UNION ALL '.join(sources)} LIMIT -1) AS h "
+            f"JOIN pdf_file ON pdf_file.id = h.pdf_id "
+            f"WHERE {visible} "
+            f"GROUP BY h.pdf_id ORDER BY rank LIMIT :limit OFFSET :offset"
+        ), params).all()
+
+        pdfs = {p.id: p for p in PDFFile.query.options(PDFFile.listing_options())
+                                              .filter(PDFFile.id.in_([r.id for r in rows]))}
+        hits = [SearchHit(pdfs[r.id], r.rank, r.page_no, highlight(r.snip or ''))
+                for r in rows if r.id in pdfs]
+        return self._page(hits, page, per_page)
+
+
+class LikeSearchBackend(SearchBackend):
+    """Portable fallback: no index, LIKE over names and page text, newest first."""
+    name = 'like'
+
+    def search(self, query, field='all', user=None, page=1, per_page=12):
+        tokens = TOKEN_RE.findall(query)
+        if not tokens:
+            return SearchPage([], page, per_page, False)
+
+        q = PDFFile.query.options(PDFFile.listing_options()).filter(visibility_clause(user))
+        for token in tokens:
+            pattern = f'%{token}%'
+            in_name = or_(PDFFile.original_filename.ilike(pattern), PDFFile.title.ilike(pattern))
+            in_pages = PDFFile.pages.any(PDFPageText.text.ilike(pattern))
+            if field == 'filename':
+                q = q.filter(in_name)
+            elif field == 'content':
+                q = q.filter(in_pages)
+            else:
+                q = q.filter(or_(in_name, in_pages))
+        rows = q.order_by(PDFFile.upload_date.desc(), PDFFile.id.desc())\
+                .limit(per_page + 1).offset((page - 1) * per_page).all()
+
+        hits = []
+        for pdf in rows[:per_page]:
+            match = None
+            if field != 'filename':
+                match = pdf.pages.filter(PDFPageText.text.ilike(f'%{tokens[0]}%'))\
+                                 .order_by(PDFPageText.page_no).first()
+            if match:
+                hits.append(SearchHit(pdf, None, match.page_no, self.snippet(match.text, tokens[0])))
+            else:
+                hits.append(SearchHit(pdf, None, None, Markup('')))
+        return SearchPage(hits, page, per_page, len(rows) > per_page)
+
+    def snippet(self, content, token, width=80):
+        pos = content.lower().find(token.lower())
+        if pos < 0:
+            return Markup('')
+        start = max(0, pos - width)
+        end = pos + len(token)
+        raw = (content[start:pos] + SNIPPET_START + content[pos:end] + SNIPPET_END +
+               content[end:end + width])
+        return highlight(('…' if start else '') + raw + '…')
+
+
+BACKENDS = {cls.name: cls for cls in (SQLiteFTSBackend, LikeSearchBackend)}
+
+
+def init_search(app):
+    """Pick the search backend for this app and register it under app.extensions."""
+    name = app.config.get('SEARCH_BACKEND')
+    if not name:
+        uri = app.config['SQLALCHEMY_DATABASE_URI']
+        name = 'fts5' if uri.startswith('sqlite') else 'like'
+    backend = BACKENDS[name]()
+    app.extensions['search'] = backend
+    return backend
+
+
+def get_search_backend():
+    return current_app.extensions['search']
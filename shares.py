@@ -0,0 +1,261 @@
+"""Share access accounting.
+
+Shares with an access limit are counted by a conditional UPDATE in
+Share.record_access(), so concurrent hits can never overshoot the limit.
+Unlimited shares only need their counter for statistics, so their hits are
+collected in a per-process AccessBuffer and written in one batch every few
+seconds, instead of one commit per view.
+
+Share links are resolved through ShareResolver, which keeps an immutable
+snapshot of the share, its file and its owner in a short-lived TTL cache,
+so a hot link costs no database round-trip until the entry expires or is
+invalidated.
+
+Password-protected links hash the password once. After it verifies, the
+visitor gets a short-lived signed grant cookie scoped to the link's path.
+The view, preview, download and render routes check that cookie with an
+HMAC instead of running the password hash again.
+
+sweep_shares() removes shares that stopped working a while ago. It runs in
+batches so the share table stays small without long write locks.
+"""
+import atexit
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from flask import abort, current_app, request
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+from sqlalchemy import and_, bindparam, func, or_
+from sqlalchemy.orm import joinedload
+
+from cache import TTLCache
+from models import db, Share, PDFFile, User
+
+logger = logging.getLogger(__name__)
+
+# what share routes and templates need of the file and owner, detached from the session
+SharedFile = namedtuple('SharedFile', ['id', 'filename', 'original_filename', 'file_path',
+                                       'optimized_path', 'content_hash', 'page_count',
+                                       'is_public'])
+SharedOwner = namedtuple('SharedOwner', ['id', 'username'])
+
+
+class AccessBuffer:
+    """Write-behind counter for unlimited shares: {share_id: (hits, last_accessed)}."""
+
+    def __init__(self, interval=10, max_pending=1000):
+        self.interval = interval
+        self.max_pending = max_pending
+        self._pending = {}
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+    def add(self, share_id, when):
+        with self._lock:
+            hits, _ = self._pending.get(share_id, (0, None))
+            self._pending[share_id] = (hits + 1, when)
+            due = len(self._pending) >= self.max_pending or \
+                time.monotonic() - self._last_flush >= self.interval
+        if due:
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Share access flush failed')
+
+    def flush(self):
+        """Write pending counts in one executemany; returns the number of shares updated."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+        if not pending:
+            return 0
+        table = Share.__table__
+        stmt = table.update().where(table.c.id == bindparam('share_id')).values(
+            current_access_count=table.c.current_access_count + bindparam('hits'),
+            last_accessed=bindparam('when'))
+        rows = [{'share_id': share_id, 'hits': hits, 'when': when}
+                for share_id, (hits, when) in pending.items()]
+        try:
+            # own connection: never joins (or commits) the request's session
+            with db.engine.begin() as conn:
+                conn.execute(stmt, rows)
+        except Exception:
+            with self._lock:
+                for share_id, (hits, when) in pending.items():
+                    newer, latest = self._pending.get(share_id, (0, when))
+                    self._pending[share_id] = (hits + newer, max(when, latest))
+            raise
+        return len(rows)
+
+
+class ResolvedShare(namedtuple('ResolvedShare', [
+        'id', 'share_token', 'pdf_file', 'owner', 'created_at', 'expires_at',
+        'max_access_count', 'current_access_count', 'allow_download', 'password_hash',
+        'description'])):
+    """Immutable snapshot of a Share row with the same checks as the model."""
+    __slots__ = ()
+
+    @classmethod
+    def from_share(cls, share):
+        pdf = share.pdf_file
+        return cls(share.id, share.share_token,
+                   SharedFile(pdf.id, pdf.filename, pdf.original_filename, pdf.file_path,
+                              pdf.optimized_path, pdf.content_hash, pdf.page_count,
+                              pdf.is_public),
+                   SharedOwner(share.owner.id, share.owner.username),
+                   share.created_at, share.expires_at, share.max_access_count or 0,
+                   share.current_access_count or 0, share.allow_download,
+                   share.password_hash, share.description)
+
+    def is_expired(self, now=None):
+        return (now or datetime.utcnow()) > self.expires_at
+
+    def is_access_limit_reached(self):
+        return self.max_access_count > 0 and self.current_access_count >= self.max_access_count
+
+    def is_active(self, now=None):
+        return not self.is_expired(now) and not self.is_access_limit_reached()
+
+
+class ShareResolver:
+    """Token -> ResolvedShare through a bounded TTL cache.
+
+    Each process has its own cache, so changes made elsewhere (another
+    worker deleting a share) are seen after at most ``ttl`` seconds; changes
+    made in this process invalidate the entry at once.
+    """
+
+    def __init__(self, ttl=30, max_items=4096):
+        self.cache = TTLCache(max_items, ttl)
+
+    def resolve(self, token):
+        snapshot = self.cache.get(token)
+        if snapshot is None:
+            share = Share.query.options(
+                joinedload(Share.pdf_file).load_only(
+                    PDFFile.id, PDFFile.filename, PDFFile.original_filename,
+                    PDFFile.file_path, PDFFile.optimized_path, PDFFile.content_hash,
+                    PDFFile.page_count, PDFFile.is_public),
+                joinedload(Share.owner).load_only(User.id, User.username)
+            ).filter_by(share_token=token).first()
+            if share is None:
+                return None
+            snapshot = ResolvedShare.from_share(share)
+            self.cache.set(token, snapshot)
+        return snapshot
+
+    def record_access(self, snapshot):
+        """Count an access of a resolved share; False once its limit has been reached."""
+        if not Share.count_access(snapshot.id, snapshot.max_access_count):
+            self.invalidate(snapshot.share_token)
+            return False
+        if snapshot.max_access_count:
+            self.cache.replace(snapshot.share_token, snapshot._replace(
+                current_access_count=snapshot.current_access_count + 1))
+        return True
+
+    def invalidate(self, token):
+        self.cache.pop(token)
+
+    def stats(self):
+        return self.cache.stats()
+
+
+def get_share_resolver():
+    return current_app.extensions['share_resolver']
+
+
+def resolve_share_or_404(token):
+    share = get_share_resolver().resolve(token)
+    if share is None:
+        abort(404)
+    return share
+
+
+GRANT_COOKIE = 'share_grant'
+
+
+def grant_serializer():
+    return URLSafeTimedSerializer(current_app.secret_key, salt='share-grant')
+
+
+def grant_fingerprint(share):
+    """Short digest of the password hash, so changing the password revokes old grants."""
+    return hashlib.sha256(share.password_hash.encode()).hexdigest()[:16]
+
+
+def issue_share_grant(response, share):
+    """Attach a grant cookie for ``share`` after its password has been verified."""
+    max_age = current_app.config['SHARE_GRANT_MAX_AGE']
+    value = grant_serializer().dumps({'share': share.id, 'pw': grant_fingerprint(share)})
+    response.set_cookie(GRANT_COOKIE, value, max_age=max_age,
+                        path=f'/shared/{share.share_token}',
+                        secure=request.is_secure, httponly=True, samesite='Lax')
+    return response
+
+
+def has_share_grant(share):
+    """True if the share needs no password or the request carries a valid grant for it."""
+    if not share.password_hash:
+        return True
+    value = request.cookies.get(GRANT_COOKIE)
+    if not value:
+        return False
+    try:
+        grant = grant_serializer().loads(value, max_age=current_app.config['SHARE_GRANT_MAX_AGE'])
+    except BadSignature:
+        return False
+    return grant.get('share') == share.id and grant.get('pw') == grant_fingerprint(share)
+
+
+def sweep_shares(retention_days, batch_size=500, archive=None, now=None):
+    """Delete shares that expired (or hit their limit) over ``retention_days`` ago.
+
+    Rows are removed ``batch_size`` at a time, each batch in its own commit.
+    With ``archive`` (a text file) every row is first written as a JSON line
+    (without its password hash).
+    Returns the number of shares removed.
+    """
+    cutoff = (now or datetime.utcnow()) - timedelta(days=retention_days)
+    stale = or_(Share.expires_at < cutoff,
+                and_(Share.max_access_count > 0,
+                     Share.current_access_count >= Share.max_access_count,
+                     func.coalesce(Share.last_accessed, Share.created_at) < cutoff))
+    removed = 0
+    while True:
+        batch = Share.query.filter(stale).order_by(Share.id).limit(batch_size).all()
+        if not batch:
+            return removed
+        if archive is not None:
+            for share in batch:
+                row = {c.name: getattr(share, c.name) for c in Share.__table__.columns
+                       if c.name != 'password_hash'}
+                archive.write(json.dumps(row, default=lambda v: v.isoformat()) + '\n')
+            archive.flush()
+        Share.query.filter(Share.id.in_([share.id for share in batch]))\
+                   .delete(synchronize_session=False)
+        db.session.commit()
+        removed += len(batch)
+
+
+def init_share_access(app):
+    """Register the share resolver and, if enabled, the access buffer under app.extensions."""
+    app.extensions['share_resolver'] = ShareResolver(app.config['SHARE_CACHE_TTL'],
+                                                     app.config['SHARE_CACHE_ITEMS'])
+    if not app.config.get('SHARE_ACCESS_BUFFER'):
+        return None
+    buffer = AccessBuffer(app.config['SHARE_ACCESS_FLUSH_INTERVAL'],
+                          app.config['SHARE_ACCESS_FLUSH_SIZE'])
+    app.extensions['share_access'] = buffer
+
+    def flush_at_exit():
+        with app.app_context():
+            buffer.flush()
+
+    atexit.register(flush_at_exit)
+    return buffer
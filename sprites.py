@@ -0,0 +1,145 @@
+"""Sprite sheets of low-resolution page previews, for the viewer's page strip.
+
+Every page of a document is rendered into a fixed-size cell, and the cells
+are packed into a few sheet images. A JSON index records each page's sheet
+and offset, so the browser shows the whole document overview from one
+index request plus one image per sheet, instead of asking PDF.js to render
+every page.
+
+Sheets live under SPRITE_FOLDER as ``<hh>/<sha256>-<n>.<ext>``, with the
+index next to them in ``<hh>/<sha256>.json``. Like thumbnails they are
+keyed by the content hash, so identical files share them and an unchanged
+file is never rendered twice.
+"""
+import io
+import json
+import os
+import re
+import time
+
+try:
+    import pymupdf
+except Exception:
+    import fitz as pymupdf
+from PIL import Image
+
+from thumbnails import pick_format
+
+NAME_RE = re.compile(r'^([0-9a-f]{64})(?:-\d+\.\w+|\.json)$')
+INDEX_VERSION = 1
+
+
+class SpriteStore:
+    def __init__(self, root, cell=(80, 112), columns=10, pages_per_sheet=200,
+                 fmt='webp', quality=60, max_pages=2000):
+        self.root = root
+        self.cell = tuple(cell)
+        self.columns = columns
+        self.pages_per_sheet = pages_per_sheet
+        self.format = pick_format(fmt)
+        self.quality = quality
+        self.max_pages = max_pages
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config['SPRITE_FOLDER'], config['SPRITE_CELL'], config['SPRITE_COLUMNS'],
+                   config['SPRITE_PAGES_PER_SHEET'], config.get('SPRITE_FORMAT', 'webp'),
+                   config.get('SPRITE_QUALITY', 60), config['SPRITE_MAX_PAGES'])
+
+    def index_path(self, content_hash):
+        return os.path.join(self.root, content_hash[:2], f'{content_hash}.json')
+
+    def sheet_path(self, content_hash, sheet):
+        return os.path.join(self.root, content_hash[:2], f'{content_hash}-{sheet}.{self.format}')
+
+    def has(self, content_hash):
+        return os.path.exists(self.index_path(content_hash))
+
+    def load_index(self, content_hash):
+        """The stored index, or None if this content has no sprites yet."""
+        try:
+            with open(self.index_path(content_hash)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def render(self, doc):
+        """Render up to max_pages pages of an open document. Returns ([sheet bytes], index)."""
+        cell_w, cell_h = self.cell
+        count = min(len(doc), self.max_pages)
+        sheets = []
+        pages = []
+        sheet = None
+        for n in range(count):
+            slot = n % self.pages_per_sheet
+            if slot == 0:
+                if sheet is not None:
+                    sheets.append(self._encode(sheet))
+                rows = -(-min(self.pages_per_sheet, count - n) // self.columns)
+                sheet = Image.new('RGB', (cell_w * min(self.columns, count - n), cell_h * rows),
+                                  'white')
+            page = doc[n]
+            rect = page.rect
+            x = (slot % self.columns) * cell_w
+            y = (slot // self.columns) * cell_h
+            if rect.is_empty or rect.is_infinite:
+                pages.append([len(sheets), x, y, 0, 0])
+                continue
+            scale = min(cell_w / rect.width, cell_h / rect.height)
+            pix = page.get_pixmap(matrix=pymupdf.Matrix(scale, scale), alpha=False)
+            w, h = min(pix.width, cell_w), min(pix.height, cell_h)
+            sheet.paste(Image.frombytes('RGB', (pix.width, pix.height), pix.samples)
+                        .crop((0, 0, w, h)), (x, y))
+            pages.append([len(sheets), x, y, w, h])
+        if sheet is not None:
+            sheets.append(self._encode(sheet))
+        index = {
+            'version': INDEX_VERSION,
+            'cell': [cell_w, cell_h],
+            'page_count': len(doc),
+            'sheets': len(sheets),
+            # one [sheet, x, y, width, height] per page, in page order
+            'pages': pages,
+        }
+        return sheets, index
+
+    def _encode(self, image):
+        buf = io.BytesIO()
+        image.save(buf, self.format.upper(), quality=self.quality)
+        return buf.getvalue()
+
+    def save(self, content_hash, sheets, index):
+        """Write sheets, then the index (whose presence marks the set complete)."""
+        os.makedirs(os.path.join(self.root, content_hash[:2]), exist_ok=True)
+        items = [(self.sheet_path(content_hash, n), data) for n, data in enumerate(sheets)]
+        items.append((self.index_path(content_hash), json.dumps(index, separators=(',', ':')).encode()))
+        for path, data in items:
+            tmp = f'{path}.{os.getpid()}.tmp'
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        return self.index_path(content_hash)
+
+    def prune(self, referenced_hashes, grace_seconds=3600):
+        """Delete sprites of content no PDFFile has any more. Returns the number of files removed.
+
+        As with thumbnails, files newer than ``grace_seconds`` are kept for
+        imports that have not committed yet.
+        """
+        keep = set(referenced_hashes)
+        cutoff = time.time() - grace_seconds
+        removed = 0
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            for fname in filenames:
+                match = NAME_RE.match(fname)
+                if not match or match.group(1) in keep:
+                    continue
+                path = os.path.join(dirpath, fname)
+                try:
+                    if os.path.getmtime(path) > cutoff:
+                        continue
+                    os.remove(path)
+                    removed += 1
+                except OSError:
+                    continue
+        return removed
@@ -1,9 +1,12 @@
-// Minimal PDF.js wrapper that loads the library from CDN if needed
+// Minimal PDF.js wrapper that loads the library on first use
 // Exposes a simple API: pdfjsViewer.load(url) -> Promise, pdfjsViewer.renderPage(n)
 
 (function(window){
-    const CDN_PDFJS = 'https://cdnjs.cloudflare.com/ajax/libs/pdf.js/2.16.105/pdf.min.js';
-    const CDN_WORKER = 'https://cdnjs.cloudflare.com/ajax/libs/pdf.js/2.16.105/pdf.worker.min.js';
+    // the page passes the URLs of the vendored PDF.js build (static/vendor/pdfjs/)
+    const script = document.currentScript;
+    const PDFJS_SRC = script && script.dataset.pdfjsSrc;
+    const WORKER_SRC = script && script.dataset.workerSrc;
+    const RANGE_CHUNK_SIZE = 256 * 1024;
 
     const state = {
         pdf: null,
@@ -13,18 +16,22 @@
         ctx: null
     };
 
+    let pdfjsLoading = null;
+
     function ensurePdfJs() {
-        return new Promise((resolve, reject) => {
-            if (window.pdfjsLib) return resolve(window.pdfjsLib);
-            const s = document.createElement('script');
-            s.src = CDN_PDFJS;
-            s.onload = () => {
-                if (!window.pdfjsLib) return reject(new Error('pdfjs failed to load'));
-                resolve(window.pdfjsLib);
-            };
-            s.onerror = () => reject(new Error('Failed to load pdf.js from CDN'));
-            document.head.appendChild(s);
-        });
+        // PDF.js 4 is an ES module; a classic script can still load it with import()
+        if (!pdfjsLoading) {
+            if (!PDFJS_SRC) return Promise.reject(new Error('PDF.js URL not configured'));
+            pdfjsLoading = import(PDFJS_SRC).then(lib => {
+                lib.GlobalWorkerOptions.workerSrc = WORKER_SRC;
+                window.pdfjsLib = lib;
+                return lib;
+            }).catch(err => {
+                pdfjsLoading = null;
+                throw new Error('Failed to load pdf.js from ' + PDFJS_SRC + ': ' + err.message);
+            });
+        }
+        return pdfjsLoading;
     }
 
     function initCanvas() {
@@ -38,10 +45,16 @@
 
     async function load(url) {
         await ensurePdfJs();
-        window.pdfjsLib.GlobalWorkerOptions.workerSrc = CDN_WORKER;
         initCanvas();
         return new Promise((resolve, reject) => {
-            const loadingTask = window.pdfjsLib.getDocument(url);
+            // Fetch only the byte ranges needed for the pages being viewed;
+            // the server answers Range requests with 206 and strong ETags.
+            const loadingTask = window.pdfjsLib.getDocument({
+                url: url,
+                rangeChunkSize: RANGE_CHUNK_SIZE,
+                disableAutoFetch: true,
+                disableStream: true
+            });
             loadingTask.promise.then(pdf => {
                 state.pdf = pdf;
                 state.currentPage = 1;
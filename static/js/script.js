@@ -45,6 +45,7 @@ function openPreview(filename) {
     const pdfUrl = `/pdf/${encodeURIComponent(filename)}`;
     previewTitle.textContent = `Preview: ${filename}`;
     openPdfLink.href = pdfUrl;
+    loadPageStrip(null);
     modal.style.display = 'block';
     showSpinner();
 
@@ -211,6 +212,7 @@ function openAdvancedPreview(pdfId) {
 
             document.getElementById('previewTitle').textContent = data.original_filename;
             document.getElementById('openPdfLink').href = `/pdf/${pdfId}`;
+            loadPageStrip(data.sprites);
             // request PDF via PDF.js viewer
             modal.style.display = 'block';
             if (window.pdfjsViewer && typeof window.pdfjsViewer.load === 'function') {
@@ -236,6 +238,56 @@ function openAdvancedPreview(pdfId) {
         });
 }
 
+// Page strip: one precomputed sprite sheet index, a few sheet images, no PDF.js renders
+function loadPageStrip(spritesUrl) {
+    const strip = document.getElementById('pageStrip');
+    if (!strip) return;
+    strip.innerHTML = '';
+    strip.style.display = 'none';
+    if (!spritesUrl) return;
+    fetch(spritesUrl)
+        .then(response => response.ok ? response.json() : Promise.reject(response.status))
+        .then(index => {
+            const [cellW, cellH] = index.cell;
+            index.pages.forEach(([sheet, x, y, w, h], i) => {
+                const cell = document.createElement('div');
+                cell.className = 'page-sprite';
+                cell.dataset.page = i + 1;
+                cell.title = `Page ${i + 1}`;
+                cell.style.width = `${cellW}px`;
+                cell.style.height = `${cellH}px`;
+                const image = document.createElement('span');
+                image.style.width = `${w}px`;
+                image.style.height = `${h}px`;
+                image.style.backgroundImage = `url(${index.sheets[sheet]})`;
+                image.style.backgroundPosition = `-${x}px -${y}px`;
+                cell.appendChild(image);
+                cell.addEventListener('click', () => goToPreviewPage(i + 1));
+                strip.appendChild(cell);
+            });
+            strip.style.display = 'flex';
+            highlightStripPage(currentPage);
+        })
+        .catch(err => console.warn('No page strip:', err));
+}
+
+function highlightStripPage(page) {
+    document.querySelectorAll('#pageStrip .page-sprite').forEach(cell => {
+        cell.classList.toggle('current', Number(cell.dataset.page) === page);
+    });
+}
+
+function goToPreviewPage(page) {
+    if (!window.pdfjsViewer || typeof window.pdfjsViewer.goToPage !== 'function') return;
+    showSpinner();
+    window.pdfjsViewer.goToPage(page).then(() => {
+        const s = window.pdfjsViewer.getState();
+        currentPage = s.currentPage;
+        updatePageNavigation(s.pdf ? s.pdf.numPages : null);
+        hideSpinner();
+    }).catch(err => { hideSpinner(); console.error(err); });
+}
+
 function updatePageNavigation(totalPages) {
     // update page info and navigation buttons
     const pageInfo = document.getElementById('pageInfo');
@@ -246,6 +298,7 @@ function updatePageNavigation(totalPages) {
         try { cur = window.pdfjsViewer.getState().currentPage || currentPage; } catch(e){}
     }
     pageInfo.textContent = `Page ${cur} of ${totalPages}`;
+    highlightStripPage(cur);
     // manage previous/next state via enabling/disabling toolbar buttons
 }
 
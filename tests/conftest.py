@@ -0,0 +1,108 @@
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+import pytest
+from flask import g
+
+# make project root importable when pytest is run from anywhere
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# config.py reads DATABASE_URL at import time, so point it at a scratch
+# database before any app module is imported (as tools/benchmark.py does)
+WORKDIR = tempfile.mkdtemp(prefix='pdfviewer-tests-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(WORKDIR, 'test.db')
+
+try:
+    import pymupdf
+except Exception:
+    import fitz as pymupdf
+from sqlalchemy import text, update
+
+from app import create_app
+from models import db, PDFFile, Share, User
+
+
+@pytest.fixture
+def app(monkeypatch):
+    # storage folders in config.py are relative to the working directory
+    monkeypatch.chdir(WORKDIR)
+    app = create_app()
+    app.config['TESTING'] = True
+    with app.app_context():
+        db.drop_all()
+        # FTS5 tables are created outside the models (see search.py)
+        for table in ('pdf_search', 'pdf_page_search'):
+            db.session.execute(text(f'DROP TABLE IF EXISTS {table}'))
+        db.session.commit()
+        db.create_all()
+        yield app
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def login(client):
+    """Log ``user`` in on the test client, as Flask-Login would after a password check."""
+    def login(user):
+        with client.session_transaction() as session:
+            session['_user_id'] = user.get_id()
+            session['_fresh'] = True
+        # requests share the fixture's app context, where Flask-Login caches the user
+        g.pop('_login_user', None)
+    return login
+
+
+@pytest.fixture
+def make_user(app):
+    def make_user(username, is_admin=False):
+        user = User(username=username, email=f'{username}@example.com',
+                    password_hash='x', is_admin=is_admin)
+        db.session.add(user)
+        db.session.commit()
+        return user
+    return make_user
+
+
+@pytest.fixture
+def make_pdf(app, tmp_path):
+    """Create a PDFFile row backed by a real document with one page per entry of ``pages``."""
+    def make_pdf(user, filename, pages=('',), is_public=False, upload_date=None):
+        path = tmp_path / filename
+        doc = pymupdf.open()
+        for page_text in pages:
+            doc.new_page().insert_text((72, 72), page_text)
+        doc.save(str(path))
+        doc.close()
+        pdf = PDFFile(filename=filename, original_filename=filename, file_path=str(path),
+                      file_size=path.stat().st_size, page_count=len(pages),
+                      user_id=user.id, is_public=is_public,
+                      upload_date=upload_date or datetime.utcnow())
+        db.session.add(pdf)
+        db.session.commit()
+        return pdf
+    return make_pdf
+
+
+@pytest.fixture
+def make_share(app):
+    def make_share(pdf, max_access_count=0, token='token', **kwargs):
+        share = Share(share_token=token, pdf_file_id=pdf.id, user_id=pdf.user_id,
+                      expires_at=datetime.utcnow() + timedelta(days=1),
+                      max_access_count=max_access_count, **kwargs)
+        db.session.add(share)
+        db.session.commit()
+        if max_access_count is None:
+            # the column default would store 0; keep a real NULL, as older rows have
+            db.session.execute(update(Share).where(Share.id == share.id)
+                               .values(max_access_count=None))
+            db.session.commit()
+            db.session.refresh(share)
+        return share
+    return make_share
@@ -0,0 +1,39 @@
+from app import DocumentPool
+
+
+def test_idle_document_is_reused(make_user, make_pdf):
+    path = make_pdf(make_user('alice'), 'a.pdf').file_path
+    pool = DocumentPool(size=2)
+    with pool.open(path) as first:
+        pass
+    with pool.open(path) as second:
+        assert second is first
+        assert not second.is_closed
+
+
+def test_busy_document_gets_a_second_handle(make_user, make_pdf):
+    path = make_pdf(make_user('alice'), 'a.pdf').file_path
+    pool = DocumentPool(size=2)
+    with pool.open(path) as first:
+        # the pool lock is free while a document is in use
+        assert pool.lock.acquire(blocking=False)
+        pool.lock.release()
+        with pool.open(path) as second:
+            assert second is not first
+        assert not second.is_closed
+    # only one idle handle per file is kept
+    assert first.is_closed
+    assert not second.is_closed
+
+
+def test_eviction_closes_only_idle_documents(make_user, make_pdf):
+    alice = make_user('alice')
+    paths = [make_pdf(alice, f'{name}.pdf').file_path for name in 'abc']
+    pool = DocumentPool(size=1)
+    with pool.open(paths[0]) as in_use:
+        for path in paths[1:]:
+            with pool.open(path):
+                pass
+        assert not in_use.is_closed
+    pool.close()
+    assert in_use.is_closed
@@ -0,0 +1,62 @@
+import io
+import zipfile
+
+import pytest
+
+
+@pytest.fixture
+def owners(app, make_user, make_pdf, make_share):
+    alice, bob = make_user('alice'), make_user('bob')
+    mine = make_pdf(alice, 'mine.pdf')
+    theirs = make_pdf(bob, 'theirs.pdf', is_public=True)
+    their_share = make_share(theirs, token='bobs')
+    return alice, bob, mine, theirs, their_share
+
+
+def test_export_requires_login(client, owners):
+    _, _, mine, _, _ = owners
+    response = client.get(f'/export.zip?ids={mine.id}')
+    assert response.status_code == 302
+    assert '/login' in response.headers['Location']
+
+
+def test_export_own_documents(client, login, owners):
+    alice, _, mine, _, _ = owners
+    login(alice)
+    response = client.get(f'/export.zip?ids={mine.id}')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/zip'
+    assert 'no-store' in response.headers['Cache-Control']
+    with zipfile.ZipFile(io.BytesIO(response.data)) as archive:
+        assert archive.namelist() == ['mine.pdf']
+
+
+def test_export_of_someone_elses_document_is_forbidden(client, login, owners):
+    alice, _, mine, theirs, _ = owners
+    login(alice)
+    # public documents can be viewed, but only their owner exports them
+    assert client.get(f'/export.zip?ids={theirs.id}').status_code == 403
+    assert client.get(f'/export.zip?ids={mine.id},{theirs.id}').status_code == 403
+
+
+def test_export_of_someone_elses_share_is_forbidden(client, login, owners):
+    alice, _, _, _, their_share = owners
+    login(alice)
+    assert client.get(f'/export.zip?shares={their_share.id}').status_code == 403
+
+
+def test_admin_can_export_anything(client, login, make_user, owners):
+    _, _, mine, theirs, _ = owners
+    login(make_user('root', is_admin=True))
+    response = client.get(f'/export.zip?ids={mine.id}&ids={theirs.id}')
+    assert response.status_code == 200
+    with zipfile.ZipFile(io.BytesIO(response.data)) as archive:
+        assert sorted(archive.namelist()) == ['mine.pdf', 'theirs.pdf']
+
+
+def test_export_bad_requests(client, login, owners):
+    alice, _, _, _, _ = owners
+    login(alice)
+    assert client.get('/export.zip').status_code == 400
+    assert client.get('/export.zip?ids=x').status_code == 400
+    assert client.get('/export.zip?ids=9999').status_code == 404
@@ -0,0 +1,81 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import jobs
+from models import db, Job
+
+
+@pytest.fixture
+def job(app, make_user, make_pdf):
+    user = make_user('alice')
+    job = jobs.enqueue('ingest', make_pdf(user, 'a.pdf').id, user.id)
+    db.session.commit()
+    return job
+
+
+def test_enqueue_rejects_unknown_kind(app):
+    with pytest.raises(ValueError):
+        jobs.enqueue('nope')
+
+
+def test_claim_takes_a_job_once(job):
+    claimed = jobs.claim('worker-1')
+    assert claimed.id == job.id
+    assert (claimed.status, claimed.locked_by, claimed.attempts) == (Job.RUNNING, 'worker-1', 1)
+    assert jobs.claim('worker-2') is None
+
+
+def test_failed_job_is_retried_after_backoff(app, job):
+    jobs.fail(jobs.claim('worker-1'), 'boom')
+    failed = db.session.get(Job, job.id)
+    assert failed.status == Job.QUEUED
+    assert failed.last_error == 'boom'
+    assert failed.run_after >= datetime.utcnow() + timedelta(seconds=app.config['JOB_RETRY_BASE'] - 1)
+    assert jobs.claim('worker-1') is None
+
+    failed.run_after = datetime.utcnow() - timedelta(seconds=1)
+    db.session.commit()
+    retried = jobs.claim('worker-2')
+    assert (retried.id, retried.attempts, retried.locked_by) == (job.id, 2, 'worker-2')
+
+
+def test_job_fails_for_good_after_max_attempts(app, job):
+    job.max_attempts = 1
+    db.session.commit()
+    jobs.fail(jobs.claim('worker-1'), 'boom')
+    assert db.session.get(Job, job.id).status == Job.FAILED
+    assert jobs.claim('worker-1') is None
+
+
+def test_stale_running_job_is_reclaimed(app, job):
+    jobs.claim('worker-1')
+    job = db.session.get(Job, job.id)
+    job.locked_at = datetime.utcnow() - timedelta(seconds=app.config['JOB_LOCK_TIMEOUT'] + 1)
+    db.session.commit()
+    reclaimed = jobs.claim('worker-2')
+    assert (reclaimed.id, reclaimed.locked_by, reclaimed.attempts) == (job.id, 'worker-2', 2)
+
+
+def test_run_job_records_failure(app, job, monkeypatch):
+    def broken(job, processor):
+        raise RuntimeError('cannot parse')
+    monkeypatch.setitem(jobs.HANDLERS, 'ingest', broken)
+    assert jobs.run_job(jobs.claim('worker-1'), None) == Job.QUEUED
+    assert db.session.get(Job, job.id).last_error == 'RuntimeError: cannot parse'
+
+
+def test_unprocessed_uploads_are_listed_only_to_their_owner(client, login, make_user, make_pdf):
+    alice, bob = make_user('alice'), make_user('bob')
+    pending = make_pdf(alice, 'pending.pdf', is_public=True)
+    make_pdf(alice, 'ready.pdf', is_public=True)
+    pending.page_count = None  # as stored by /upload, before the ingest job
+    db.session.commit()
+
+    login(bob)
+    page = client.get('/').get_data(as_text=True)
+    assert 'ready.pdf' in page and 'pending.pdf' not in page
+
+    login(alice)
+    page = client.get('/').get_data(as_text=True)
+    assert 'pending.pdf' in page and 'Processing' in page
@@ -0,0 +1,20 @@
+from config import ProductionConfig
+
+
+def test_metrics_without_token_follow_metrics_public(app, client):
+    app.config.update(METRICS_TOKEN='', METRICS_PUBLIC=True)
+    assert client.get('/metrics').status_code == 200
+    app.config['METRICS_PUBLIC'] = False
+    assert client.get('/metrics').status_code == 403
+
+
+def test_metrics_token_is_required_when_set(app, client):
+    app.config.update(METRICS_TOKEN='secret', METRICS_PUBLIC=False)
+    assert client.get('/metrics').status_code == 401
+    response = client.get('/metrics', headers={'Authorization': 'Bearer secret'})
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+
+
+def test_production_refuses_metrics_without_a_token():
+    assert ProductionConfig.METRICS_PUBLIC is False
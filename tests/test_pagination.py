@@ -0,0 +1,63 @@
+import base64
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import PDFFile
+from pagination import InvalidCursor, decode_cursor, encode_cursor, keyset_page
+
+
+def test_cursor_round_trip():
+    when = datetime(2024, 5, 17, 12, 30, 5, 123456)
+    token = encode_cursor(when, 42)
+    assert '=' not in token
+    assert decode_cursor(token) == (when, 42)
+
+
+@pytest.mark.parametrize('token', [
+    'not-a-cursor',
+    base64.urlsafe_b64encode(b'{"a": 1}').decode(),
+    base64.urlsafe_b64encode(b'["2024-01-01T00:00:00"]').decode(),
+    base64.urlsafe_b64encode(b'["yesterday", 1]').decode(),
+    base64.urlsafe_b64encode(b'["2024-01-01T00:00:00", "one"]').decode(),
+    base64.urlsafe_b64encode(b'\xff\xfe').decode(),
+])
+def test_invalid_cursor(token):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(token)
+
+
+def test_keyset_pages_cover_every_row_once(app, make_user, make_pdf):
+    user = make_user('alice')
+    start = datetime(2024, 1, 1)
+    # pairs of rows share an upload_date, so the id tie-breaker matters
+    pdfs = [make_pdf(user, f'{n}.pdf', upload_date=start + timedelta(hours=n // 2))
+            for n in range(7)]
+    expected = [pdf.id for pdf in sorted(pdfs, key=lambda p: (p.upload_date, p.id), reverse=True)]
+
+    seen = []
+    cursor = None
+    while True:
+        rows, cursor = keyset_page(PDFFile.query, PDFFile, 3, cursor)
+        seen.extend(row.id for row in rows)
+        if cursor is None:
+            break
+    assert seen == expected
+
+
+def test_api_rejects_invalid_cursor(client):
+    response = client.get('/api/pdfs?cursor=garbage')
+    assert response.status_code == 400
+    assert 'Invalid parameter' in response.get_json()['error']
+
+
+def test_api_next_cursor_round_trip(client, make_user, make_pdf):
+    user = make_user('alice')
+    for n in range(3):
+        make_pdf(user, f'{n}.pdf', is_public=True, upload_date=datetime(2024, 1, 1 + n))
+
+    first = client.get('/api/pdfs?limit=2').get_json()
+    assert [item['filename'] for item in first['items']] == ['2.pdf', '1.pdf']
+    second = client.get(f'/api/pdfs?limit=2&cursor={first["next_cursor"]}').get_json()
+    assert [item['filename'] for item in second['items']] == ['0.pdf']
+    assert second['next_cursor'] is None
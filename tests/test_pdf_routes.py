@@ -0,0 +1,27 @@
+def test_range_request(client, make_user, make_pdf):
+    pdf = make_pdf(make_user('alice'), 'a.pdf', is_public=True)
+    full = client.get(f'/pdf/{pdf.id}')
+    assert full.status_code == 200
+    assert full.headers['Accept-Ranges'] == 'bytes'
+
+    part = client.get(f'/pdf/{pdf.id}', headers={'Range': 'bytes=0-99'})
+    assert part.status_code == 206
+    assert part.data == full.data[:100]
+    assert part.headers['Content-Range'] == f'bytes 0-99/{len(full.data)}'
+
+
+def test_conditional_get(client, make_user, make_pdf):
+    pdf = make_pdf(make_user('alice'), 'a.pdf', is_public=True)
+    response = client.get(f'/pdf/{pdf.id}')
+    etag = response.headers['ETag']
+    assert client.get(f'/pdf/{pdf.id}', headers={'If-None-Match': etag}).status_code == 304
+    assert client.get(f'/pdf/{pdf.id}', headers={
+        'If-Modified-Since': response.headers['Last-Modified']}).status_code == 304
+
+
+def test_etag_changes_with_the_file(client, make_user, make_pdf):
+    pdf = make_pdf(make_user('alice'), 'a.pdf', is_public=True)
+    etag = client.get(f'/pdf/{pdf.id}').headers['ETag']
+    with open(pdf.file_path, 'ab') as f:
+        f.write(b'\n% appended\n')
+    assert client.get(f'/pdf/{pdf.id}').headers['ETag'] != etag
@@ -0,0 +1,81 @@
+import pytest
+
+from models import db
+from pagetext import store_page_texts
+from search import get_search_backend, is_fts_table
+
+
+@pytest.fixture
+def corpus(app, make_user, make_pdf):
+    alice = make_user('alice')
+    by_name = make_pdf(alice, 'zebra-report.pdf', pages=['quarterly figures'], is_public=True)
+    by_text = make_pdf(alice, 'minutes.pdf', pages=['intro', 'the zebra crossing'],
+                       is_public=True)
+    private = make_pdf(make_user('bob'), 'bob.pdf', pages=['zebra notes'])
+    backend = get_search_backend()
+    backend.ensure_schema()
+    for pdf, pages in ((by_name, ['quarterly figures']),
+                       (by_text, ['intro', 'the zebra crossing']),
+                       (private, ['zebra notes'])):
+        store_page_texts(pdf.id, pages, replace=True)
+        backend.index(pdf)
+    db.session.commit()
+    return by_name, by_text, private
+
+
+def found(field, query='zebra', user=None):
+    return {hit.pdf.filename: hit for hit in
+            get_search_backend().search(query, field=field, user=user).items}
+
+
+def test_backend_is_fts5(app):
+    assert get_search_backend().name == 'fts5'
+
+
+def test_filename_search_ignores_text(corpus):
+    assert set(found('filename')) == {'zebra-report.pdf'}
+
+
+def test_content_search_finds_the_matching_page(corpus):
+    hits = found('content')
+    assert set(hits) == {'minutes.pdf'}
+    assert hits['minutes.pdf'].page == 2
+    assert '<mark>zebra</mark>' in hits['minutes.pdf'].snippet
+
+
+def test_all_fields_and_prefix_match(corpus):
+    assert set(found('all')) == {'zebra-report.pdf', 'minutes.pdf'}
+    assert set(found('all', query='zeb')) == {'zebra-report.pdf', 'minutes.pdf'}
+
+
+def test_query_syntax_is_not_interpreted(corpus):
+    assert set(found('all', query='zebra* ("')) == {'zebra-report.pdf', 'minutes.pdf'}
+    assert found('all', query='***') == {}
+
+
+def test_private_documents_only_for_their_owner(corpus):
+    _, _, private = corpus
+    assert 'bob.pdf' not in found('content')
+    assert 'bob.pdf' in found('content', user=private.owner)
+
+
+def test_search_route(client, corpus):
+    data = client.get('/api/search?q=zebra&in=content').get_json()
+    assert [r['filename'] for r in data['results']] == ['minutes.pdf']
+
+
+def test_index_creates_the_schema_on_first_use(app, make_user, make_pdf):
+    # a writer that never called ensure_schema(); pages stored before index() are found too
+    pdf = make_pdf(make_user('alice'), 'notes.pdf', pages=['okapi sighting'], is_public=True)
+    store_page_texts(pdf.id, ['okapi sighting'], replace=True)
+    get_search_backend().index(pdf)
+    db.session.commit()
+    assert set(found('content', query='okapi')) == {'notes.pdf'}
+    assert set(found('filename', query='notes')) == {'notes.pdf'}
+
+
+def test_fts_tables_are_recognised_for_migrations():
+    for name in ('pdf_search', 'pdf_page_search_data', 'pdf_search_docsize', 'pdf_page_search_idx'):
+        assert is_fts_table(name)
+    for name in ('pdf_file', 'pdf_page_text', 'pdf_search_log'):
+        assert not is_fts_table(name)
@@ -0,0 +1,88 @@
+import pytest
+from sqlalchemy import update
+
+from models import db, Share
+
+
+def access_count(share):
+    return db.session.get(Share, share.id, populate_existing=True).current_access_count
+
+
+def test_record_access_stops_at_the_limit(app, make_user, make_pdf, make_share):
+    share = make_share(make_pdf(make_user('alice'), 'a.pdf'), max_access_count=2)
+    assert share.record_access()
+    assert share.record_access()
+    assert not share.record_access()
+    assert access_count(share) == 2
+
+
+def test_record_access_checks_the_stored_count(app, make_user, make_pdf, make_share):
+    share = make_share(make_pdf(make_user('alice'), 'a.pdf'), max_access_count=1)
+    # another request used the last access after this one loaded the row
+    db.session.execute(update(Share).where(Share.id == share.id).values(current_access_count=1))
+    db.session.commit()
+    assert not share.record_access()
+    assert access_count(share) == 1
+
+
+def test_count_access_treats_null_limit_as_unlimited(app, make_user, make_pdf, make_share,
+                                                     monkeypatch):
+    share = make_share(make_pdf(make_user('alice'), 'a.pdf'), max_access_count=None)
+    # go through the conditional UPDATE rather than the write-behind buffer
+    monkeypatch.delitem(app.extensions, 'share_access')
+    for _ in range(3):
+        assert Share.count_access(share.id, None)
+    assert access_count(share) == 3
+
+
+def test_full_download_is_counted(client, make_user, make_pdf, make_share):
+    share = make_share(make_pdf(make_user('alice'), 'a.pdf'), max_access_count=1)
+    url = f'/shared/{share.share_token}/download'
+
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.headers['Accept-Ranges'] == 'none'
+    assert 'private' in response.headers['Cache-Control']
+    assert access_count(share) == 1
+    assert client.get(url).status_code == 410
+
+
+@pytest.mark.parametrize('byte_range', ['bytes=0-', 'bytes=1-', 'bytes=100-199'])
+def test_limited_download_ignores_range(client, make_user, make_pdf, make_share, byte_range):
+    share = make_share(make_pdf(make_user('alice'), 'a.pdf'), max_access_count=2)
+    url = f'/shared/{share.share_token}/download'
+    full = client.get(url)
+
+    response = client.get(url, headers={'Range': byte_range})
+    assert response.status_code == 200
+    assert response.data == full.data
+    assert response.headers['Accept-Ranges'] == 'none'
+    assert access_count(share) == 2
+    assert client.get(url, headers={'Range': byte_range}).status_code == 410
+
+
+def test_unlimited_download_counts_only_ranges_from_zero(client, make_user, make_pdf,
+                                                         make_share, monkeypatch):
+    share = make_share(make_pdf(make_user('alice'), 'a.pdf'))
+    monkeypatch.delitem(client.application.extensions, 'share_access')
+    url = f'/shared/{share.share_token}/download'
+
+    assert client.get(url, headers={'Range': 'bytes=0-'}).status_code == 206
+    assert client.get(url, headers={'Range': 'bytes=100-'}).status_code == 206
+    assert access_count(share) == 1
+
+
+def test_revalidation_is_free(client, make_user, make_pdf, make_share):
+    share = make_share(make_pdf(make_user('alice'), 'a.pdf'), max_access_count=2)
+    url = f'/shared/{share.share_token}/download'
+
+    etag = client.get(url).headers['ETag']
+    assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+    assert access_count(share) == 1
+
+
+def test_download_with_null_limit_is_unlimited(client, make_user, make_pdf, make_share):
+    share = make_share(make_pdf(make_user('alice'), 'a.pdf'), max_access_count=None)
+    url = f'/shared/{share.share_token}/download'
+    for _ in range(3):
+        assert client.get(url).status_code == 200
@@ -0,0 +1,22 @@
+from models import db
+from users import get_user_cache
+
+
+def test_versioned_session_stops_loading_after_a_bump(app, make_user):
+    user = make_user('alice')
+    session_id = user.get_id()
+    assert get_user_cache().load(session_id).username == 'alice'
+
+    user.password_hash = 'changed'
+    db.session.commit()
+    assert get_user_cache().load(session_id) is None
+    assert get_user_cache().load(user.get_id()).username == 'alice'
+
+
+def test_unversioned_session_is_revoked_by_the_first_bump(app, make_user):
+    user = make_user('alice')
+    assert get_user_cache().load(str(user.id)).username == 'alice'
+
+    user.password_hash = 'changed'
+    db.session.commit()
+    assert get_user_cache().load(str(user.id)) is None
@@ -0,0 +1,149 @@
+"""Content-addressed thumbnail store.
+
+Thumbnails are stored under THUMBNAIL_FOLDER as ``<hh>/<sha256>-<w>x<h>.<ext>``,
+keyed by the SHA-256 of the PDF bytes and the preset size. Identical files
+share one set of thumbnails, and re-importing a file rewrites the same names
+instead of leaving orphans behind.
+"""
+import hashlib
+import io
+import os
+import re
+import time
+
+try:
+    import pymupdf
+except Exception:
+    import fitz as pymupdf
+from PIL import Image
+
+CHUNK_SIZE = 1024 * 1024
+DEFAULT_PRESET = 'grid'
+NAME_RE = re.compile(r'^([0-9a-f]{64})-(\d+)x(\d+)\.(\w+)$')
+
+
+def file_sha256(path):
+    """Hash a file in fixed-size chunks so large PDFs are never fully loaded."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def pick_format(preferred):
+    """Return the first of preferred/webp/png that this Pillow build can write."""
+    Image.init()
+    for fmt in (preferred, 'webp', 'png'):
+        if fmt and fmt.upper() in Image.SAVE:
+            return fmt.lower()
+    return 'png'
+
+
+def variant_path(path, size):
+    """Path of the same document's thumbnail at another size, or None for legacy names."""
+    match = NAME_RE.match(os.path.basename(path))
+    if not match:
+        return None
+    name = f'{match.group(1)}-{size[0]}x{size[1]}.{match.group(4)}'
+    return os.path.join(os.path.dirname(path), name)
+
+
+def url_name(path):
+    """Name of a thumbnail relative to THUMBNAIL_FOLDER, as used in /thumbnails/ URLs."""
+    name = os.path.basename(path)
+    match = NAME_RE.match(name)
+    if match:
+        return f'{match.group(1)[:2]}/{name}'
+    return name
+
+
+class ThumbnailStore:
+    def __init__(self, root, presets, fmt='webp', quality=80):
+        self.root = root
+        self.presets = dict(presets)
+        self.format = pick_format(fmt)
+        self.quality = quality
+
+    @classmethod
+    def from_config(cls, config):
+        presets = config.get('THUMBNAIL_PRESETS') or {DEFAULT_PRESET: config['THUMBNAIL_SIZE']}
+        return cls(config['THUMBNAIL_FOLDER'], presets,
+                   config.get('THUMBNAIL_FORMAT', 'webp'),
+                   config.get('THUMBNAIL_QUALITY', 80))
+
+    def path(self, content_hash, preset=DEFAULT_PRESET):
+        width, height = self.presets[preset]
+        name = f'{content_hash}-{width}x{height}.{self.format}'
+        return os.path.join(self.root, content_hash[:2], name)
+
+    def has_all(self, content_hash):
+        return all(os.path.exists(self.path(content_hash, p)) for p in self.presets)
+
+    def render(self, page):
+        """Render one page into every preset size, returning {preset: encoded bytes}.
+
+        The page is rasterised once, directly at the scale of the largest
+        preset (so the pixmap never exceeds that preset, however big the page
+        is), and smaller presets are downsampled from it.
+        """
+        largest = max(self.presets.values(), key=lambda s: s[0] * s[1])
+        rect = page.rect
+        if rect.is_empty or rect.is_infinite:
+            raise ValueError('page has no area')
+        scale = min(largest[0] / rect.width, largest[1] / rect.height)
+        pix = page.get_pixmap(matrix=pymupdf.Matrix(scale, scale), alpha=False)
+        base = Image.frombytes('RGB', (pix.width, pix.height), pix.samples)
+
+        images = {}
+        for preset, size in self.presets.items():
+            img = base.copy()
+            img.thumbnail(size)
+            buf = io.BytesIO()
+            img.save(buf, self.format.upper(), quality=self.quality)
+            images[preset] = buf.getvalue()
+        return images
+
+    def save(self, content_hash, images):
+        """Write rendered images atomically and return the default preset's path."""
+        os.makedirs(os.path.join(self.root, content_hash[:2]), exist_ok=True)
+        for preset, data in images.items():
+            path = self.path(content_hash, preset)
+            tmp = f'{path}.{os.getpid()}.tmp'
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        return self.path(content_hash, DEFAULT_PRESET)
+
+    def prune(self, referenced_paths, grace_seconds=3600):
+        """Delete thumbnails no PDFFile refers to. Returns the number removed.
+
+        Content-addressed entries are kept while any of their sizes is
+        referenced; files newer than ``grace_seconds`` are left alone so
+        thumbnails written by an import that has not committed yet survive.
+        """
+        keep_paths = {os.path.abspath(p) for p in referenced_paths if p}
+        keep_hashes = set()
+        for path in keep_paths:
+            match = NAME_RE.match(os.path.basename(path))
+            if match:
+                keep_hashes.add(match.group(1))
+
+        cutoff = time.time() - grace_seconds
+        removed = 0
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            for fname in filenames:
+                path = os.path.abspath(os.path.join(dirpath, fname))
+                match = NAME_RE.match(fname)
+                if match and match.group(1) in keep_hashes:
+                    continue
+                if not match and path in keep_paths:
+                    continue
+                try:
+                    if os.path.getmtime(path) > cutoff:
+                        continue
+                    os.remove(path)
+                    removed += 1
+                except OSError:
+                    continue
+        return removed
@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+"""Benchmark PDF processing and the hot request paths on a synthetic corpus.
+
+Usage:
+    tools/benchmark.py [--files N] [--pages 1,8,40] [--catalog 100,1000,10000]
+                       [--requests N] [--output results.json] [--compare old.json]
+
+Everything runs in a scratch directory with its own SQLite database, so
+the real catalog is never touched. The corpus is generated from --seed,
+which means two runs with the same arguments see byte-identical files.
+
+Results are printed (or written to --output) as JSON:
+
+- ``processor``: PDFProcessor.analyze() throughput for metadata,
+  thumbnails, text and all three together, in files, pages and MB per
+  second, with the peak RSS of the process that did the work. Each
+  phase runs in a fresh process so peaks do not carry over.
+- ``http``: latency percentiles and requests per second for the home page
+  (first and last page), serve_pdf (full and 304 revalidation),
+  /shared/<token> and /preview/<id>, through the Flask test client,
+  once per --catalog size.
+
+With --compare the run is checked against an earlier results file. Any
+throughput that dropped, or p95 latency that grew, by more than
+--threshold percent is reported, and the exit status is 1.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# make project root importable when script is run from tools/
+ROOT = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
+sys.path.insert(0, ROOT)
+
+try:
+    import pymupdf
+except Exception:
+    import fitz as pymupdf
+
+WORDS = ('lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor '
+         'incididunt ut labore et dolore magna aliqua invoice report quarterly revenue '
+         'contract annex schedule figure table section appendix summary').split()
+
+PROCESSOR_PHASES = {
+    'metadata': dict(metadata=True),
+    'thumbnail': dict(metadata=False, thumbnail=True),
+    'text': dict(metadata=False, text=True),
+    'full': dict(metadata=True, thumbnail=True, text=True),
+}
+
+
+def int_list(value):
+    return [int(v) for v in value.split(',') if v]
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def load_app(workdir):
+    """Create the app against the scratch directory's database and folders.
+
+    config.py reads DATABASE_URL at import time, so the app modules are only
+    imported once it points at the scratch database.
+    """
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+    os.chdir(workdir)
+    from app import create_app
+    return create_app()
+
+
+def make_pdf(path, pages, rng, image_every=0):
+    """Write a PDF of ``pages`` text pages, with a noise image every ``image_every`` pages."""
+    doc = pymupdf.open()
+    for n in range(pages):
+        page = doc.new_page()
+        text = ' '.join(rng.choice(WORDS) for _ in range(400))
+        page.insert_textbox(page.rect + (50, 50, -50, -50), text, fontsize=10)
+        if image_every and n % image_every == 0:
+            # random pixels do not compress, so these dominate the file size
+            pix = pymupdf.Pixmap(pymupdf.csRGB, 256, 256, rng.randbytes(256 * 256 * 3), False)
+            page.insert_image(pymupdf.Rect(50, 500, 306, 756), pixmap=pix)
+    doc.set_metadata({'title': f'Benchmark {os.path.basename(path)}',
+                      'author': 'benchmark', 'subject': f'{pages} pages'})
+    doc.save(path, deflate=True)
+    doc.close()
+
+
+def make_corpus(folder, files, page_counts, seed):
+    """Generate the corpus; every other file carries images. Returns [(path, pages, size)]."""
+    os.makedirs(folder, exist_ok=True)
+    rng = random.Random(seed)
+    corpus = []
+    for i in range(files):
+        pages = page_counts[i % len(page_counts)]
+        path = os.path.join(folder, f'bench-{i:04d}.pdf')
+        make_pdf(path, pages, rng, image_every=4 if i % 2 else 0)
+        corpus.append((path, pages, os.path.getsize(path)))
+    return corpus
+
+
+def summarize(samples, elapsed):
+    """Latency percentiles (ms) and throughput for a list of per-request durations (s)."""
+    samples = sorted(samples)
+
+    def pct(p):
+        return round(samples[min(len(samples) - 1, int(p / 100 * len(samples)))] * 1000, 3)
+
+    return {
+        'requests': len(samples),
+        'per_sec': round(len(samples) / elapsed, 1) if elapsed else None,
+        'mean_ms': round(sum(samples) / len(samples) * 1000, 3),
+        'p50_ms': pct(50),
+        'p95_ms': pct(95),
+        'p99_ms': pct(99),
+        'max_ms': round(samples[-1] * 1000, 3),
+    }
+
+
+def bench_processor(workdir, corpus, options, repeat):
+    """Run analyze(**options) over the corpus ``repeat`` times. Runs in a fresh process."""
+    app = load_app(workdir)
+    from app import PDFProcessor
+    with app.app_context():
+        processor = PDFProcessor(app)
+        baseline = peak_rss_mb()
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for path, _, _ in corpus:
+                processor.analyze(path, **options)
+        elapsed = time.perf_counter() - start
+    files = len(corpus) * repeat
+    pages = sum(p for _, p, _ in corpus) * repeat
+    size = sum(s for _, _, s in corpus) * repeat
+    return {
+        'seconds': round(elapsed, 3),
+        'files_per_sec': round(files / elapsed, 2),
+        'pages_per_sec': round(pages / elapsed, 2),
+        'mb_per_sec': round(size / elapsed / 1024 / 1024, 2),
+        'baseline_rss_mb': baseline,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def seed_catalog(corpus, user_id, start, stop, shares):
+    """Insert PDFFile rows start..stop-1 pointing at corpus files, plus a share per row up to ``shares``."""
+    from models import db, PDFFile, Share
+    from thumbnails import file_sha256
+    hashes = {path: file_sha256(path) for path, _, _ in corpus}
+    now = datetime.utcnow()
+    rows = []
+    for i in range(start, stop):
+        path, pages, size = corpus[i % len(corpus)]
+        rows.append({
+            'filename': f'doc-{i:06d}.pdf', 'original_filename': f'Document {i}.pdf',
+            'file_path': path, 'file_size': size, 'content_hash': hashes[path],
+            'page_count': pages, 'upload_date': now - timedelta(minutes=i),
+            'title': f'Document {i}', 'author': 'benchmark', 'subject': '',
+            'is_public': i % 10 != 0, 'user_id': user_id,
+        })
+    if rows:
+        db.session.execute(PDFFile.__table__.insert(), rows)
+    have = Share.query.count()
+    if have < shares:
+        ids = [pdf_id for (pdf_id,) in db.session.query(PDFFile.id)
+               .order_by(PDFFile.id).offset(have).limit(shares - have)]
+        db.session.execute(Share.__table__.insert(), [{
+            'share_token': f'bench{pdf_id:027d}', 'pdf_file_id': pdf_id, 'user_id': user_id,
+            'created_at': now, 'expires_at': now + timedelta(days=365),
+            'max_access_count': 0, 'current_access_count': 0, 'allow_download': True,
+        } for pdf_id in ids])
+    db.session.commit()
+
+
+def bench_http(app, client, catalog, requests, warmup, rng):
+    """Time each hot endpoint against the current catalog; {endpoint: summary}."""
+    from models import db, PDFFile, Share
+    pdfs = db.session.query(PDFFile.id, PDFFile.filename).all()
+    tokens = [t for (t,) in db.session.query(Share.share_token)]
+    public = PDFFile.query.filter_by(is_public=True).count()
+    last_page = max(1, -(-public // app.config['PDFS_PER_PAGE']))
+
+    def etag_of(url):
+        response = client.get(url)
+        response.close()
+        return response.headers['ETag']
+
+    def revalidation(url, etag):
+        return url, {'If-None-Match': etag}
+
+    revalidate = [(f'/pdfs/{name}', etag_of(f'/pdfs/{name}'))
+                  for _, name in rng.sample(pdfs, min(50, len(pdfs)))]
+    targets = {
+        'index': lambda: ('/', {}),
+        'index_last_page': lambda: (f'/?page={last_page}', {}),
+        'serve_pdf': lambda: (f'/pdfs/{rng.choice(pdfs)[1]}', {}),
+        'serve_pdf_304': lambda: revalidation(*rng.choice(revalidate)),
+        'shared': lambda: (f'/shared/{rng.choice(tokens)}', {}),
+        'preview': lambda: (f'/preview/{rng.choice(pdfs)[0]}', {}),
+    }
+    results = {}
+    for name, target in targets.items():
+        samples = []
+        for n in range(warmup + requests):
+            url, headers = target()
+            start = time.perf_counter()
+            response = client.get(url, headers=headers)
+            response.get_data()
+            response.close()
+            took = time.perf_counter() - start
+            if response.status_code not in (200, 304):
+                raise RuntimeError(f'{url} returned {response.status_code}')
+            if n >= warmup:
+                samples.append(took)
+        results[name] = summarize(samples, sum(samples))
+        print(f'  catalog {catalog:>7}: {name:<16} {results[name]["per_sec"]:>8} req/s  '
+              f'p95 {results[name]["p95_ms"]} ms', file=sys.stderr)
+    return results
+
+
+def compare(old, new, threshold):
+    """Regressions of ``new`` against ``old`` larger than ``threshold`` percent, as strings."""
+    found = []
+
+    def walk(a, b, path):
+        for key, value in b.items():
+            if key not in a:
+                continue
+            if isinstance(value, dict):
+                walk(a[key], value, f'{path}{key}.')
+            elif key.endswith('per_sec') and a[key] and value is not None:
+                change = (value - a[key]) / a[key] * 100
+                if change < -threshold:
+                    found.append(f'{path}{key}: {a[key]} -> {value} ({change:+.1f}%)')
+            elif key == 'p95_ms' and a[key]:
+                change = (value - a[key]) / a[key] * 100
+                if change > threshold:
+                    found.append(f'{path}{key}: {a[key]} -> {value} ({change:+.1f}%)')
+
+    walk(old, new, '')
+    return found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark processing and request hot paths.')
+    parser.add_argument('--files', type=int, default=24, help='PDFs in the synthetic corpus')
+    parser.add_argument('--pages', type=int_list, default=[1, 8, 40],
+                        help='comma-separated page counts, cycled over the corpus')
+    parser.add_argument('--repeat', type=int, default=1, help='passes over the corpus per processor phase')
+    parser.add_argument('--catalog', type=int_list, default=[100, 1000, 10000],
+                        help='comma-separated catalog sizes (PDFFile rows) for the HTTP benchmark')
+    parser.add_argument('--shares', type=int, default=100, help='share links created for the HTTP benchmark')
+    parser.add_argument('--requests', type=int, default=200, help='timed requests per endpoint')
+    parser.add_argument('--warmup', type=int, default=20, help='untimed requests per endpoint')
+    parser.add_argument('--seed', type=int, default=1, help='corpus and request-mix seed')
+    parser.add_argument('--skip-processor', action='store_true', help='only run the HTTP benchmark')
+    parser.add_argument('--skip-http', action='store_true', help='only run the processor benchmark')
+    parser.add_argument('--workdir', help='scratch directory (default: a new temporary one)')
+    parser.add_argument('--keep', action='store_true', help='keep the scratch directory')
+    parser.add_argument('-o', '--output', help='write JSON here instead of stdout')
+    parser.add_argument('--compare', help='earlier results file to check for regressions')
+    parser.add_argument('--threshold', type=float, default=10.0,
+                        help='percent change counted as a regression by --compare')
+    args = parser.parse_args(argv)
+
+    output = os.path.abspath(args.output) if args.output else None
+    baseline_file = os.path.abspath(args.compare) if args.compare else None
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix='pdf-bench-'))
+    os.makedirs(workdir, exist_ok=True)
+    cwd = os.getcwd()
+    try:
+        print(f'Generating {args.files} PDFs in {workdir}', file=sys.stderr)
+        corpus = make_corpus(os.path.join(workdir, 'corpus'), args.files, args.pages, args.seed)
+        results = {
+            'meta': {
+                'started': datetime.utcnow().isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'pymupdf': pymupdf.VersionBind,
+                'cpus': os.cpu_count(),
+                'args': {k: v for k, v in vars(args).items()
+                         if k not in ('workdir', 'keep', 'output', 'compare')},
+            },
+            'corpus': {
+                'files': len(corpus),
+                'pages': sum(p for _, p, _ in corpus),
+                'mb': round(sum(s for _, _, s in corpus) / 1024 / 1024, 2),
+            },
+        }
+
+        if not args.skip_processor:
+            results['processor'] = {}
+            # spawn, not fork: each phase starts from a clean process so its RSS peak is its own
+            ctx = multiprocessing.get_context('spawn')
+            for phase, options in PROCESSOR_PHASES.items():
+                with ctx.Pool(1) as pool:
+                    stats = pool.apply(bench_processor, (workdir, corpus, options, args.repeat))
+                results['processor'][phase] = stats
+                print(f'  processor {phase:<10} {stats["files_per_sec"]:>8} files/s  '
+                      f'{stats["pages_per_sec"]:>8} pages/s  peak {stats["peak_rss_mb"]} MB',
+                      file=sys.stderr)
+
+        if not args.skip_http:
+            app = load_app(workdir)
+            app.config['TESTING'] = True
+            from models import db, User
+            from search import get_search_backend
+            from werkzeug.security import generate_password_hash
+            with app.app_context():
+                db.drop_all()
+                db.create_all()
+                get_search_backend().ensure_schema()
+                user = User(username='bench', email='bench@example.com',
+                            password_hash=generate_password_hash('bench'))
+                db.session.add(user)
+                db.session.commit()
+                rng = random.Random(args.seed)
+                client = app.test_client()
+                results['http'] = {}
+                seeded = 0
+                for size in sorted(args.catalog):
+                    seed_catalog(corpus, user.id, seeded, size, min(args.shares, size))
+                    seeded = max(seeded, size)
+                    results['http'][str(size)] = bench_http(app, client, size, args.requests,
+                                                            args.warmup, rng)
+                buffer = app.extensions.get('share_access')
+                if buffer:
+                    buffer.flush()  # before the scratch database is removed
+                db.session.remove()
+            results['http_peak_rss_mb'] = peak_rss_mb()
+    finally:
+        os.chdir(cwd)
+        if not args.keep and not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    text = json.dumps(results, indent=2)
+    if output:
+        with open(output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+    if baseline_file:
+        with open(baseline_file) as f:
+            regressions = compare(json.load(f), results, args.threshold)
+        for line in regressions:
+            print(f'REGRESSION {line}', file=sys.stderr)
+        if regressions:
+            raise SystemExit(1)
+        print(f'No regressions beyond {args.threshold}% against {args.compare}', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""Build fingerprinted, precompressed static assets (see assets.py).
+
+Usage: tools/build_assets.py [--pdfjs-from DIR]
+
+PDF.js is committed under static/vendor/pdfjs/, so a build needs no
+network access. To upgrade it, unpack a pdfjs-dist release and pass its
+``build/`` directory with --pdfjs-from, then update PDFJS_VERSION. Run
+once per deploy, after the static files change; the app picks up the new
+manifest on its next start.
+"""
+import argparse
+import os
+import re
+import sys
+
+# make project root importable when script is run from tools/
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from assets import build_assets
+from config import config
+
+PDFJS_VERSION = '4.6.82'  # the copy in static/vendor/pdfjs/
+PDFJS_FILES = ('pdf.mjs', 'pdf.worker.mjs')
+# the source maps are not vendored, and a fingerprinted name would break the relative URL anyway
+SOURCE_MAP_RE = re.compile(rb'\n//# sourceMappingURL=\S+\s*$')
+
+
+def vendor_pdfjs(target, source_dir):
+    """Copy the PDF.js library and worker from a pdfjs-dist ``build/`` directory into ``target``."""
+    os.makedirs(target, exist_ok=True)
+    for name in PDFJS_FILES:
+        with open(os.path.join(source_dir, name), 'rb') as f:
+            data = SOURCE_MAP_RE.sub(b'\n', f.read())
+        path = os.path.join(target, name)
+        with open(path + '.tmp', 'wb') as f:
+            f.write(data)
+        os.replace(path + '.tmp', path)
+        print(f'Copied {name} from {source_dir}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build fingerprinted static assets.')
+    parser.add_argument('--pdfjs-from', metavar='DIR',
+                        help='replace the vendored PDF.js with the one in a pdfjs-dist build/ directory')
+    args = parser.parse_args(argv)
+
+    static_folder = os.path.join(ROOT, 'static')
+    if args.pdfjs_from:
+        vendor_pdfjs(os.path.join(static_folder, 'vendor', 'pdfjs'), args.pdfjs_from)
+
+    out_folder = os.path.join(ROOT, config['default'].ASSET_FOLDER)
+    manifest = build_assets(static_folder, out_folder)
+    for name, built in manifest.items():
+        print(f'{name} -> {built}')
+    print(f'Done. Built {len(manifest)} assets into {out_folder}.')
+
+
+if __name__ == '__main__':
+    main()
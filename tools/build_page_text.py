@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""Extract per-page text for documents that do not have it yet.
+
+Usage: tools/build_page_text.py [--chunk N] [--pdf ID ...] [--rebuild]
+
+Meant to run in the background (cron, a spare terminal): every chunk of
+pages is committed on its own, and re-running continues where it stopped.
+"""
+import argparse
+import os
+import sys
+
+# make project root importable when script is run from tools/
+ROOT = os.path.dirname(os.path.dirname(__file__))
+sys.path.insert(0, ROOT)
+
+from app import create_app, PDFProcessor
+from models import db, PDFFile
+from pagetext import build_page_texts, pending_documents, store_page_texts
+from search import get_search_backend
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build per-page text rows.')
+    parser.add_argument('--chunk', type=int, default=50, help='pages per commit')
+    parser.add_argument('--pdf', type=int, action='append', help='only this PDF id (repeatable)')
+    parser.add_argument('--rebuild', action='store_true', help='drop stored pages first')
+    args = parser.parse_args(argv)
+
+    app = create_app()
+    with app.app_context():
+        get_search_backend().ensure_schema()
+        processor = PDFProcessor(app)
+        if args.pdf:
+            pdfs = PDFFile.query.filter(PDFFile.id.in_(args.pdf)).all()
+        else:
+            pdfs = pending_documents()
+
+        total = 0
+        for pdf in pdfs:
+            if args.rebuild:
+                store_page_texts(pdf.id, [], replace=True)
+                db.session.commit()
+            try:
+                added = build_page_texts(processor, pdf, args.chunk)
+            except Exception as e:
+                db.session.rollback()
+                print(f'Failed to extract pages of {pdf.filename}: {e}')
+                continue
+            total += added
+            print(f'{pdf.filename}: {added} pages')
+        print(f'Done. Extracted {total} pages from {len(pdfs)} files.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""Render page sprite sheets for documents that do not have them yet.
+
+Usage: tools/build_sprites.py [--pdf ID ...] [--rebuild]
+
+Sprites are keyed by content hash, so each distinct file is rendered once
+however many PDFFile rows share it, and re-running skips what is done.
+"""
+import argparse
+import os
+import sys
+
+# make project root importable when script is run from tools/
+ROOT = os.path.dirname(os.path.dirname(__file__))
+sys.path.insert(0, ROOT)
+
+from app import create_app, PDFProcessor
+from models import db, PDFFile
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build page sprite sheets.')
+    parser.add_argument('--pdf', type=int, action='append', help='only this PDF id (repeatable)')
+    parser.add_argument('--rebuild', action='store_true', help='render even if sprites exist')
+    args = parser.parse_args(argv)
+
+    app = create_app()
+    with app.app_context():
+        processor = PDFProcessor(app)
+        store = processor.sprites
+        query = db.session.query(PDFFile.content_hash, PDFFile.file_path, PDFFile.filename) \
+            .filter(PDFFile.content_hash.isnot(None), PDFFile.missing_since.is_(None))
+        if args.pdf:
+            query = query.filter(PDFFile.id.in_(args.pdf))
+
+        done = set()
+        built = failed = 0
+        for content_hash, file_path, filename in query.order_by(PDFFile.id):
+            if content_hash in done or (not args.rebuild and store.has(content_hash)):
+                continue
+            done.add(content_hash)
+            try:
+                analysis = processor.analyze_isolated(file_path, metadata=False, sprites=True)
+                if not analysis.sprites:
+                    raise ValueError('no pages rendered')
+                store.save(content_hash, *analysis.sprites)
+            except Exception as e:
+                failed += 1
+                print(f'Failed to render sprites of {filename}: {e}')
+                continue
+            built += 1
+            print(f'{filename}: {len(analysis.sprites[0])} sheets')
+        print(f'Done. Built sprites for {built} files, failed {failed}.')
+
+
+if __name__ == '__main__':
+    main()
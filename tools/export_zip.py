@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""Write a ZIP of stored PDFs, streamed file by file in constant memory.
+
+Usage:
+    tools/export_zip.py -o out.zip [--pdf ID ...] [--share TOKEN ...] [--user USERNAME]
+
+--user exports every document owned by that user. Use -o - to write the
+archive to stdout.
+"""
+import argparse
+import os
+import sys
+
+# make project root importable when script is run from tools/
+ROOT = os.path.dirname(os.path.dirname(__file__))
+sys.path.insert(0, ROOT)
+
+from app import create_app
+from export import archive_names, stream_zip
+from models import PDFFile, Share, User
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Export PDFs as a ZIP archive.')
+    parser.add_argument('-o', '--output', required=True, help='archive path, or - for stdout')
+    parser.add_argument('--pdf', type=int, action='append', default=[], help='PDF id (repeatable)')
+    parser.add_argument('--share', action='append', default=[], help='share token (repeatable)')
+    parser.add_argument('--user', help='every document owned by this username')
+    args = parser.parse_args(argv)
+
+    app = create_app()
+    with app.app_context():
+        pdf_ids = set(args.pdf)
+        if args.share:
+            shares = Share.query.filter(Share.share_token.in_(args.share)).all()
+            pdf_ids.update(s.pdf_file_id for s in shares)
+        query = PDFFile.query
+        if args.user:
+            user = User.query.filter_by(username=args.user).first()
+            if user is None:
+                parser.error(f'no such user: {args.user}')
+            query = query.filter((PDFFile.user_id == user.id) | PDFFile.id.in_(pdf_ids))
+        elif pdf_ids:
+            query = query.filter(PDFFile.id.in_(pdf_ids))
+        else:
+            parser.error('nothing to export: give --pdf, --share or --user')
+        pdfs = query.order_by(PDFFile.id).all()
+
+        out = sys.stdout.buffer if args.output == '-' else open(args.output, 'wb')
+        try:
+            for chunk in stream_zip(archive_names(pdfs)):
+                out.write(chunk)
+        finally:
+            if out is not sys.stdout.buffer:
+                out.close()
+        print(f'Exported {len(pdfs)} files.', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
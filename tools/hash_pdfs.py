@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""Fill in pdf_file.content_hash for rows imported before it existed.
+
+Usage: tools/hash_pdfs.py [--batch-size N]
+
+Files are hashed in streaming chunks. Each batch is committed on its own,
+so the script can be stopped and re-run at any point.
+"""
+import argparse
+import os
+import sys
+
+# make project root importable when script is run from tools/
+ROOT = os.path.dirname(os.path.dirname(__file__))
+sys.path.insert(0, ROOT)
+
+from app import create_app
+from models import db, PDFFile
+from thumbnails import file_sha256
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Backfill PDF content hashes.')
+    parser.add_argument('-b', '--batch-size', type=int, default=200, help='rows per commit')
+    args = parser.parse_args(argv)
+
+    app = create_app()
+    with app.app_context():
+        hashed = 0
+        failed = 0
+        last_id = 0
+        while True:
+            batch = PDFFile.query.filter(PDFFile.content_hash.is_(None), PDFFile.id > last_id)\
+                                 .order_by(PDFFile.id).limit(args.batch_size).all()
+            if not batch:
+                break
+            for pdf in batch:
+                try:
+                    pdf.content_hash = file_sha256(pdf.file_path)
+                    hashed += 1
+                except OSError as e:
+                    failed += 1
+                    print(f'Cannot hash {pdf.filename}: {e}')
+            db.session.commit()
+            last_id = batch[-1].id
+        duplicates = db.session.query(PDFFile.content_hash)\
+                               .filter(PDFFile.content_hash.isnot(None))\
+                               .group_by(PDFFile.content_hash)\
+                               .having(db.func.count(PDFFile.id) > 1).count()
+        print(f'Done. Hashed {hashed} files, {failed} failed; {duplicates} contents are stored more than once.')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,18 +1,56 @@
 #!/usr/bin/env python3
+"""Import PDFs sitting in a folder into the database.
+
+Usage:
+    tools/import_pdfs.py [folder] [--force] [--workers N] [--batch-size N]
+                         [--checkpoint PATH] [--restart]
+    tools/import_pdfs.py [folder] --sync [--watch [--interval SECONDS]]
+
+Files are analysed in a process pool (each PDF is opened exactly once for
+thumbnail, metadata and the text of every page) and the results are streamed back to this
+process, which is the only database writer and commits in batches. Every
+committed batch is appended to a checkpoint file so an interrupted import
+picks up where it stopped; the checkpoint is removed once a run completes.
+
+Files whose SHA-256 matches an already imported document are not analysed
+again: the new row reuses that document's thumbnail, page text and renders.
+
+With --sync only new or changed files are analysed. A file counts as
+unchanged when its size and mtime match what was recorded at import. When
+only the mtime moved, the file is hashed to check. Rows whose file has
+disappeared get missing_since set. --watch keeps polling the folder and
+syncs again whenever its contents change, so new drops are picked up
+within seconds.
+"""
+import argparse
 import os
 import sys
-import uuid
+import time
+from collections import namedtuple
+from multiprocessing import Pool
 
 # make project root importable when script is run from tools/
 ROOT = os.path.dirname(os.path.dirname(__file__))
 sys.path.insert(0, ROOT)
 
 from app import create_app, PDFProcessor
+from pagetext import copy_page_texts, store_page_texts
+from search import get_search_backend
+from thumbnails import file_sha256
 from models import db, PDFFile, User
 from werkzeug.security import generate_password_hash
 from datetime import datetime
 
-app = create_app()
+CHECKPOINT_NAME = '.import_checkpoint'
+
+# what --sync needs to know about an imported file
+SyncRow = namedtuple('SyncRow', ['id', 'file_size', 'source_mtime', 'content_hash',
+                                 'missing_since', 'in_folder'])
+
+# set per process by init_worker() (or by main() when running without a pool)
+_processor = None
+_in_pool = False
+
 
 def ensure_admin():
     admin = User.query.filter_by(username='admin').first()
@@ -27,86 +65,412 @@ def ensure_admin():
         db.session.commit()
     return admin
 
-with app.app_context():
-    upload_folder = app.config.get('UPLOAD_FOLDER')
-    # allow optional override: `tools/import_pdfs.py <path-to-folder> [--force]`
-    import sys as _sys
-    force = ('--force' in _sys.argv) or ('-f' in _sys.argv)
-    # first non-flag arg can be the folder
-    args = [a for a in _sys.argv[1:] if not a.startswith('-')]
-    if len(args) > 0 and args[0]:
-        upload_folder = args[0]
-    thumb_folder = app.config.get('THUMBNAIL_FOLDER')
-    if not upload_folder:
-        print('No UPLOAD_FOLDER configured in app. Aborting.')
-        raise SystemExit(1)
 
-    os.makedirs(upload_folder, exist_ok=True)
-    os.makedirs(thumb_folder, exist_ok=True)
+def commit_batch(pending, checkpoint):
+    """Store page text for a batch of (filename, pdf, page_texts, source_id), index, commit, checkpoint.
 
-    pdf_processor = PDFProcessor(app)
+    Rows with a source_id are duplicates and copy that document's pages instead.
+    """
+    db.session.flush()
+    search = get_search_backend()
+    for _, pdf, page_texts, source_id in pending:
+        if source_id:
+            copy_page_texts(source_id, pdf.id)
+        else:
+            store_page_texts(pdf.id, page_texts, replace=True)
+        search.index(pdf)
+    db.session.commit()
+    if checkpoint:
+        append_checkpoint(checkpoint, [entry[0] for entry in pending])
 
-    user = User.query.first() or ensure_admin()
 
-    added = 0
-    updated = 0
-    for fname in os.listdir(upload_folder):
-        if not fname.lower().endswith('.pdf'):
+def init_worker():
+    """Give each pool process its own PDFProcessor (and an app context for lookups)."""
+    global _processor, _in_pool
+    app = create_app()
+    app.app_context().push()
+    _processor = PDFProcessor(app)
+    _in_pool = True
+
+
+def find_duplicate(content_hash):
+    """Id of an already analysed document with this content, or None."""
+    source = PDFFile.processed_copy(content_hash)
+    if _in_pool:
+        # end the read transaction so it never holds up the writer's commits
+        db.session.rollback()
+    return source.id if source else None
+
+
+def analyze_file(task):
+    """Analyse one PDF in a single open and store its thumbnails (pool worker)."""
+    fname, file_path, reuse = task
+    stat = os.stat(file_path)
+    result = {
+        'filename': fname,
+        'file_path': file_path,
+        'file_size': stat.st_size,
+        'source_mtime': stat.st_mtime_ns,
+        'content_hash': None,
+        'duplicate_of': None,
+        'thumbnail_path': None,
+        'optimized_path': None,
+        'metadata': None,
+        'page_texts': [],
+        'error': None,
+    }
+    store = _processor.thumbnails
+    try:
+        content_hash = result['content_hash'] = file_sha256(file_path)
+        if reuse:
+            result['duplicate_of'] = find_duplicate(content_hash)
+            if result['duplicate_of']:
+                result['metadata'] = {}
+                return result
+        # thumbnails are keyed by content, so an unchanged file is never re-rendered
+        have_thumbnails = store.has_all(content_hash)
+        analysis = _processor.analyze(file_path, thumbnail=not have_thumbnails, text=True,
+                                      sprites=not _processor.sprites.has(content_hash))
+    except Exception as e:
+        result['error'] = f'open failed: {e}'
+        return result
+
+    result['metadata'] = dict(analysis.metadata, page_count=analysis.page_count)
+    result['page_texts'] = list(analysis.page_texts or ())
+    try:
+        if analysis.thumbnails:
+            result['thumbnail_path'] = store.save(content_hash, analysis.thumbnails)
+        elif have_thumbnails:
+            result['thumbnail_path'] = store.path(content_hash)
+    except OSError as e:
+        result['error'] = f'thumbnail failed: {e}'
+    try:
+        if analysis.sprites:
+            _processor.sprites.save(content_hash, *analysis.sprites)
+    except OSError as e:
+        # the viewer falls back to its page buttons; not worth failing the import for
+        print(f'Sprite sheets for {fname} not saved: {e}')
+    if _processor.app.config['OPTIMIZE_PDFS']:
+        try:
+            result['optimized_path'] = _processor.optimize(file_path, content_hash)
+        except Exception as e:
+            # the original is served instead
+            print(f'Optimized copy of {fname} not made: {e}')
+    return result
+
+
+def load_checkpoint(path):
+    if not os.path.exists(path):
+        return set()
+    with open(path, 'r', encoding='utf-8') as f:
+        return {line.rstrip('\n') for line in f if line.strip()}
+
+
+def append_checkpoint(path, names):
+    with open(path, 'a', encoding='utf-8') as f:
+        for name in names:
+            f.write(name + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def list_pdfs(upload_folder):
+    """DirEntry objects of the PDFs directly inside upload_folder, sorted by name."""
+    with os.scandir(upload_folder) as it:
+        entries = [e for e in it if e.is_file() and e.name.lower().endswith('.pdf')]
+    return sorted(entries, key=lambda e: e.name)
+
+
+def folder_snapshot(upload_folder):
+    """{name: (size, mtime_ns)} of the folder's PDFs, to tell when a watch poll has work."""
+    snapshot = {}
+    for entry in list_pdfs(upload_folder):
+        try:
+            stat = entry.stat()
+        except OSError:
+            continue  # removed since the listing
+        snapshot[entry.name] = (stat.st_size, stat.st_mtime_ns)
+    return snapshot
+
+
+def iter_tasks(upload_folder, skip, existing, force):
+    """Yield analysis tasks for PDFs that still need importing."""
+    for entry in list_pdfs(upload_folder):
+        fname = entry.name
+        if fname in skip:
             continue
-        file_path = os.path.join(upload_folder, fname)
-        # check DB by filename
-        existing = PDFFile.query.filter_by(filename=fname).first()
-        if existing and not force:
+        if fname in existing and not force:
             print(f'Skipping existing DB entry for {fname} (use --force to update)')
             continue
+        # --force means re-analyse, so only plain imports may reuse a duplicate's results
+        yield (fname, os.path.join(upload_folder, fname), not force)
 
-        # Generate thumbnail
-        thumb_name = f"{uuid.uuid4().hex}.png"
-        thumb_path = os.path.join(thumb_folder, thumb_name)
-        try:
-            ok = pdf_processor.generate_thumbnail(file_path, thumb_path)
-        except Exception as e:
-            print(f'Failed to generate thumbnail for {fname}: {e}')
-            ok = False
-
-        metadata = pdf_processor.get_pdf_metadata(file_path)
-
-        file_size = os.path.getsize(file_path)
-
-        if existing:
-            # update existing record
-            existing.original_filename = fname
-            existing.file_path = os.path.abspath(file_path)
-            existing.thumbnail_path = os.path.abspath(thumb_path) if ok else existing.thumbnail_path
-            existing.file_size = file_size
-            existing.page_count = metadata.get('page_count', existing.page_count)
-            existing.extracted_text = pdf_processor.extract_text(file_path)
-            existing.title = metadata.get('title') or existing.title
-            existing.author = metadata.get('author') or existing.author
-            existing.subject = metadata.get('subject') or existing.subject
-            db.session.add(existing)
+
+def load_sync_rows(upload_folder):
+    """{filename: SyncRow} for every PDFFile; in_folder marks rows imported from this folder."""
+    folder = os.path.abspath(upload_folder)
+    query = db.session.query(PDFFile.filename, PDFFile.id, PDFFile.file_size, PDFFile.source_mtime,
+                             PDFFile.content_hash, PDFFile.missing_since, PDFFile.file_path)
+    return {name: SyncRow(pdf_id, size, mtime, content_hash, missing,
+                          os.path.dirname(path or '') == folder)
+            for name, pdf_id, size, mtime, content_hash, missing, path in query}
+
+
+class SyncScan:
+    """Iterates the tasks --sync has to run and records what else it saw on the way.
+
+    After iteration: ``seen`` holds every PDF name on disk, ``touched`` maps
+    ids whose file only had its mtime changed to the new mtime, and
+    ``deferred`` counts files modified too recently to be complete.
+    """
+
+    def __init__(self, upload_folder, rows, force=False, settle=0):
+        self.upload_folder = upload_folder
+        self.rows = rows
+        self.force = force
+        self.settle = settle
+        self.seen = set()
+        self.touched = {}
+        self.deferred = 0
+
+    def __iter__(self):
+        settled_before = time.time_ns() - int(self.settle * 1e9)
+        for entry in list_pdfs(self.upload_folder):
+            fname = entry.name
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue  # removed since the listing; apply() treats it as deleted
+            self.seen.add(fname)
+            if stat.st_mtime_ns > settled_before:
+                self.deferred += 1  # probably still being copied in; next pass
+                continue
+            row = self.rows.get(fname)
+            path = os.path.join(self.upload_folder, fname)
+            if row is None or self.force:
+                yield (fname, path, not self.force)
+                continue
+            if row.file_size == stat.st_size and row.source_mtime == stat.st_mtime_ns:
+                continue
+            if row.file_size == stat.st_size and row.content_hash and \
+                    file_sha256(path) == row.content_hash:
+                self.touched[row.id] = stat.st_mtime_ns
+                continue
+            yield (fname, path, True)
+
+    def apply(self, now=None):
+        """Record mtime-only changes and missing/reappeared files. Returns (missing, back)."""
+        now = now or datetime.utcnow()
+        if self.touched:
+            db.session.bulk_update_mappings(PDFFile, [
+                {'id': pdf_id, 'source_mtime': mtime} for pdf_id, mtime in self.touched.items()])
+        gone = [r.id for name, r in self.rows.items()
+                if r.in_folder and name not in self.seen and r.missing_since is None]
+        back = [r.id for name, r in self.rows.items()
+                if name in self.seen and r.missing_since is not None]
+        for ids, value in ((gone, now), (back, None)):
+            for i in range(0, len(ids), 500):
+                PDFFile.query.filter(PDFFile.id.in_(ids[i:i + 500]))\
+                             .update({PDFFile.missing_since: value}, synchronize_session=False)
+        db.session.commit()
+        return len(gone), len(back)
+
+
+def store_result(result, existing, user):
+    """Create or update the PDFFile row for one analysed file. Returns (pdf, added)."""
+    fname = result['filename']
+    metadata = result['metadata']
+    thumb_path = result['thumbnail_path']
+    pdf = db.session.get(PDFFile, existing[fname]) if fname in existing else None
+    source = db.session.get(PDFFile, result['duplicate_of']) if result['duplicate_of'] else None
+
+    if pdf:
+        pdf.original_filename = fname
+        pdf.file_path = os.path.abspath(result['file_path'])
+        pdf.thumbnail_path = os.path.abspath(thumb_path) if thumb_path else pdf.thumbnail_path
+        pdf.optimized_path = result['optimized_path']
+        pdf.file_size = result['file_size']
+        pdf.page_count = metadata.get('page_count', pdf.page_count)
+        pdf.extracted_text = None
+        pdf.title = metadata.get('title') or pdf.title
+        pdf.author = metadata.get('author') or pdf.author
+        pdf.subject = metadata.get('subject') or pdf.subject
+        pdf.content_hash = result['content_hash']
+        pdf.source_mtime = result['source_mtime']
+        pdf.missing_since = None
+        if source:
+            pdf.reuse_analysis(source)
+        db.session.add(pdf)
+        return pdf, False
+
+    pdf = PDFFile(
+        filename=fname,
+        original_filename=fname,
+        file_path=os.path.abspath(result['file_path']),
+        thumbnail_path=os.path.abspath(thumb_path) if thumb_path else None,
+        optimized_path=result['optimized_path'],
+        file_size=result['file_size'],
+        page_count=metadata.get('page_count', None),
+        title=metadata.get('title') or '',
+        author=metadata.get('author') or '',
+        subject=metadata.get('subject') or '',
+        content_hash=result['content_hash'],
+        source_mtime=result['source_mtime'],
+        user_id=user.id,
+        is_public=True,
+        upload_date=datetime.utcnow()
+    )
+    if source:
+        pdf.reuse_analysis(source)
+    db.session.add(pdf)
+    return pdf, True
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description='Import PDFs from a folder into the database.')
+    parser.add_argument('folder', nargs='?', help='folder to scan (defaults to UPLOAD_FOLDER)')
+    parser.add_argument('-f', '--force', action='store_true', help='update existing DB rows')
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count() or 1,
+                        help='analysis processes (1 disables the pool)')
+    parser.add_argument('-b', '--batch-size', type=int, default=200,
+                        help='rows per database commit')
+    parser.add_argument('--checkpoint', help=f'checkpoint file (defaults to <folder>/{CHECKPOINT_NAME})')
+    parser.add_argument('--restart', action='store_true', help='ignore an existing checkpoint')
+    parser.add_argument('--no-prune', action='store_true',
+                        help='keep thumbnails, sprites and optimized copies no longer referenced by any PDF')
+    parser.add_argument('--sync', action='store_true',
+                        help='only import new or changed files and mark vanished ones')
+    parser.add_argument('--watch', action='store_true',
+                        help='keep running and sync whenever the folder changes (implies --sync)')
+    parser.add_argument('--interval', type=float, default=2.0,
+                        help='seconds between folder checks in --watch mode')
+    parser.add_argument('--settle', type=float, default=2.0,
+                        help='in sync mode, leave files modified this recently for the next pass')
+    return parser.parse_args(argv)
+
+
+def import_results(results, existing, user, batch_size, checkpoint):
+    """Store analysis results as they arrive, committing in batches. Returns (added, updated, failed)."""
+    added = 0
+    updated = 0
+    failed = 0
+    pending = []
+    for result in results:
+        fname = result['filename']
+        if result['error']:
+            print(f'Problem processing {fname}: {result["error"]}')
+        if result['metadata'] is None:
+            failed += 1
+            continue
+        pdf, is_new = store_result(result, existing, user)
+        if is_new:
+            added += 1
+            note = f' (duplicate of #{result["duplicate_of"]})' if result['duplicate_of'] else ''
+            print(f'Added DB entry for {fname}{note}')
+        else:
             updated += 1
             print(f'Updated DB entry for {fname}')
+        pending.append((fname, pdf, result['page_texts'], result['duplicate_of']))
+
+        if len(pending) >= batch_size:
+            commit_batch(pending, checkpoint)
+            pending = []
+
+    if pending:
+        commit_batch(pending, checkpoint)
+    return added, updated, failed
+
+
+def sync_pass(args, upload_folder, user, run):
+    """One --sync pass over the folder. Returns the number of files deferred to the next pass."""
+    rows = load_sync_rows(upload_folder)
+    existing = {name: row.id for name, row in rows.items()}
+    scan = SyncScan(upload_folder, rows, force=args.force, settle=args.settle)
+    added, updated, failed = import_results(run(scan), existing, user, args.batch_size, None)
+    missing, back = scan.apply()
+    if added or updated or failed or missing or back or not args.watch:
+        print(f'Synced: added {added}, updated {updated}, failed {failed}, '
+              f'touched {len(scan.touched)}, missing {missing}, reappeared {back}.')
+    return scan.deferred
+
+
+def main(argv=None):
+    global _processor
+    args = parse_args(argv if argv is not None else sys.argv[1:])
+    args.sync = args.sync or args.watch
+    app = create_app()
+
+    with app.app_context():
+        upload_folder = args.folder or app.config.get('UPLOAD_FOLDER')
+        if not upload_folder:
+            print('No UPLOAD_FOLDER configured in app. Aborting.')
+            raise SystemExit(1)
+
+        os.makedirs(upload_folder, exist_ok=True)
+        processor = PDFProcessor(app)
+        user = User.query.first() or ensure_admin()
+        get_search_backend().ensure_schema()
+
+        if args.workers > 1:
+            pool = Pool(args.workers, initializer=init_worker)
         else:
-            pdf = PDFFile(
-                filename=fname,
-                original_filename=fname,
-                file_path=os.path.abspath(file_path),
-                thumbnail_path=os.path.abspath(thumb_path) if ok else None,
-                file_size=file_size,
-                page_count=metadata.get('page_count', None),
-                extracted_text=pdf_processor.extract_text(file_path),
-                title=metadata.get('title') or '',
-                author=metadata.get('author') or '',
-                subject=metadata.get('subject') or '',
-                user_id=user.id,
-                is_public=True,
-                upload_date=datetime.utcnow()
-            )
-            db.session.add(pdf)
-            added += 1
-            print(f'Added DB entry for {fname}')
+            _processor = processor
+            pool = None
 
-    if added or updated:
-        db.session.commit()
-    print(f'Done. Added {added} files, updated {updated} files.')
+        def run(tasks):
+            return pool.imap_unordered(analyze_file, tasks, chunksize=4) if pool else map(analyze_file, tasks)
+
+        try:
+            if args.sync:
+                deferred = sync_pass(args, upload_folder, user, run)
+            else:
+                checkpoint = args.checkpoint or os.path.join(upload_folder, CHECKPOINT_NAME)
+                if args.restart and os.path.exists(checkpoint):
+                    os.remove(checkpoint)
+                done = load_checkpoint(checkpoint)
+                if done:
+                    print(f'Resuming from checkpoint: {len(done)} files already imported')
+                existing = dict(db.session.query(PDFFile.filename, PDFFile.id))
+                tasks = iter_tasks(upload_folder, done, existing, args.force)
+                added, updated, failed = import_results(run(tasks), existing, user,
+                                                        args.batch_size, checkpoint)
+                if os.path.exists(checkpoint):
+                    os.remove(checkpoint)
+                print(f'Done. Added {added} files, updated {updated} files, failed {failed} files.')
+
+            if not args.no_prune:
+                referenced = [p for (p,) in db.session.query(PDFFile.thumbnail_path)]
+                removed = processor.thumbnails.prune(referenced)
+                if removed:
+                    print(f'Pruned {removed} unreferenced thumbnails')
+                hashes = [h for (h,) in db.session.query(PDFFile.content_hash).distinct() if h]
+                removed = processor.sprites.prune(hashes)
+                if removed:
+                    print(f'Pruned {removed} unreferenced sprite files')
+                removed = processor.optimized.prune(hashes)
+                if removed:
+                    print(f'Pruned {removed} unreferenced optimized copies')
+
+            if args.watch:
+                # the folder's own mtime misses files overwritten in place, so compare
+                # every PDF's size and mtime
+                print(f'Watching {upload_folder} (Ctrl-C to stop)')
+                last_snapshot = folder_snapshot(upload_folder)
+                args.force = False
+                while True:
+                    time.sleep(args.interval)
+                    snapshot = folder_snapshot(upload_folder)
+                    if snapshot == last_snapshot and not deferred:
+                        continue
+                    last_snapshot = snapshot
+                    deferred = sync_pass(args, upload_folder, user, run)
+        except KeyboardInterrupt:
+            print('Stopped.')
+        finally:
+            if pool:
+                pool.terminate()
+                pool.join()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""Run background jobs (uploads, reprocessing) from the job table.
+
+Usage: tools/ingest_worker.py [--processes N] [--poll SECONDS] [--once]
+
+Each process claims one job at a time, so several workers (on one host or
+several sharing the database) never run the same job twice. Failed jobs
+are requeued with exponential backoff up to JOB_MAX_ATTEMPTS. With --once
+the worker exits when no runnable job is left, which suits cron.
+
+While idle, a worker also sweeps long-expired share links every
+SHARE_SWEEP_INTERVAL seconds (see tools/sweep_shares.py).
+"""
+import argparse
+import os
+import signal
+import socket
+import sys
+import time
+from multiprocessing import Process
+
+# make project root importable when script is run from tools/
+ROOT = os.path.dirname(os.path.dirname(__file__))
+sys.path.insert(0, ROOT)
+
+from app import create_app, PDFProcessor
+from jobs import claim, run_job
+from search import get_search_backend
+from shares import sweep_shares
+
+_stopping = False
+
+
+def request_stop(signum, frame):
+    global _stopping
+    _stopping = True
+
+
+def work(poll, once):
+    """Claim and run jobs until stopped (or, with ``once``, until the queue is empty)."""
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+    app = create_app()
+    worker_id = f'{socket.gethostname()}:{os.getpid()}'
+    with app.app_context():
+        processor = PDFProcessor(app)
+        get_search_backend().ensure_schema()
+        poll = poll or app.config['JOB_POLL_INTERVAL']
+        sweep_every = app.config['SHARE_SWEEP_INTERVAL']
+        last_sweep = time.monotonic()
+        while not _stopping:
+            job = claim(worker_id)
+            if job is None:
+                if once:
+                    return
+                if sweep_every and time.monotonic() - last_sweep >= sweep_every:
+                    last_sweep = time.monotonic()
+                    removed = sweep_shares(app.config['SHARE_RETENTION_DAYS'],
+                                           app.config['SHARE_SWEEP_BATCH'])
+                    if removed:
+                        print(f'[{worker_id}] swept {removed} expired shares')
+                time.sleep(poll)
+                continue
+            print(f'[{worker_id}] job {job.id} ({job.kind}, attempt {job.attempts}) started')
+            status = run_job(job, processor)
+            print(f'[{worker_id}] job {job.id} {status}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Process queued ingestion jobs.')
+    parser.add_argument('-p', '--processes', type=int, default=1, help='worker processes')
+    parser.add_argument('--poll', type=float, help='seconds between polls (defaults to JOB_POLL_INTERVAL)')
+    parser.add_argument('--once', action='store_true', help='exit when no job is runnable')
+    args = parser.parse_args(argv)
+
+    if args.processes <= 1:
+        work(args.poll, args.once)
+        return
+    workers = [Process(target=work, args=(args.poll, args.once)) for _ in range(args.processes)]
+    for p in workers:
+        p.start()
+
+    def stop_workers(signum, frame):
+        # pass a SIGTERM (e.g. docker stop) on; each child stops after its current job
+        for p in workers:
+            p.terminate()
+
+    signal.signal(signal.SIGTERM, stop_workers)
+    try:
+        for p in workers:
+            p.join()
+    except KeyboardInterrupt:
+        # children got the signal too and stop after their current job
+        for p in workers:
+            p.join()
+
+
+if __name__ == '__main__':
+    main()
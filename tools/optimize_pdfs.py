@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""Make web-optimized copies for documents that do not have one yet.
+
+Usage: tools/optimize_pdfs.py [--pdf ID ...] [--rebuild]
+
+Copies are keyed by content hash, so each distinct file is rewritten once
+however many PDFFile rows share it. Documents for which a copy would not
+help are tried again on every run; pass --pdf to limit the work.
+"""
+import argparse
+import os
+import sys
+
+# make project root importable when script is run from tools/
+ROOT = os.path.dirname(os.path.dirname(__file__))
+sys.path.insert(0, ROOT)
+
+from app import create_app, PDFProcessor
+from models import db, PDFFile
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build web-optimized PDF copies.')
+    parser.add_argument('--pdf', type=int, action='append', help='only this PDF id (repeatable)')
+    parser.add_argument('--rebuild', action='store_true', help='rewrite existing copies')
+    args = parser.parse_args(argv)
+
+    app = create_app()
+    with app.app_context():
+        processor = PDFProcessor(app)
+        query = PDFFile.query.filter(PDFFile.content_hash.isnot(None),
+                                     PDFFile.missing_since.is_(None))
+        if args.pdf:
+            query = query.filter(PDFFile.id.in_(args.pdf))
+        elif not args.rebuild:
+            query = query.filter(PDFFile.optimized_path.is_(None))
+
+        paths = {}  # content hash -> copy made in this run
+        made = skipped = failed = 0
+        for pdf in query.order_by(PDFFile.id):
+            if pdf.content_hash not in paths:
+                try:
+                    paths[pdf.content_hash] = processor.optimize(
+                        pdf.file_path, pdf.content_hash, isolated=True, force=args.rebuild)
+                except Exception as e:
+                    paths[pdf.content_hash] = None
+                    failed += 1
+                    print(f'Failed to optimize {pdf.filename}: {e}')
+                    continue
+                path = paths[pdf.content_hash]
+                if path:
+                    made += 1
+                    print(f'{pdf.filename}: {pdf.file_size} -> {os.path.getsize(path)} bytes')
+                else:
+                    skipped += 1
+            pdf.optimized_path = paths[pdf.content_hash]
+            db.session.commit()
+        print(f'Done. Optimized {made} files, {skipped} not worth a copy, failed {failed}.')
+
+
+if __name__ == '__main__':
+    main()
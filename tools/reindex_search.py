@@ -0,0 +1,23 @@
+#!/usr/bin/env python3
+"""Rebuild the full-text search index from the pdf_file table."""
+import os
+import sys
+
+# make project root importable when script is run from tools/
+ROOT = os.path.dirname(os.path.dirname(__file__))
+sys.path.insert(0, ROOT)
+
+from app import create_app
+from search import get_search_backend
+
+
+def main():
+    app = create_app()
+    with app.app_context():
+        backend = get_search_backend()
+        count = backend.rebuild()
+        print(f'Re-indexed {count} files with the {backend.name} backend.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""Delete share links that stopped working a while ago.
+
+Usage: tools/sweep_shares.py [--days N] [--batch-size N] [--archive PATH]
+
+Suited to cron. Idle ingest workers run the same sweep every
+SHARE_SWEEP_INTERVAL seconds. With --archive, removed rows are appended to
+PATH as JSON lines first.
+"""
+import argparse
+import os
+import sys
+
+# make project root importable when script is run from tools/
+ROOT = os.path.dirname(os.path.dirname(__file__))
+sys.path.insert(0, ROOT)
+
+from app import create_app
+from shares import sweep_shares
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Sweep long-expired share links.')
+    parser.add_argument('--days', type=int, help='retention after expiry (defaults to SHARE_RETENTION_DAYS)')
+    parser.add_argument('-b', '--batch-size', type=int, help='rows per commit (defaults to SHARE_SWEEP_BATCH)')
+    parser.add_argument('--archive', help='append removed shares to this JSON-lines file')
+    args = parser.parse_args(argv)
+
+    app = create_app()
+    with app.app_context():
+        days = args.days if args.days is not None else app.config['SHARE_RETENTION_DAYS']
+        batch_size = args.batch_size or app.config['SHARE_SWEEP_BATCH']
+        if args.archive:
+            with open(args.archive, 'a', encoding='utf-8') as archive:
+                removed = sweep_shares(days, batch_size, archive)
+        else:
+            removed = sweep_shares(days, batch_size)
+        print(f'Removed {removed} shares expired more than {days} days ago.')
+
+
+if __name__ == '__main__':
+    main()
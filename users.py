@@ -0,0 +1,95 @@
+"""Cached user loading for Flask-Login.
+
+Flask-Login calls the user loader on every authenticated request. UserCache
+keeps an immutable AuthUser snapshot per (id, session_version) in a
+bounded TTL cache, so hot pages do not spend a query on the user.
+
+The session cookie stores "<id>:<session_version>" (see User.get_id).
+Changing a user's password or admin flag bumps session_version. Sessions
+and remember-me cookies carrying the old version then stop loading, in
+every process and at once. Other changes to a user drop this process's
+cached entry immediately, and other processes pick them up within
+USER_CACHE_TTL seconds.
+"""
+from collections import namedtuple
+
+from flask import current_app, has_app_context
+from flask_login import UserMixin
+from sqlalchemy import event, inspect
+
+from cache import TTLCache
+from models import db, User
+
+
+class AuthUser(UserMixin, namedtuple('AuthUser', ['id', 'username', 'email', 'is_admin',
+                                                   'session_version'])):
+    """What requests need of the logged-in user, detached from any session."""
+    __slots__ = ()
+
+    @classmethod
+    def from_user(cls, user):
+        return cls(user.id, user.username, user.email, bool(user.is_admin), user.session_version)
+
+    def get_id(self):
+        return f'{self.id}:{self.session_version}'
+
+
+# ids stored before session_version existed carry no version; they count as
+# the value migration a2d6f8c1e347 backfilled, so the first bump revokes them
+UNVERSIONED_SESSION = 1
+
+
+def parse_session_id(value):
+    """(user id, session_version) from a stored session id; raises ValueError."""
+    user_id, _, version = str(value).partition(':')
+    return int(user_id), int(version) if version else UNVERSIONED_SESSION
+
+
+class UserCache:
+    def __init__(self, ttl=60, max_items=10000):
+        self.cache = TTLCache(max_items, ttl)
+
+    def load(self, session_id):
+        """AuthUser for a stored session id, or None if the user is gone or the session revoked."""
+        try:
+            user_id, version = parse_session_id(session_id)
+        except ValueError:
+            return None
+        user = self.cache.get((user_id, version))
+        if user is not None:
+            return user
+        row = db.session.query(User.id, User.username, User.email, User.is_admin,
+                               User.session_version).filter(User.id == user_id).first()
+        if row is None or row.session_version != version:
+            return None
+        user = AuthUser.from_user(row)
+        self.cache.set((user_id, version), user)
+        return user
+
+    def invalidate(self, user_id, session_version):
+        self.cache.pop((user_id, session_version))
+
+    def stats(self):
+        return self.cache.stats()
+
+
+def get_user_cache():
+    return current_app.extensions['user_cache']
+
+
+def _invalidate(mapper, connection, target):
+    if has_app_context() and 'user_cache' in current_app.extensions:
+        history = inspect(target).attrs.session_version.history
+        for version in [*(history.deleted or ()), target.session_version]:
+            get_user_cache().invalidate(target.id, version)
+
+
+def init_user_cache(app, login_manager):
+    """Register a cached user_loader on login_manager and the cache under app.extensions."""
+    users = UserCache(app.config['USER_CACHE_TTL'], app.config['USER_CACHE_ITEMS'])
+    app.extensions['user_cache'] = users
+    login_manager.user_loader(users.load)
+    if not event.contains(User, 'after_update', _invalidate):
+        event.listen(User, 'after_update', _invalidate)
+        event.listen(User, 'after_delete', _invalidate)
+    return users